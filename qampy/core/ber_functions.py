@@ -18,8 +18,10 @@
 
 from __future__ import division, print_function
 import numpy as np
-from scipy.signal import fftconvolve
+from scipy.signal import fftconvolve, oaconvolve
+from scipy.stats import beta
 from qampy.core import utils
+from qampy.core import prbs
 
 
 #TODO: refactor to use remove all unneeded functions
@@ -68,9 +70,65 @@ def find_sequence_offset(x, y, show_cc=False):
     else:
         return idx
 
-def find_sequence_offset_complex(x, y):
+def _best_rotation(c):
     """
-    Find the offset of one sequence in the other even if both sequences are complex.
+    Find the rotation 1.j**ii for which the real part of a correlation value c*(-1.j)**ii is maximum.
+    """
+    proj = [c.real, c.imag, -c.real, -c.imag]
+    ii = int(np.argmax(proj))
+    return ii, proj[ii]
+
+def find_sequence_offset_window(x, y, Nwindow):
+    """
+    Find the offset and rotation of y relative to x using only a window of length Nwindow from the centre of x,
+    which is correlated against the cyclically extended y. The result is verified by calculating the correlation
+    over the full length at the found offset.
+
+    Parameters
+    ----------
+    x : array_like
+        data sequence from which the window is taken (typically the received data)
+    y : array_like
+        data sequence which is shifted to align with x, assumed to be repetitive
+    Nwindow : int
+        length of the correlation window, needs to be shorter than x
+
+    Returns
+    -------
+    idx : integer or None
+        offset index or None if the verification failed
+    ii : integer
+        power for complex rotation angle 1.j**ii
+    acm : float
+        correlation at the offset over the full length
+    """
+    N_X = x.shape[0]
+    N_Y = y.shape[0]
+    st = (N_X - Nwindow)//2
+    xw = x[st:st+Nwindow]
+    y_ext = np.concatenate([y, y[:Nwindow-1]])
+    # this is the conjugate of the correlation, we only need its magnitude here
+    cc = oaconvolve(y_ext, xw[::-1].conj(), "valid")
+    p = int(abs(cc).argmax())
+    rho_w = abs(cc[p])/np.sqrt(np.vdot(xw, xw).real*np.vdot(y_ext[p:p+Nwindow], y_ext[p:p+Nwindow]).real)
+    idx = (st - p) % N_Y
+    yr = np.roll(y, idx)
+    c = 0.
+    for i in range(0, N_X, N_Y):
+        xi = x[i:i+N_Y]
+        c += np.vdot(yr[:xi.shape[0]], xi)
+    ii, acm = _best_rotation(c)
+    rho = acm/np.sqrt(np.vdot(x, x).real*np.vdot(y, y).real*N_X/N_Y)
+    # the offset from the window has to hold over the full length, otherwise the result is rejected
+    if rho_w < 4/np.sqrt(Nwindow) or rho < rho_w/2:
+        return None, ii, float(acm)
+    return idx, ii, float(acm)
+
+def find_sequence_offset_complex(x, y, Nwindow=None):
+    """
+    Find the offset of one sequence in the other even if both sequences are complex. A single cross-correlation
+    is calculated, the four possible rotations 1.j**i only scale the correlation by a constant and are evaluated at
+    the correlation peak.
 
     Parameters
     ----------
@@ -78,6 +136,10 @@ def find_sequence_offset_complex(x, y):
         transmitted data sequence
     y : array_like
         received data sequence
+    Nwindow : int, optional
+        if given only correlate a window of this length from the centre of x against y and verify the found offset
+        over the full length. If the verification fails fall back to the full-length correlation.
+        The sequence y is assumed to be repetitive for the window search.
 
     Returns
     -------
@@ -87,22 +149,22 @@ def find_sequence_offset_complex(x, y):
         y array possibly rotated to correct 1.j**i for complex arrays
     ii : integer
         power for complex rotation angle 1.j**ii
+    acm : float
+        maximum of the crosscorrelation
     """
-    acm = 0.
     if not np.iscomplexobj(x) and not np.iscomplexobj(y):
-        return find_sequence_offset(x, y), y, 0
-    for i in range(4):
-        rx = y * 1.j ** i
-        idx, ac = find_sequence_offset(x, rx, show_cc=True)
-        act = ac.real.max()
-        if act > acm:
-            ii = i
-            ix = idx
-            acm = act
-    return ix, y * 1.j ** ii, ii, acm
-
-
-def sync_and_adjust(data_tx, data_rx, adjust="tx"):
+        idx, ac = find_sequence_offset(x, y, show_cc=True)
+        return idx, y, 0, abs(ac).max()
+    if Nwindow is not None and Nwindow < min(x.shape[0], y.shape[0])//2:
+        idx, ii, acm = find_sequence_offset_window(x, y, Nwindow)
+        if idx is not None:
+            return idx, y * 1.j ** ii, ii, acm
+    idx, ac = find_sequence_offset(x, y, show_cc=True)
+    ii, acm = _best_rotation(ac[idx + y.shape[0] - 1])
+    return idx, y * 1.j ** ii, ii, acm
+
+
+def sync_and_adjust(data_tx, data_rx, adjust="tx", Nwindow=None):
     """
     Synchronize and adjust length of received and transmitted data sequence. When the length
     differs between sequences the sequence length will be adjusted based on the adjust parameter
@@ -120,6 +182,73 @@ def sync_and_adjust(data_tx, data_rx, adjust="tx"):
     adjust : string, optional
         parameter that determines which data sequence to adjust. If "tx" truncate or extend data_tx
         if "rx" truncate or extend data_rx
+    Nwindow : int, optional
+        length of the window for a windowed offset search (see find_sequence_offset_complex)
+
+    Returns
+    -------
+    tx : array_like
+       (possibly adjusted) tx data
+    rx : array_like
+       (possibly adjusted) rx data
+    """
+    offset, ii, acm = find_sync_params(data_tx, data_rx, adjust=adjust, Nwindow=Nwindow)
+    if adjust == "tx":
+        data_tx = data_tx * 1.j ** ii
+    else:
+        data_rx = data_rx * 1.j ** ii
+    return apply_sync(data_tx, data_rx, offset, adjust=adjust), acm
+
+def find_sync_params(data_tx, data_rx, adjust="tx", Nwindow=None):
+    """
+    Find the offset and complex rotation that synchronize the transmitted and the received data sequence.
+    See sync_and_adjust for details.
+
+    Parameters
+    ----------
+    data_tx : array_like
+        transmitted symbol or bit sequence
+    data_rx : array_like
+        received symbol sequence can be noisy
+    adjust : string, optional
+        parameter that determines which data sequence to adjust. If "tx" truncate or extend data_tx
+        if "rx" truncate or extend data_rx
+    Nwindow : int, optional
+        length of the window for a windowed offset search (see find_sequence_offset_complex)
+
+    Returns
+    -------
+    offset : int
+        offset to pass to apply_sync
+    ii : int
+        power of the complex rotation 1.j**ii that needs to be applied to the adjusted sequence
+    acm : float
+        maximum of the crosscorrelation
+    """
+    assert adjust == "tx" or adjust == "rx", "adjust need to be either 'tx' or 'rx'"
+    if adjust == "tx":
+        offset, tmp, ii, acm = find_sequence_offset_complex(data_rx, data_tx, Nwindow=Nwindow)
+    else:
+        offset, tmp, ii, acm = find_sequence_offset_complex(data_tx, data_rx, Nwindow=Nwindow)
+    return offset, ii, acm
+
+def apply_sync(data_tx, data_rx, offset, adjust="tx"):
+    """
+    Shift and adjust the length of received and transmitted data sequence using an offset found with
+    find_sync_params. Any complex rotation needs to be applied to the adjusted sequence before. Because only
+    the ordering of the sequences is changed this can be used on sequences of symbol indices as well.
+
+    Parameters
+    ----------
+    data_tx : array_like
+        transmitted symbol or bit sequence
+    data_rx : array_like
+        received symbol sequence
+    offset : int
+        offset found by find_sync_params
+    adjust : string, optional
+        parameter that determines which data sequence to adjust. If "tx" truncate or extend data_tx
+        if "rx" truncate or extend data_rx
 
     Returns
     -------
@@ -133,29 +262,19 @@ def sync_and_adjust(data_tx, data_rx, adjust="tx"):
     assert adjust == "tx" or adjust == "rx", "adjust need to be either 'tx' or 'rx'"
     if N_tx > N_rx:
         if adjust == "tx":
-            offset, tx, ii, acm = find_sequence_offset_complex(data_rx, data_tx)
-            tx = np.roll(tx, offset)
-            return adjust_data_length(tx, data_rx, method="truncate"), acm
-        elif adjust == "rx":
-            offset, rx, ii, acm = find_sequence_offset_complex(data_tx, data_rx)
-            tx, rx = adjust_data_length(data_tx, rx, method="extend", offset=offset)
-            return (tx, rx), acm
+            return adjust_data_length(np.roll(data_tx, offset), data_rx, method="truncate")
+        else:
+            return adjust_data_length(data_tx, data_rx, method="extend", offset=offset)
     elif N_tx < N_rx:
         if adjust == "tx":
-            offset, tx, ii, acm = find_sequence_offset_complex(data_rx, data_tx)
-            tx, rx = adjust_data_length(tx, data_rx, method="extend", offset=offset)
-            return (tx, rx), acm
-        elif adjust is "rx":
-            offset, rx, ii, acm  = find_sequence_offset_complex(data_tx, data_rx)
-            rx = np.roll(rx, offset)
-            return adjust_data_length(data_tx, rx, method="truncate"), acm
+            return adjust_data_length(data_tx, data_rx, method="extend", offset=offset)
+        else:
+            return adjust_data_length(data_tx, np.roll(data_rx, offset), method="truncate")
     else:
         if adjust == "tx":
-            offset, tx, ii, acm = find_sequence_offset_complex(data_rx, data_tx)
-            return (np.roll(tx, offset), data_rx), acm
-        elif adjust == "rx":
-            offset, rx, ii, acm = find_sequence_offset_complex(data_tx, data_rx)
-            return (data_tx, np.roll(rx, offset)), acm
+            return np.roll(data_tx, offset), data_rx
+        else:
+            return data_tx, np.roll(data_rx, offset)
 
 def sync_rx2tx(data_tx, data_rx, Lsync, imax=200):
     """Sync the received data sequence to the transmitted data, which
@@ -237,6 +356,305 @@ def sync_tx2rx(data_tx, data_rx, Lsync, imax=200):
             pass
     raise DataSyncError("maximum iterations exceeded")
 
+_PRBS_TABLES = {}
+
+def prbs_position_table(order, xor="ext"):
+    """
+    Table of the positions of all states (order consecutive bits) in the PRBS pattern generated with
+    make_prbs_extXOR or make_prbs_intXOR from the all-ones seed. Tables are cached.
+
+    Parameters
+    ----------
+    order : int
+        order of the PRBS (one of 7, 15, 23)
+    xor : string, optional
+        "ext" for an external XOR (Fibonacci) or "int" for an internal XOR (Galois) shift register
+
+    Returns
+    -------
+    table : array_like
+        int32 array of length 2**order, where table[s] is the position of the state s in the pattern. States are
+        packed with the first bit as the least significant bit (see utils.bool2bin). The all-zero state is -1.
+    """
+    if order > 23:
+        raise ValueError("PRBS state tables are only supported for orders up to 23")
+    key = (order, xor)
+    if key not in _PRBS_TABLES:
+        period = 2**order - 1
+        if xor == "ext":
+            pattern = prbs.make_prbs_extXOR(order, period)
+        elif xor == "int":
+            pattern = prbs.make_prbs_intXOR(order, period)
+        else:
+            raise ValueError("xor has to be either 'ext' or 'int'")
+        pattern = np.hstack([pattern, pattern[:order-1]])
+        states = np.zeros(period, dtype=np.int32)
+        for m in range(order):
+            states |= pattern[m:m+period].astype(np.int32) << m
+        table = np.full(2**order, -1, dtype=np.int32)
+        table[states] = np.arange(period, dtype=np.int32)
+        _PRBS_TABLES[key] = table
+    return _PRBS_TABLES[key]
+
+def prbs_tx_positions(data_tx, order, xor="ext", step=64):
+    """
+    Lookup of the positions of the states (order consecutive bits) of a transmitted PRBS bit sequence in the PRBS
+    pattern. The transmitted data does not need to be a contiguous part of the pattern (e.g. it can be rolled or
+    consist of several pieces) and can be inverted. The states are only looked up every step bits, blocks which
+    contain a discontinuity are looked up at every bit.
+
+    Parameters
+    ----------
+    data_tx : array_like
+        transmitted PRBS bit sequence
+    order : int
+        order of the PRBS
+    xor : string, optional
+        shift register type of the PRBS generator, "ext" or "int"
+    step : int, optional
+        spacing of the looked up states
+
+    Returns
+    -------
+    positions : array_like
+        sorted positions in the pattern of the first state of contiguous blocks of the transmitted data
+    indices : array_like
+        index in data_tx of the first state of every block
+    lengths : array_like
+        number of states in every block
+    invert : int
+        mask to XOR the received states with (non-zero if the transmitted data is inverted)
+
+    Raises
+    ------
+    DataSyncError
+        If data_tx is not a PRBS of the given order.
+    """
+    table = prbs_position_table(order, xor)
+    period = 2**order - 1
+    data_tx = np.asarray(data_tx, dtype=bool)
+    L = data_tx.shape[0] - order + 1
+    if L < 2:
+        raise DataSyncError("sequences are too short for PRBS synchronisation")
+
+    def positions(idx):
+        st = np.zeros(idx.shape[0], dtype=np.int64)
+        for m in range(order):
+            st |= data_tx[idx + m].astype(np.int64) << m
+        return table[st ^ invert]
+
+    # the states of an inverted sequence are the inverted states
+    invert = 0
+    p01 = positions(np.arange(2))
+    if p01[0] < 0 or (p01[1] - p01[0]) % period != 1:
+        invert = period
+        p01 = positions(np.arange(2))
+        if p01[0] < 0 or (p01[1] - p01[0]) % period != 1:
+            raise DataSyncError("transmitted data is not a PRBS of order %d"%order)
+    idx = np.arange(0, L, step)
+    pos = positions(np.append(idx, L - 1))
+    lengths = np.diff(np.append(idx, L))
+    # a block is contiguous if its last state is at the expected position
+    contiguous = (pos[:-1] >= 0) & ((pos[1:] - pos[:-1]) % period == np.append(lengths[:-1], lengths[-1] - 1))
+    pos = pos[:-1]
+    if np.count_nonzero(contiguous) < contiguous.shape[0]/2:
+        raise DataSyncError("transmitted data is not a PRBS of order %d"%order)
+    if not np.all(contiguous):
+        # look up every state of the discontinuous blocks
+        idx_b = (idx[~contiguous, None] + np.arange(step)).reshape(-1)
+        idx_b = idx_b[idx_b < L]
+        idx = np.hstack([idx[contiguous], idx_b])
+        lengths = np.hstack([lengths[contiguous], np.ones(idx_b.shape[0], dtype=lengths.dtype)])
+        pos = np.hstack([pos[contiguous], positions(idx_b)])
+    i = np.argsort(pos, kind="stable")
+    return pos[i], idx[i], lengths[i], invert
+
+def find_prbs_offset(data_tx, data_rx, order, xor="ext", imax=200, Nverify=None, tx_positions=None):
+    """
+    Find the offset of a received PRBS bit sequence relative to the transmitted bit sequence by recovering the
+    shift register state from order consecutive received bits and looking up its position in the pattern.
+    The transmitted sequence can be inverted (e.g. a data_bar output of a BERT). The received sequence needs to
+    have the same polarity.
+
+    Parameters
+    ----------
+    data_tx : array_like
+        transmitted PRBS bit sequence
+    data_rx : array_like
+        received bit sequence, which may contain errors
+    order : int
+        order of the PRBS
+    xor : string, optional
+        shift register type of the PRBS generator, "ext" or "int"
+    imax : int, optional
+        maximum number of received bit windows to try
+    Nverify : int, optional
+        number of bits that need to agree with the transmitted sequence after the offset is found,
+        (default: None use 8*order bits)
+    tx_positions : tuple, optional
+        output of prbs_tx_positions for data_tx, to avoid recalculating it when syncing several sequences
+
+    Returns
+    -------
+    offset : int
+        the index to shift data_rx by (np.roll) to align it with data_tx. If the pattern repeats inside
+        data_tx the offset to one of the occurrences is returned.
+
+    Raises
+    ------
+    DataSyncError
+        If data_tx is not a PRBS of the given order or no received window can be decoded.
+    """
+    table = prbs_position_table(order, xor)
+    data_tx = np.asarray(data_tx, dtype=bool)
+    data_rx = np.asarray(data_rx, dtype=bool)
+    N_tx = data_tx.shape[0]
+    N_rx = data_rx.shape[0]
+    if Nverify is None:
+        Nverify = 8*order
+    Nverify = min(Nverify, N_rx, N_tx)
+    if N_tx < order + 1 or N_rx < order + Nverify:
+        raise DataSyncError("sequences are too short for PRBS synchronisation")
+    if tx_positions is None:
+        tx_positions = prbs_tx_positions(data_tx, order, xor)
+    p_tx, idx_tx, len_tx, invert = tx_positions
+    period = 2**order - 1
+    weights = 1 << np.arange(order, dtype=np.int64)
+    tt = np.arange(Nverify)
+    # windows are spaced so that a single bit error only affects one of them
+    for i in range(0, N_rx - order - Nverify + 1, order + 1)[:imax]:
+        p = table[np.dot(data_rx[i:i+order], weights) ^ invert]
+        if p < 0:
+            continue
+        # find the block containing the position, blocks can wrap around the end of the pattern
+        d = None
+        for pp in (p, p + period):
+            k = np.searchsorted(p_tx, pp, side="right") - 1
+            if k >= 0 and pp - p_tx[k] < len_tx[k]:
+                d = idx_tx[k] + pp - p_tx[k]
+                break
+        if d is None:
+            continue
+        nerr = np.count_nonzero(data_rx[i:i+Nverify] ^ data_tx[(d + tt) % N_tx])
+        if nerr <= Nverify//8:
+            return int(d - i)
+    raise DataSyncError("could not recover the PRBS state from the received data")
+
+def sync_rx2tx_prbs(data_tx, data_rx, order, xor="ext", imax=200):
+    """
+    Sync the received data sequence to the transmitted PRBS sequence using PRBS state recovery
+    (see find_prbs_offset). Falls back to a cross-correlation if the state can not be recovered.
+
+    Parameters
+    ----------
+    data_tx : array_like
+        the known transmitted PRBS bit sequence
+    data_rx : array_like
+        the received bit sequence which might contain errors
+    order : int
+        order of the PRBS
+    xor : string, optional
+        shift register type of the PRBS generator, "ext" or "int"
+    imax : int, optional
+        maximum number of received bit windows to try before falling back to correlation
+
+    Returns
+    -------
+    offset index : int
+        the index to shift data_rx by to align it with data_tx
+    data_rx_sync : array_like
+        data_rx which is synchronized to data_tx
+    """
+    try:
+        offset = find_prbs_offset(data_tx, data_rx, order, xor=xor, imax=imax)
+    except DataSyncError:
+        x = 2.*np.asarray(data_tx) - 1
+        y = 2.*np.asarray(data_rx) - 1
+        offset = find_sequence_offset(x, y)
+    return offset, np.roll(data_rx, offset)
+
+def find_index_offset(data_tx, data_rx, M, imax=64):
+    """
+    Find the offset of received symbol indices relative to the transmitted symbol indices by looking up windows of
+    k consecutive received symbols in the transmitted sequence, where k is chosen so that a window is unlikely to
+    occur at a random position of the transmitted data. In contrast to the cross-correlation this needs only a
+    single pass over the transmitted data, the cost of the verification only depends on the length of the received
+    data. The received data can contain errors, as long as some of the first imax windows are error free.
+
+    Parameters
+    ----------
+    data_tx : array_like
+        transmitted symbol indices, assumed to be periodic
+    data_rx : array_like
+        received symbol indices, either 1D or 2D with alternative decisions in the rows (e.g. for the possible
+        rotations of the constellation), which are all looked up at the same time
+    M : int
+        number of symbols in the alphabet
+    imax : int, optional
+        maximum number of received windows to look up
+
+    Returns
+    -------
+    row : int
+        row of data_rx that matches the transmitted data (0 for 1D data_rx)
+    offset : int
+        the index to shift data_rx by (np.roll) to align it with data_tx
+
+    Raises
+    ------
+    DataSyncError
+        If none of the received windows can be found in the transmitted data with a verified offset.
+    """
+    data_tx = np.asarray(data_tx)
+    data_rx = np.atleast_2d(np.asarray(data_rx))
+    N_tx = data_tx.shape[0]
+    N_rx = data_rx.shape[1]
+    nbits = max(1, int(np.ceil(np.log2(M))))
+    k = max(1, min(int(np.ceil((np.log2(max(N_tx, 2)) + 8)/nbits)), 63//nbits, N_tx))
+    nwin = min(imax, N_rx - k + 1)
+    if nwin < 1:
+        raise DataSyncError("sequences are too short for synchronisation by lookup")
+
+    def keys(x, idx):
+        key = np.zeros(x.shape[:-1] + idx.shape, dtype=np.int64)
+        for m in range(k):
+            key |= x[..., (idx + m) % x.shape[-1]].astype(np.int64) << (nbits*m)
+        return key
+    keys_rx = keys(data_rx, np.arange(nwin))
+    # prefilter the transmitted data on the low 20 bits of the keys, which only need the first few symbols
+    mask = 2**20 - 1
+    filt = np.zeros(mask + 1, dtype=bool)
+    filt[keys_rx & mask] = True
+    kf = min(k, -(-20//nbits))
+    tx_ext = np.concatenate([data_tx, data_tx[:kf-1]]).astype(np.uint32)
+    h = tx_ext[:N_tx].copy()
+    for m in range(1, kf):
+        h |= tx_ext[m:m+N_tx] << np.uint32(nbits*m)
+    h &= mask
+    cand = np.flatnonzero(filt[h])
+    keys_tx = keys(data_tx, cand)
+    match = np.isin(keys_tx, keys_rx)
+    cand = cand[match]
+    keys_tx = keys_tx[match]
+    windows = {}
+    for row, p in np.ndindex(*keys_rx.shape):
+        windows.setdefault(int(keys_rx[row, p]), []).append((row, p))
+    votes = {}
+    for c, key in zip(cand, keys_tx):
+        for row, p in windows[int(key)]:
+            v = (row, int(c - p) % N_tx)
+            votes[v] = votes.get(v, 0) + 1
+    # a wrong alignment has a symbol error rate of about 1-1/M
+    n = np.arange(N_rx)
+    best = None
+    for row, d in sorted(votes, key=votes.get, reverse=True)[:4]:
+        nerr = np.count_nonzero(data_tx[(n + d) % N_tx] != data_rx[row])
+        if nerr < N_rx//2 and (best is None or nerr < best[0]):
+            best = (nerr, row, d)
+    if best is None:
+        raise DataSyncError("could not find the received symbols in the transmitted data")
+    return best[1], best[2]
+
 def adjust_data_length(data_tx, data_rx, method=None, offset=0):
     """Adjust the length of data_tx to match data_rx, either by truncation
     or repeating the data.
@@ -316,7 +734,85 @@ def _adjust_to(data, N, back=True):
         data = np.hstack([data[-rem:], tmp])
     return data
 
-def cal_ber_syncd(data_rx, data_tx, threshold=0.2):
+def error_rate_interval(nerr, N, confidence=0.95):
+    """
+    Two-sided Clopper-Pearson confidence interval of an error rate estimated from nerr errors in N trials.
+
+    Parameters
+    ----------
+    nerr : int or array_like
+        number of counted errors
+    N : int or array_like
+        number of trials (bits or symbols)
+    confidence : float, optional
+        confidence level of the interval
+
+    Returns
+    -------
+    lower : float or array_like
+        lower bound of the error rate
+    upper : float or array_like
+        upper bound of the error rate
+    """
+    nerr = np.asarray(nerr, dtype=np.float64)
+    N = np.asarray(N, dtype=np.float64)
+    alpha = 1 - confidence
+    # the beta quantiles are undefined for no errors or only errors where the bounds are 0 and 1
+    with np.errstate(invalid="ignore"):
+        lower = np.where(nerr > 0, beta.ppf(alpha/2, nerr, N - nerr + 1), 0.)
+        upper = np.where(nerr < N, beta.ppf(1 - alpha/2, nerr + 1, N - nerr), 1.)
+    if lower.ndim == 0:
+        return float(lower), float(upper)
+    return lower, upper
+
+def count_errors_chunked(count_errors, N, target_errors=None, ci_width=None, confidence=0.95, Nmin=2**12,
+                         trials_per_item=1):
+    """
+    Count errors in growing chunks until a target number of errors or a relative confidence interval width is
+    reached. The chunks start at Nmin items and double in length, so at high error rates only a small part of
+    the data is processed.
+
+    Parameters
+    ----------
+    count_errors : callable
+        count_errors(start, stop) returns the number of errors in the items start to stop
+    N : int
+        total number of items
+    target_errors : int, optional
+        stop when at least this number of errors is counted
+    ci_width : float, optional
+        stop when the width of the confidence interval relative to the error rate is at most ci_width
+    confidence : float, optional
+        confidence level for ci_width
+    Nmin : int, optional
+        length of the first chunk
+    trials_per_item : int, optional
+        number of trials per item (e.g. bits per symbol)
+
+    Returns
+    -------
+    nerr : int
+        number of counted errors
+    ntrials : int
+        number of processed trials
+    """
+    nerr = 0
+    start = 0
+    step = Nmin
+    while start < N:
+        stop = min(start + step, N)
+        nerr += count_errors(start, stop)
+        start = stop
+        if target_errors is not None and nerr >= target_errors:
+            break
+        if ci_width is not None and nerr > 0:
+            lower, upper = error_rate_interval(nerr, start*trials_per_item, confidence)
+            if upper - lower <= ci_width*nerr/(start*trials_per_item):
+                break
+        step *= 2
+    return nerr, start*trials_per_item
+
+def cal_ber_syncd(data_rx, data_tx, threshold=0.2, target_errors=None, ci_width=None, confidence=0.95):
     """Calculate the bit-error rate (BER) between two synchronised binary data
     signals in linear units.
 
@@ -329,6 +825,12 @@ def cal_ber_syncd(data_rx, data_tx, threshold=0.2):
     threshold : float, optional
        threshold BER value. If calculated BER is larger than the threshold, an
        error is return as this likely indicates a wrong sync (default is 0.2).
+    target_errors : int, optional
+        stop counting once this number of errors is reached (see count_errors_chunked)
+    ci_width : float, optional
+        stop counting once the confidence interval relative to the BER is at most this wide
+    confidence : float, optional
+        confidence level of the returned interval
 
     Returns
     -------
@@ -337,19 +839,29 @@ def cal_ber_syncd(data_rx, data_tx, threshold=0.2):
     errs : int
         number of counted errors.
     N : int
-        length of data_tx
+        length of data_tx (number of compared bits if target_errors or ci_width are given)
+    if target_errors or ci_width is given also return:
+    interval : tuple
+        lower and upper bound of the confidence interval of the BER
 
     Raises
     ------
     ValueError
         if ber>threshold, as this indicates a sync error.
     """
-    errs = np.count_nonzero(data_rx != data_tx)
-    N = len(data_tx)
+    early_stop = target_errors is not None or ci_width is not None
+    if early_stop:
+        errs, N = count_errors_chunked(lambda i, j: np.count_nonzero(data_rx[i:j] != data_tx[i:j]), len(data_tx),
+                                       target_errors=target_errors, ci_width=ci_width, confidence=confidence)
+    else:
+        errs = np.count_nonzero(data_rx != data_tx)
+        N = len(data_tx)
     ber = errs / N
     if ber > threshold:
         raise ValueError("BER is over %.1f, this is probably a wrong sync" %
                          threshold)
+    if early_stop:
+        return ber, errs, N, error_rate_interval(errs, N, confidence)
     return ber, errs, N
 
 
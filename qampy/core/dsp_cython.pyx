@@ -19,12 +19,13 @@
 # cython: profile=False, boundscheck=False, wraparound=False
 from __future__ import division
 import numpy as np
-from cython.parallel import prange
+from cython.parallel import prange, threadid
 cimport cython
+cimport openmp
 cimport numpy as np
 from ccomplex cimport *
 from qampy.core.equalisation cimport cython_equalisation
-from qampy.core.equalisation.cmath cimport exp, log, pow, log2
+from qampy.core.equalisation.cmath cimport exp, log, pow, log2, sqrt, atan2, sin, cos, log1p
 
 
 cdef double cabssq(cython_equalisation.complexing x) nogil:
@@ -54,39 +55,626 @@ def unwrap_discont(double[::1] seq, double max_diff, double period):
         new_array[i] = seq[i] + period * nperiods
     return new_array
 
-def bps(cython_equalisation.complexing[:] E, cython.floating[:,:] testangles, cython_equalisation.complexing[:] symbols, int N):
-    cdef ssize_t i, j, ph_idx
-    cdef int L = E.shape[0]
-    cdef int p = testangles.shape[0]
-    cdef int M = symbols.shape[0]
-    cdef int Ntestangles = testangles.shape[1]
-    cdef float x1 = 1
-    cdef double x2 = 1
-    cdef np.ndarray[ndim=1, dtype=ssize_t] idx
-    cdef np.ndarray[ndim=2, dtype=cython_equalisation.complexing] comp_angles
-    cdef cython.floating[:,:] dists
-    cdef cython.floating dtmp = 0.
-    cdef cython_equalisation.complexing s = 0
-    cdef cython_equalisation.complexing tmp = 0
-    cdtype = "c%d"%E.itemsize
-    fdtype = "f%d"%testangles.itemsize
-    comp_angles = np.zeros((p, Ntestangles), dtype=cdtype)
-    comp_angles[:,:] = np.exp(1.j*np.array(testangles[:,:]))
-    dists = np.zeros((L, Ntestangles), dtype=fdtype)+100.
-    for i in prange(L, schedule='static', nogil=True):
-        dtmp = 100. # it is important to assign to the variable, othewise it will not
-                    # be discovered as private by the compiler (passing the pointer  only does
-                    # not work)
-        if p > 1:
-            ph_idx = i
+cdef double complex _unit_power(double complex z, int M) noexcept nogil:
+    """
+    M-th power of z normalised to the unit circle (1 for z=0), by repeated squaring and multiplication.
+    """
+    cdef double a = sqrt(z.real*z.real + z.imag*z.imag)
+    cdef double complex out = 1
+    if a == 0:
+        return out
+    z = z/a
+    while M > 0:
+        if M & 1:
+            out = out*z
+        M >>= 1
+        if M:
+            z = z*z
+    return out
+
+def viterbiviterbi_phase(cython_equalisation.complexing[:,:] E, int N, int M):
+    """
+    Phase of the moving sum of the M-th power of the normalised signal over N samples for all modes (the
+    Viterbi-Viterbi phase estimate before unwrapping). The moving sums are updated recursively with a ring buffer
+    of the last N powers, inside contiguous blocks processed in parallel which start the sum from scratch, so no
+    temporary arrays of the signal size are needed and the rounding errors do not accumulate over the signal.
+
+    Parameters
+    ----------
+    E : array_like
+        input signal, shape (nmodes, L)
+    N : int
+        number of samples to sum over
+    M : int
+        order of the M-PSK
+
+    Returns
+    -------
+    phase : array_like
+        phase of the moving sums, shape (nmodes, L-N+1)
+    """
+    cdef Py_ssize_t nmodes = E.shape[0]
+    cdef Py_ssize_t L = E.shape[1]
+    cdef Py_ssize_t Lout = L - N + 1
+    cdef Py_ssize_t blocklen, Nblocks, mb, m, k, k0, k1
+    cdef int nthreads = openmp.omp_get_max_threads()
+    cdef int t
+    cdef double complex ssum, p
+    cdef double complex[:,::1] ring
+    cdef double[:,::1] phase
+    if N < 1 or Lout < 1:
+        raise ValueError("N needs to be between 1 and the signal length")
+    phase = np.zeros((nmodes, Lout), dtype=np.float64)
+    blocklen = max(8*N, 2**14)
+    Nblocks = (Lout + blocklen - 1)//blocklen
+    nthreads = min(nthreads, nmodes*Nblocks)
+    # the powers of the last N samples, so every power is only calculated once
+    ring = np.zeros((nthreads, N), dtype=np.complex128)
+    for mb in prange(nmodes*Nblocks, schedule='static', nogil=True, num_threads=nthreads):
+        t = threadid()
+        m = mb // Nblocks
+        k0 = (mb % Nblocks)*blocklen
+        k1 = min(k0 + blocklen, Lout)
+        ssum = 0
+        for k in range(k0, k0 + N):
+            p = _unit_power(E[m, k], M)
+            ring[t, k % N] = p
+            ssum = ssum + p
+        phase[m, k0] = atan2(ssum.imag, ssum.real)
+        for k in range(k0 + 1, k1):
+            p = _unit_power(E[m, k + N - 1], M)
+            ssum = ssum + p - ring[t, (k - 1) % N]
+            ring[t, (k - 1) % N] = p
+            phase[m, k] = atan2(ssum.imag, ssum.real)
+    return np.asarray(phase)
+
+cdef void _bps_block(cython_equalisation.complexing[:,:] E, cython_equalisation.complexing[:,:] comp_angles,
+                     cython_equalisation.complexing[:] symbols, cython_equalisation.SymbolSlicer slicer,
+                     Py_ssize_t m0, Py_ssize_t m1, Py_ssize_t c0, Py_ssize_t c1, int N,
+                     double[:,:,::1] ring, double[:,::1] sums, int t, int[:,::1] idx) noexcept nogil:
+    """
+    Blind phase search for the outputs c0 ... c1-1 of the modes m0 ... m1-1, where the distances of the modes
+    are summed (joint search). The window sums are kept in the ring buffer ring[t] of the last 2*N distance rows.
+    """
+    cdef Py_ssize_t s, j, m, slot, ph_idx
+    cdef Py_ssize_t W = 2*N
+    cdef Py_ssize_t Ntestangles = comp_angles.shape[1]
+    cdef int jmin
+    cdef double dtmp, drow, dmin
+    cdef cython_equalisation.complexing tmp
+    ring[t, :, :] = 0.
+    sums[t, :] = 0.
+    # the window of output c contains the samples c-N+1 ... c+N, the first output is after 2*N samples
+    for s in range(c0 - N + 1, c1 + N):
+        slot = s % W
+        if comp_angles.shape[0] > 1:
+            ph_idx = s
         else:
             ph_idx = 0
         for j in range(Ntestangles):
-            tmp = E[i] * comp_angles[ph_idx, j]
-            s = cython_equalisation.det_symbol(symbols, M, tmp, &dtmp)
-            if dtmp < dists[i, j]:
-                dists[i, j] = dtmp
-    return np.array(select_angle_index(dists, 2*N))
+            drow = 0.
+            for m in range(m0, m1):
+                tmp = E[m, s] * comp_angles[ph_idx, j]
+                cython_equalisation.det_symbol_slicer(symbols, slicer, tmp, &dtmp)
+                drow = drow + dtmp
+            sums[t, j] = sums[t, j] + drow - ring[t, slot, j]
+            ring[t, slot, j] = drow
+        if s >= c0 + N:
+            dmin = sums[t, 0]
+            jmin = 0
+            for j in range(1, Ntestangles):
+                if sums[t, j] < dmin:
+                    dmin = sums[t, j]
+                    jmin = j
+            for m in range(m0, m1):
+                idx[m, s - N] = jmin
+
+def bps_modes(cython_equalisation.complexing[:,:] E, cython.floating[:,:] testangles, cython_equalisation.complexing[:] symbols, int N, bint joint=False):
+    """
+    Blind phase search of all modes of a signal in a single parallel region, returning the index of the test angle
+    with the minimum distance sum over a window of 2*N samples around each sample (0 for the first and last N samples).
+
+    The distances are never stored for the whole signal, the window sums are updated in a ring buffer of the
+    last 2*N distance rows. The modes are split into contiguous blocks which are processed in parallel, every
+    block recomputes the 2*N-1 distance rows before its first output (halo), so the memory use is
+    O(nthreads*N*Ntestangles) independent of the signal length.
+
+    Parameters
+    ----------
+    E : array_like
+        input signal, shape (nmodes, L)
+    testangles : array_like
+        test angles, either of shape (1, Ntestangles) or (L, Ntestangles) for different angles at every sample
+        (the same for all modes)
+    symbols : array_like
+        the symbols of the modulation format
+    N : int
+        half of the averaging window length
+    joint : bool, optional
+        sum the distances of all modes to select the same angle for all modes (modes sharing one LO)
+
+    Returns
+    -------
+    idx : array_like
+        index of the test angle for every sample, shape (nmodes, L)
+    """
+    cdef Py_ssize_t b, c0, c1, mb, m0, m1
+    cdef Py_ssize_t nmodes = E.shape[0]
+    cdef Py_ssize_t L = E.shape[1]
+    cdef Py_ssize_t W = 2*N
+    cdef Py_ssize_t Ngroups, Nblocks, blocklen
+    cdef int nthreads = openmp.omp_get_max_threads()
+    cdef int t
+    cdef cython_equalisation.complexing[:,:] comp_angles
+    cdef double[:,:,::1] ring
+    cdef double[:,::1] sums
+    cdef int[:,::1] idx = np.zeros((nmodes, L), dtype=np.intc)
+    cdef cython_equalisation.SymbolSlicer slicer = cython_equalisation.get_symbol_slicer(np.asarray(symbols))
+    if testangles.shape[0] > 1 and testangles.shape[0] != L:
+        raise ValueError("testangles need to have either one row or a row for every sample")
+    if L <= W or N < 1 or nmodes == 0:
+        return np.asarray(idx)
+    comp_angles = np.exp(1.j*np.asarray(testangles)).astype("c%d"%E.itemsize)
+    Ngroups = 1 if joint else nmodes
+    # blocks should be long compared to the halo, but give every thread some work
+    blocklen = max(8*W, 2**14)
+    Nblocks = (L - W + blocklen - 1)//blocklen
+    if Ngroups*Nblocks < nthreads:
+        blocklen = max((L - W)*Ngroups//nthreads, 1)
+        Nblocks = (L - W + blocklen - 1)//blocklen
+    nthreads = min(nthreads, Ngroups*Nblocks)
+    ring = np.zeros((nthreads, W, testangles.shape[1]), dtype=np.float64)
+    sums = np.zeros((nthreads, testangles.shape[1]), dtype=np.float64)
+    for mb in prange(Ngroups*Nblocks, schedule='dynamic', nogil=True, num_threads=nthreads):
+        t = threadid()
+        b = mb % Nblocks
+        if joint:
+            m0 = 0
+            m1 = nmodes
+        else:
+            m0 = mb // Nblocks
+            m1 = m0 + 1
+        c0 = N + b*blocklen
+        c1 = min(c0 + blocklen, L - N)
+        _bps_block(E, comp_angles, symbols, slicer, m0, m1, c0, c1, N, ring, sums, t, idx)
+    return np.asarray(idx)
+
+cdef void _bps_twostage_block(cython_equalisation.complexing[:,:] E, double[:] testangles, double[:] fineangles,
+                              double complex[:] comp1, double complex[:,:] comp2,
+                              cython_equalisation.SymbolSlicer slicer, Py_ssize_t m0, Py_ssize_t m1,
+                              Py_ssize_t c0, Py_ssize_t c1, int N, int t,
+                              double[:,:,::1] ring1, double[:,::1] sums1, int[:,:,:,::1] symring,
+                              double[:,:,::1] ring2, double[:,::1] sums2,
+                              int[:,::1] k1buf, int[:,:,::1] symbuf, double[:,::1] ph) noexcept nogil:
+    """
+    Two-stage blind phase search for the outputs c0 ... c1-1 of the modes m0 ... m1-1 (summed distances for a
+    joint search). The first stage decisions of the samples needed by the second stage windows are kept in
+    k1buf[t] and symbuf[t], so the second stage only calculates the distances to the symbols decided in the
+    first stage.
+    """
+    cdef Py_ssize_t s, u, c, j, l, m, slot, U0, U1, A0, A1
+    cdef Py_ssize_t W = 2*N
+    cdef Py_ssize_t L = E.shape[1]
+    cdef Py_ssize_t Nt = testangles.shape[0]
+    cdef Py_ssize_t B = fineangles.shape[0]
+    cdef int jmin, q
+    cdef double d, drow, dmin
+    cdef double complex z
+    # the second stage outputs c0 ... c1-1 need the first stage decisions of the samples U0 ... U1-1, the first stage
+    # can only decide the samples N ... L-N-1
+    U0 = c0 - N + 1
+    U1 = c1 + N
+    A0 = max(U0, N)
+    A1 = min(U1, L - N)
+    ring1[t, :, :] = 0.
+    sums1[t, :] = 0.
+    for s in range(A0 - N + 1, A1 + N):
+        slot = s % W
+        for j in range(Nt):
+            drow = 0.
+            for m in range(m0, m1):
+                z = E[m, s]*comp1[j]
+                q = slicer.nearest(z.real, z.imag)
+                drow = drow + (slicer.symbols[q].real - z.real)**2 + (slicer.symbols[q].imag - z.imag)**2
+                symring[t, m - m0, slot, j] = q
+            sums1[t, j] = sums1[t, j] + drow - ring1[t, slot, j]
+            ring1[t, slot, j] = drow
+        if s >= A0 + N:
+            c = s - N
+            dmin = sums1[t, 0]
+            jmin = 0
+            for j in range(1, Nt):
+                if sums1[t, j] < dmin:
+                    dmin = sums1[t, j]
+                    jmin = j
+            k1buf[t, c - U0] = jmin
+            for m in range(m0, m1):
+                symbuf[t, m - m0, c - U0] = symring[t, m - m0, c % W, jmin]
+    # samples at the signal edges use the closest first stage angle
+    for u in range(U0, U1):
+        if u >= A0 and u < A1:
+            continue
+        if u < A0:
+            jmin = k1buf[t, A0 - U0]
+        else:
+            jmin = k1buf[t, A1 - 1 - U0]
+        k1buf[t, u - U0] = jmin
+        for m in range(m0, m1):
+            z = E[m, u]*comp1[jmin]
+            symbuf[t, m - m0, u - U0] = slicer.nearest(z.real, z.imag)
+    ring2[t, :, :] = 0.
+    sums2[t, :] = 0.
+    for u in range(U0, U1):
+        slot = u % W
+        j = k1buf[t, u - U0]
+        for l in range(B):
+            drow = 0.
+            for m in range(m0, m1):
+                z = E[m, u]*comp2[j, l]
+                q = symbuf[t, m - m0, u - U0]
+                drow = drow + (slicer.symbols[q].real - z.real)**2 + (slicer.symbols[q].imag - z.imag)**2
+            sums2[t, l] = sums2[t, l] + drow - ring2[t, slot, l]
+            ring2[t, slot, l] = drow
+        if u >= c0 + N:
+            c = u - N
+            dmin = sums2[t, 0]
+            jmin = 0
+            for l in range(1, B):
+                if sums2[t, l] < dmin:
+                    dmin = sums2[t, l]
+                    jmin = l
+            for m in range(m0, m1):
+                ph[m, c] = testangles[k1buf[t, c - U0]] + fineangles[jmin]
+
+def bps_twostage_modes(cython_equalisation.complexing[:,:] E, double[:] testangles, double[:] fineangles, cython_equalisation.complexing[:] symbols, int N, bint joint=False):
+    """
+    Two-stage blind phase search of all modes of a signal in a single parallel region. The first stage searches the
+    testangles, the second stage the fineangles around the angle of the first stage. The second stage reuses the
+    symbol decisions of the first stage instead of slicing the signal again and the per sample angles are never
+    stored, instead all first and second stage rotations are taken from a table of Ntestangles*B phasors.
+    The memory use is O(nthreads*nmodes*N*Ntestangles) independent of the signal length (see bps_modes).
+
+    Parameters
+    ----------
+    E : array_like
+        input signal, shape (nmodes, L)
+    testangles : array_like
+        first stage test angles
+    fineangles : array_like
+        second stage test angles, relative to the first stage angle
+    symbols : array_like
+        the symbols of the modulation format
+    N : int
+        half of the averaging window length
+    joint : bool, optional
+        sum the distances of all modes to select the same angle for all modes (modes sharing one LO)
+
+    Returns
+    -------
+    ph : array_like
+        phase estimate for every sample, shape (nmodes, L), the first and last N samples are set to the closest
+        estimate
+    """
+    cdef Py_ssize_t b, c0, c1, mb, m0, m1
+    cdef Py_ssize_t nmodes = E.shape[0]
+    cdef Py_ssize_t L = E.shape[1]
+    cdef Py_ssize_t W = 2*N
+    cdef Py_ssize_t Nt = testangles.shape[0]
+    cdef Py_ssize_t B = fineangles.shape[0]
+    cdef Py_ssize_t Ngroups, Nblocks, blocklen, nm
+    cdef int nthreads = openmp.omp_get_max_threads()
+    cdef int t
+    cdef double complex[:] comp1
+    cdef double complex[:,:] comp2
+    cdef double[:,:,::1] ring1, ring2
+    cdef double[:,::1] sums1, sums2
+    cdef int[:,:,:,::1] symring
+    cdef int[:,::1] k1buf
+    cdef int[:,:,::1] symbuf
+    cdef double[:,::1] ph = np.zeros((nmodes, L), dtype=np.float64)
+    cdef cython_equalisation.SymbolSlicer slicer = cython_equalisation.get_symbol_slicer(np.asarray(symbols))
+    if L <= W or N < 1 or nmodes == 0:
+        return np.asarray(ph)
+    comp1 = np.exp(1.j*np.asarray(testangles))
+    comp2 = np.exp(1.j*(np.asarray(testangles)[:, np.newaxis] + np.asarray(fineangles)[np.newaxis, :]))
+    Ngroups = 1 if joint else nmodes
+    nm = nmodes if joint else 1
+    blocklen = max(8*W, 2**14)
+    Nblocks = (L - W + blocklen - 1)//blocklen
+    if Ngroups*Nblocks < nthreads:
+        blocklen = max((L - W)*Ngroups//nthreads, 1)
+        Nblocks = (L - W + blocklen - 1)//blocklen
+    nthreads = min(nthreads, Ngroups*Nblocks)
+    ring1 = np.zeros((nthreads, W, Nt), dtype=np.float64)
+    sums1 = np.zeros((nthreads, Nt), dtype=np.float64)
+    symring = np.zeros((nthreads, nm, W, Nt), dtype=np.intc)
+    ring2 = np.zeros((nthreads, W, B), dtype=np.float64)
+    sums2 = np.zeros((nthreads, B), dtype=np.float64)
+    k1buf = np.zeros((nthreads, blocklen + W), dtype=np.intc)
+    symbuf = np.zeros((nthreads, nm, blocklen + W), dtype=np.intc)
+    for mb in prange(Ngroups*Nblocks, schedule='dynamic', nogil=True, num_threads=nthreads):
+        t = threadid()
+        b = mb % Nblocks
+        if joint:
+            m0 = 0
+            m1 = nmodes
+        else:
+            m0 = mb // Nblocks
+            m1 = m0 + 1
+        c0 = N + b*blocklen
+        c1 = min(c0 + blocklen, L - N)
+        _bps_twostage_block(E, testangles, fineangles, comp1, comp2, slicer, m0, m1, c0, c1, N, t,
+                            ring1, sums1, symring, ring2, sums2, k1buf, symbuf, ph)
+    out = np.asarray(ph)
+    out[:, :N] = out[:, N:N+1]
+    out[:, L-N:] = out[:, L-N-1:L-N]
+    return out
+
+def bps(cython_equalisation.complexing[:] E, cython.floating[:,:] testangles, cython_equalisation.complexing[:] symbols, int N):
+    """
+    Blind phase search of a single mode, see bps_modes.
+
+    Parameters
+    ----------
+    E : array_like
+        input signal (single polarisation)
+    testangles : array_like
+        test angles, either of shape (1, Ntestangles) or (L, Ntestangles) for different angles at every sample
+    symbols : array_like
+        the symbols of the modulation format
+    N : int
+        half of the averaging window length
+
+    Returns
+    -------
+    idx : array_like
+        index of the test angle for every sample
+    """
+    return bps_modes(np.asarray(E)[np.newaxis, :], testangles, symbols, N)[0]
+
+cdef Py_ssize_t _ELEMENTWISE_BLOCK = 2**14
+
+def _check_out(E, out):
+    if out is None:
+        return np.empty(E.shape, dtype=E.dtype)
+    if out.shape != E.shape or out.dtype != E.dtype:
+        raise ValueError("out needs to have the shape and dtype of the input")
+    return out
+
+def rotate_phase(const cython_equalisation.complexing[:,:] E, const cython.floating[:,:] phase, out=None):
+    """
+    Multiply the signal by exp(1j*phase) in a single parallel pass without temporary arrays.
+
+    Parameters
+    ----------
+    E : array_like
+        input signal, shape (nmodes, L)
+    phase : array_like
+        phase in radians, shape (nmodes, L) or (1, L) to apply the same phase to all modes
+    out : array_like, optional
+        output array with the shape and dtype of E, can be E itself for an in-place rotation
+
+    Returns
+    -------
+    out : array_like
+        rotated signal
+    """
+    cdef Py_ssize_t nmodes = E.shape[0]
+    cdef Py_ssize_t L = E.shape[1]
+    cdef Py_ssize_t Nblocks = (L + _ELEMENTWISE_BLOCK - 1)//_ELEMENTWISE_BLOCK
+    cdef Py_ssize_t mb, m, pm, k
+    cdef double ph
+    cdef cython_equalisation.complexing[:,:] o
+    if phase.shape[1] != L or phase.shape[0] not in (1, nmodes):
+        raise ValueError("phase needs to be of shape (nmodes, L) or (1, L)")
+    out = _check_out(np.asarray(E), out)
+    o = out
+    for mb in prange(nmodes*Nblocks, schedule='static', nogil=True):
+        m = mb // Nblocks
+        pm = m if phase.shape[0] > 1 else 0
+        for k in range((mb % Nblocks)*_ELEMENTWISE_BLOCK, min((mb % Nblocks + 1)*_ELEMENTWISE_BLOCK, L)):
+            ph = phase[pm, k]
+            o[m, k] = E[m, k]*(cos(ph) + 1j*sin(ph))
+    return out
+
+def rotate_ramp(const cython_equalisation.complexing[:,:] E, const double[:] phi0, const double[:] dphi, out=None):
+    """
+    Multiply the signal by exp(1j*(phi0 + k*dphi)) for sample k in a single parallel pass, e.g. to add or remove
+    a frequency offset (dphi = 2*pi*f/fs) or a constant phase (dphi = 0), without building the phase array.
+
+    Parameters
+    ----------
+    E : array_like
+        input signal, shape (nmodes, L)
+    phi0 : array_like
+        phase of the first sample for every mode
+    dphi : array_like
+        phase increment per sample for every mode
+    out : array_like, optional
+        output array with the shape and dtype of E, can be E itself for an in-place rotation
+
+    Returns
+    -------
+    out : array_like
+        rotated signal
+    """
+    cdef Py_ssize_t nmodes = E.shape[0]
+    cdef Py_ssize_t L = E.shape[1]
+    cdef Py_ssize_t Nblocks = (L + _ELEMENTWISE_BLOCK - 1)//_ELEMENTWISE_BLOCK
+    cdef Py_ssize_t mb, m, k
+    cdef double ph
+    cdef cython_equalisation.complexing[:,:] o
+    if phi0.shape[0] != nmodes or dphi.shape[0] != nmodes:
+        raise ValueError("phi0 and dphi need one value per mode")
+    out = _check_out(np.asarray(E), out)
+    o = out
+    for mb in prange(nmodes*Nblocks, schedule='static', nogil=True):
+        m = mb // Nblocks
+        for k in range((mb % Nblocks)*_ELEMENTWISE_BLOCK, min((mb % Nblocks + 1)*_ELEMENTWISE_BLOCK, L)):
+            ph = phi0[m] + k*dphi[m]
+            o[m, k] = E[m, k]*(cos(ph) + 1j*sin(ph))
+    return out
+
+def mean_power(const cython_equalisation.complexing[:,:] E):
+    """
+    Mean and mean power of every mode in a single parallel pass. The sums are accumulated in double precision
+    per block and the block sums are added afterwards.
+
+    Parameters
+    ----------
+    E : array_like
+        input signal, shape (nmodes, L)
+
+    Returns
+    -------
+    mean : array_like
+        complex mean of every mode
+    power : array_like
+        mean of abs(E)**2 of every mode
+    """
+    cdef Py_ssize_t nmodes = E.shape[0]
+    cdef Py_ssize_t L = E.shape[1]
+    cdef Py_ssize_t Nblocks = (L + _ELEMENTWISE_BLOCK - 1)//_ELEMENTWISE_BLOCK
+    cdef Py_ssize_t mb, m, k
+    cdef double complex s
+    cdef double p
+    cdef double complex[:,::1] sums = np.zeros((nmodes, Nblocks), dtype=np.complex128)
+    cdef double[:,::1] powers = np.zeros((nmodes, Nblocks), dtype=np.float64)
+    for mb in prange(nmodes*Nblocks, schedule='static', nogil=True):
+        m = mb // Nblocks
+        s = 0
+        p = 0
+        for k in range((mb % Nblocks)*_ELEMENTWISE_BLOCK, min((mb % Nblocks + 1)*_ELEMENTWISE_BLOCK, L)):
+            s = s + E[m, k]
+            p = p + cabssq(E[m, k])
+        sums[m, mb % Nblocks] = s
+        powers[m, mb % Nblocks] = p
+    return np.sum(sums, axis=1)/L, np.sum(powers, axis=1)/L
+
+def normalise_center(const cython_equalisation.complexing[:,:] E, out=None):
+    """
+    Remove the mean of every mode and normalise it to unit power. The mean (see mean_power) and the power of the
+    centred samples are calculated in parallel passes, so a large DC offset does not cancel the variance, and the
+    normalisation is done in a final fused pass.
+
+    Parameters
+    ----------
+    E : array_like
+        input signal, shape (nmodes, L)
+    out : array_like, optional
+        output array with the shape and dtype of E, can be E itself to normalise in-place
+
+    Returns
+    -------
+    out : array_like
+        normalised signal
+    """
+    cdef Py_ssize_t nmodes = E.shape[0]
+    cdef Py_ssize_t L = E.shape[1]
+    cdef Py_ssize_t Nblocks = (L + _ELEMENTWISE_BLOCK - 1)//_ELEMENTWISE_BLOCK
+    cdef Py_ssize_t mb, m, k
+    cdef cython_equalisation.complexing[:,:] o
+    cdef double complex[::1] mu
+    cdef double[::1] scale
+    cdef double[:,::1] powers = np.zeros((nmodes, Nblocks), dtype=np.float64)
+    cdef double p
+    mean, _ = mean_power(E)
+    mu = mean
+    for mb in prange(nmodes*Nblocks, schedule='static', nogil=True):
+        m = mb // Nblocks
+        p = 0
+        for k in range((mb % Nblocks)*_ELEMENTWISE_BLOCK, min((mb % Nblocks + 1)*_ELEMENTWISE_BLOCK, L)):
+            p = p + cabssq(E[m, k] - mu[m])
+        powers[m, mb % Nblocks] = p
+    scale = 1/np.sqrt(np.sum(powers, axis=1)/L)
+    out = _check_out(np.asarray(E), out)
+    o = out
+    for mb in prange(nmodes*Nblocks, schedule='static', nogil=True):
+        m = mb // Nblocks
+        for k in range((mb % Nblocks)*_ELEMENTWISE_BLOCK, min((mb % Nblocks + 1)*_ELEMENTWISE_BLOCK, L)):
+            o[m, k] = (E[m, k] - mu[m])*scale[m]
+    return out
+
+def pll_dd(const cython_equalisation.complexing[:,:] E, cython_equalisation.complexing[:] symbols, double kp, double ki,
+           double[:,::1] state, coarse=None, out=None):
+    """
+    Decision-directed second-order phase locked loop for all modes (in parallel over the modes).
+
+    Every sample is rotated by the current phase estimate (plus the coarse phase if given), decided with the
+    SymbolSlicer and the phase error Im(z*conj(d))/abs(d)**2 updates the loop:
+
+        freq = freq + ki*err
+        phase = phase + kp*err + freq
+
+    The loop state is read from and written back to state, so consecutive chunks of a signal can be processed
+    by passing the same state array. The cost per sample is constant.
+
+    Parameters
+    ----------
+    E : array_like
+        input signal, shape (nmodes, L)
+    symbols : array_like
+        the symbols of the modulation format
+    kp : float
+        proportional gain of the loop filter
+    ki : float
+        integral gain of the loop filter
+    state : array_like
+        loop state of shape (2, nmodes), the phase and the phase increment per sample of every mode, updated
+        in-place
+    coarse : array_like, optional
+        feed-forward phase estimate of shape (nmodes, L) which is removed before the loop, the loop then tracks
+        the residual phase
+    out : array_like, optional
+        output array with the shape and dtype of E
+
+    Returns
+    -------
+    out : array_like
+        phase compensated signal
+    phase : array_like
+        total phase estimate for every sample, shape (nmodes, L)
+    """
+    cdef Py_ssize_t nmodes = E.shape[0]
+    cdef Py_ssize_t L = E.shape[1]
+    cdef Py_ssize_t m, k
+    cdef int q
+    cdef bint has_coarse = coarse is not None
+    cdef double th, fr, err, phi
+    cdef double complex z, d
+    cdef cython_equalisation.complexing[:,:] o
+    cdef const double[:,:] cph
+    cdef double[:,::1] ph
+    cdef cython_equalisation.SymbolSlicer slicer = cython_equalisation.get_symbol_slicer(np.asarray(symbols))
+    if state.shape[0] != 2 or state.shape[1] != nmodes:
+        raise ValueError("state needs to be of shape (2, nmodes)")
+    if has_coarse:
+        cph = np.asarray(coarse, dtype=np.float64)
+        if cph.shape[0] != nmodes or cph.shape[1] != L:
+            raise ValueError("coarse needs to be of shape (nmodes, L)")
+    else:
+        cph = np.zeros((1, 1))
+    out = _check_out(np.asarray(E), out)
+    o = out
+    ph = np.zeros((nmodes, L), dtype=np.float64)
+    for m in prange(nmodes, schedule='static', nogil=True):
+        th = state[0, m]
+        fr = state[1, m]
+        for k in range(L):
+            phi = th
+            if has_coarse:
+                phi = phi + cph[m, k]
+            z = E[m, k]*(cos(phi) - 1j*sin(phi))
+            q = slicer.nearest(z.real, z.imag)
+            d = slicer.symbols[q]
+            err = (z.imag*d.real - z.real*d.imag)/(d.real*d.real + d.imag*d.imag)
+            o[m, k] = z
+            ph[m, k] = phi
+            fr = fr + ki*err
+            th = th + kp*err + fr
+        state[0, m] = th
+        state[1, m] = fr
+    return out, np.asarray(ph)
 
 cpdef int[:] select_angle_index(cython.floating[:,:] x, int N):
     cdef cython.floating[:,:] csum
@@ -126,6 +714,37 @@ cpdef select_angles(cython.floating[:,:] angles, cython.integral[:] idx):
             angles_out[i] = angles[0, idx[i] ]
     return np.array(angles_out)
 
+ctypedef fused symbol_index:
+    np.uint8_t
+    np.uint16_t
+
+cpdef np.int64_t count_bit_errors(symbol_index[:] idx_tx, symbol_index[:] idx_rx, np.uint8_t[:,::1] hamming_table):
+    """
+    Count the number of bit errors between transmitted and received symbol indices using a table of
+    Hamming distances between all symbol pairs.
+
+    Parameters
+    ----------
+    idx_tx : array_like
+        transmitted symbol indices (uint8 or uint16)
+    idx_rx : array_like
+        received symbol indices, same length and dtype as idx_tx
+    hamming_table : array_like
+        M x M table of the Hamming distances between the bit words of the symbols
+
+    Returns
+    -------
+    nerr : int
+        total number of bit errors
+    """
+    cdef Py_ssize_t i, L = idx_tx.shape[0]
+    cdef np.int64_t nerr = 0
+    if idx_rx.shape[0] != L:
+        raise ValueError("Transmitted and received indices need to have the same length")
+    for i in prange(L, schedule='static', nogil=True):
+        nerr += hamming_table[idx_tx[i], idx_rx[i]]
+    return nerr
+
 cpdef double[:] soft_l_value_demapper(cython_equalisation.complexing[:] rx_symbs, int M, double snr, cython_equalisation.complexing[:,:,:] bits_map):
     cdef int num_bits = int(np.log2(M))
     cdef double[:] L_values = np.zeros(rx_symbs.shape[0]*num_bits)
@@ -169,6 +788,294 @@ cpdef double[:] soft_l_value_demapper_minmax(cython_equalisation.complexing[:] r
             L_values[symb*num_bits + bit] = snr*(tmp2-tmp)
     return L_values
 
+cdef double _log_subset_max_sum(const double *e, const np.uint8_t[:,:,:] bit_table, int d, int b, int val,
+                                int npts) noexcept nogil:
+    """
+    log(sum(exp(e[p]))) over the points p of dimension d with bit b equal to val, relative to the largest exponent
+    of the subset.
+    """
+    cdef int p
+    cdef double s = 0, m = -1e300
+    for p in range(npts):
+        if bit_table[d, p, b] == val and e[p] > m:
+            m = e[p]
+    for p in range(npts):
+        if bit_table[d, p, b] == val:
+            s = s + exp(e[p] - m)
+    return m + log(s)
+
+cdef double _log_subset_ratio(const double *e, const double *w, const np.uint8_t[:,:,:] bit_table, int d, int b,
+                              int npts) noexcept nogil:
+    """
+    log(sum(exp(e[p]) for bit b = 1) / sum(exp(e[p]) for bit b = 0)) over the points p of dimension d, using the
+    weights w = exp(e - max(e)). If one of the sums underflows the subsets are recalculated relative to their own
+    largest exponent.
+    """
+    cdef int p
+    cdef double s0 = 0, s1 = 0
+    for p in range(npts):
+        if bit_table[d, p, b]:
+            s1 = s1 + w[p]
+        else:
+            s0 = s0 + w[p]
+    if s0 > 1e-250 and s1 > 1e-250:
+        return log(s1/s0)
+    return (_log_subset_max_sum(e, bit_table, d, b, 1, npts) - _log_subset_max_sum(e, bit_table, d, b, 0, npts))
+
+cdef void _symbol_l_values(double re, double im, double snr, const double complex[:,::1] points,
+                           const np.uint8_t[:,:,:] bit_table, const int[:] bit_dim, bint separable, bint maxlog,
+                           double *ebuf, double *wbuf, double *emax, double *lv) noexcept nogil:
+    """
+    L-values of all bits of a single received symbol. For a separable mapping points holds the PAM levels of the
+    in-phase (d=0) and quadrature (d=1) dimension, otherwise the single dimension holds all constellation points.
+    The exponents are calculated once per point and shared by all bits. ebuf and wbuf are scratch buffers of
+    size ndim*npts, emax of size ndim and the L-values are written to lv.
+    """
+    cdef int ndim = points.shape[0], npts = points.shape[1], num_bits = bit_dim.shape[0]
+    cdef int p, b, d
+    cdef double r, e, m0, m1
+    for d in range(ndim):
+        if d == 0:
+            r = re
+        else:
+            r = im
+        emax[d] = -1e300
+        for p in range(npts):
+            if separable:
+                e = -snr*(creal(points[d, p]) - r)*(creal(points[d, p]) - r)
+            else:
+                e = -snr*((creal(points[d, p]) - re)*(creal(points[d, p]) - re) +
+                          (cimag(points[d, p]) - im)*(cimag(points[d, p]) - im))
+            ebuf[d*npts + p] = e
+            if e > emax[d]:
+                emax[d] = e
+        if not maxlog:
+            for p in range(npts):
+                wbuf[d*npts + p] = exp(ebuf[d*npts + p] - emax[d])
+    for b in range(num_bits):
+        d = bit_dim[b]
+        if maxlog:
+            m0 = -1e300
+            m1 = -1e300
+            for p in range(npts):
+                e = ebuf[d*npts + p]
+                if bit_table[d, p, b]:
+                    if e > m1:
+                        m1 = e
+                elif e > m0:
+                    m0 = e
+            lv[b] = m1 - m0
+        else:
+            lv[b] = _log_subset_ratio(&ebuf[d*npts], &wbuf[d*npts], bit_table, d, b, npts)
+
+def soft_l_value_demapper_pam(cython_equalisation.complexing[:] rx_symbs, double snr, double[:] levels,
+                              np.uint8_t[:,:,:] bit_table, int[:] bit_dim, bint maxlog=False):
+    """
+    Separable L-value demapper for square QAM with a bit mapping where every bit only depends on either the
+    in-phase or the quadrature component (e.g. Gray coded square QAM).
+
+    The QAM sum over all symbols of a bit subset factorises into a sum over the sqrt(M) PAM levels of the
+    dimension the bit depends on, and the sum over the other dimension cancels in the ratio. For every received
+    symbol only 2*sqrt(M) exponentials are evaluated, which are shared by all bits, and the subset sums are
+    taken relative to the largest term (log-sum-exp) so they do not underflow at high SNR. The received symbols
+    are processed in parallel.
+
+    Parameters
+    ----------
+    rx_symbs : array_like
+        received symbols
+    snr : float
+        linear signal-to-noise ratio
+    levels : array_like
+        the PAM levels of both dimensions
+    bit_table : array_like
+        bit values of shape (2, npam, nbits), bit_table[d, p, b] is bit b of level p in dimension d (0 in-phase,
+        1 quadrature)
+    bit_dim : array_like
+        dimension that every bit depends on
+    maxlog : bool, optional
+        use the max-log approximation instead of the exact log-sum-exp
+
+    Returns
+    -------
+    L_values : array_like
+        L-values log(P(b=1)/P(b=0)) for every symbol and bit (bits of a symbol are consecutive)
+    """
+    cdef Py_ssize_t N = rx_symbs.shape[0]
+    cdef int npam = levels.shape[0]
+    cdef int num_bits = bit_dim.shape[0]
+    cdef int nthreads = openmp.omp_get_max_threads()
+    cdef double complex[:,::1] points = np.tile(np.asarray(levels, dtype=np.complex128), (2, 1))
+    cdef double[:,::1] L_values = np.zeros((N, num_bits))
+    cdef double[:,:,::1] ebuf = np.zeros((nthreads, 2, npam))
+    cdef double[:,:,::1] wbuf = np.zeros((nthreads, 2, npam))
+    cdef double[:,::1] emax = np.zeros((nthreads, 2))
+    cdef Py_ssize_t i
+    cdef int t
+    for i in prange(N, schedule='static', nogil=True, num_threads=nthreads):
+        t = threadid()
+        _symbol_l_values(creal(rx_symbs[i]), cimag(rx_symbs[i]), snr, points, bit_table, bit_dim, True, maxlog,
+                         &ebuf[t, 0, 0], &wbuf[t, 0, 0], &emax[t, 0], &L_values[i, 0])
+    return np.asarray(L_values).reshape(-1)
+
+cdef inline double _softplus(double x) noexcept nogil:
+    """
+    log(1 + exp(x)) without overflow, the correction term is below double precision for |x| > 40
+    """
+    if x > 40:
+        return x
+    elif x > 0:
+        return x + log1p(exp(-x))
+    elif x > -40:
+        return log1p(exp(x))
+    return 0
+
+def gmi_accumulate(cython_equalisation.complexing[:,:] rx_symbs, symbol_index[:,:] idx_tx, double[:] snr,
+                   double complex[:,::1] points, np.uint8_t[:,:,:] bit_table, int[:] bit_dim,
+                   np.uint8_t[:,:] tx_bits, bint separable, bint maxlog=False, double[:,::1] l_values=None):
+    """
+    Fused soft demapping and GMI calculation for all modes.
+
+    The L-values of every received symbol are calculated into a small per-thread buffer and the GMI terms
+    log2(1 + exp((-1)^b L)) of the transmitted bits are accumulated directly, so no array of L-values or bits
+    is created. The symbols of all modes are processed in one parallel loop.
+
+    Parameters
+    ----------
+    rx_symbs : array_like
+        received symbols of shape (nmodes, N)
+    idx_tx : array_like
+        indices of the transmitted symbols (uint8 or uint16) of shape (nmodes, N), synchronized to rx_symbs
+    snr : array_like
+        linear signal-to-noise ratio per mode
+    points : array_like
+        demapping points of shape (ndim, npts), the PAM levels of both dimensions if separable otherwise the
+        constellation points in a single dimension
+    bit_table : array_like
+        bit values of the points of shape (ndim, npts, nbits)
+    bit_dim : array_like
+        dimension that every bit depends on
+    tx_bits : array_like
+        bits of the transmitted symbols of shape (M, nbits)
+    separable : bool
+        whether points are PAM levels of the in-phase and quadrature dimension
+    maxlog : bool, optional
+        use the max-log approximation instead of the exact log-sum-exp
+    l_values : array_like, optional
+        if given, array of shape (nmodes, N*nbits) the L-values are written to
+
+    Returns
+    -------
+    gmi : array_like
+        generalized mutual information per mode
+    gmi_per_bit : array_like
+        generalized mutual information per bit per mode, shape (nmodes, nbits)
+    """
+    cdef Py_ssize_t nmodes = rx_symbs.shape[0], N = rx_symbs.shape[1]
+    cdef int ndim = points.shape[0], npts = points.shape[1]
+    cdef int num_bits = bit_dim.shape[0]
+    cdef int nthreads = openmp.omp_get_max_threads()
+    cdef double[:,:,::1] ebuf = np.zeros((nthreads, ndim, npts))
+    cdef double[:,:,::1] wbuf = np.zeros((nthreads, ndim, npts))
+    cdef double[:,::1] emax = np.zeros((nthreads, ndim))
+    cdef double[:,::1] lbuf = np.zeros((nthreads, num_bits))
+    cdef double[:,:,::1] acc = np.zeros((nthreads, nmodes, num_bits))
+    cdef bint store = l_values is not None
+    cdef Py_ssize_t i, j, mode
+    cdef int t, b
+    cdef double x
+    if idx_tx.shape[0] != nmodes or idx_tx.shape[1] != N or snr.shape[0] < nmodes:
+        raise ValueError("rx_symbs, idx_tx and snr need to have matching shapes")
+    if store and (l_values.shape[0] != nmodes or l_values.shape[1] != N*num_bits):
+        raise ValueError("l_values needs to have shape (nmodes, N*nbits)")
+    for i in prange(nmodes*N, schedule='static', nogil=True, num_threads=nthreads):
+        t = threadid()
+        mode = i // N
+        j = i - mode*N
+        _symbol_l_values(creal(rx_symbs[mode, j]), cimag(rx_symbs[mode, j]), snr[mode], points, bit_table,
+                         bit_dim, separable, maxlog, &ebuf[t, 0, 0], &wbuf[t, 0, 0], &emax[t, 0], &lbuf[t, 0])
+        for b in range(num_bits):
+            x = lbuf[t, b]
+            if store:
+                l_values[mode, j*num_bits + b] = x
+            if tx_bits[idx_tx[mode, j], b]:
+                x = -x
+            acc[t, mode, b] = acc[t, mode, b] + _softplus(x)
+    gmi_per_bit = 1 - np.sum(acc, axis=0)/(N*np.log(2))
+    return np.sum(gmi_per_bit, axis=-1), gmi_per_bit
+
+def gmi_quadrature(double complex[:,::1] points, np.uint8_t[:,:,:] bit_table, int[:] bit_dim, bint separable,
+                   double[:] snr, double[:] nodes, double[:] weights):
+    """
+    Theoretical GMI of a constellation in AWGN using Gauss-Hermite quadrature over the noise.
+
+    The GMI is Nbits - E[sum_b log2(1 + exp((-1)^b L_b))] over the uniformly distributed symbols and the noise,
+    where L_b are the L-values of the received symbol. For a separable mapping every bit only depends on the
+    noise of its dimension, so the expectation is taken over the PAM levels with a 1D quadrature in both
+    dimensions at once, otherwise over all constellation points with a 2D quadrature. The SNRs are calculated
+    in parallel.
+
+    Parameters
+    ----------
+    points : array_like
+        demapping points of shape (ndim, npts), see gmi_accumulate
+    bit_table : array_like
+        bit values of the points of shape (ndim, npts, nbits)
+    bit_dim : array_like
+        dimension that every bit depends on
+    separable : bool
+        whether points are PAM levels of the in-phase and quadrature dimension
+    snr : array_like
+        linear signal-to-noise ratios
+    nodes : array_like
+        Gauss-Hermite nodes (for the weight function exp(-x**2))
+    weights : array_like
+        Gauss-Hermite weights
+
+    Returns
+    -------
+    gmi : array_like
+        GMI for every SNR
+    """
+    cdef Py_ssize_t nsnr = snr.shape[0], k
+    cdef int ndim = points.shape[0], npts = points.shape[1]
+    cdef int num_bits = bit_dim.shape[0], nq = nodes.shape[0]
+    cdef int nthreads = openmp.omp_get_max_threads()
+    cdef double[:,:,::1] ebuf = np.zeros((nthreads, ndim, npts))
+    cdef double[:,:,::1] wbuf = np.zeros((nthreads, ndim, npts))
+    cdef double[:,::1] emax = np.zeros((nthreads, ndim))
+    cdef double[:,::1] lbuf = np.zeros((nthreads, num_bits))
+    cdef double[::1] gmi = np.zeros(nsnr)
+    cdef int t, p, i, j, b, nj
+    cdef double sigma, re, im, w, acc, x
+    cdef double pi = np.pi
+    # for the separable case both dimensions are evaluated at the same 1D noise value
+    nj = 1 if separable else nq
+    for k in prange(nsnr, schedule='dynamic', nogil=True, num_threads=nthreads):
+        t = threadid()
+        sigma = 1/sqrt(snr[k])
+        acc = 0
+        for p in range(npts):
+            for i in range(nq):
+                for j in range(nj):
+                    if separable:
+                        re = creal(points[0, p]) + sigma*nodes[i]
+                        im = re
+                        w = weights[i]/sqrt(pi)
+                    else:
+                        re = creal(points[0, p]) + sigma*nodes[i]
+                        im = cimag(points[0, p]) + sigma*nodes[j]
+                        w = weights[i]*weights[j]/pi
+                    _symbol_l_values(re, im, snr[k], points, bit_table, bit_dim, separable, False, &ebuf[t, 0, 0],
+                                     &wbuf[t, 0, 0], &emax[t, 0], &lbuf[t, 0])
+                    for b in range(num_bits):
+                        x = lbuf[t, b]
+                        if bit_table[bit_dim[b], p, b]:
+                            x = -x
+                        acc = acc + w*_softplus(x)
+        gmi[k] = num_bits - acc/(npts*log(2))
+    return np.asarray(gmi)
+
 cpdef prbs_ext(np.int64_t seed, taps, int nbits, int N):
     cdef int t
     cdef np.int64_t xor, sr
@@ -1 +1 @@
-from qampy.core.equalisation.equalisation import equalise_signal, dual_mode_equalisation, apply_filter
+from qampy.core.equalisation.equalisation import equalise_signal, dual_mode_equalisation, apply_filter, apply_filter_fft
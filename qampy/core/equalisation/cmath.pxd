@@ -19,3 +19,18 @@ cdef extern from "math.h" nogil:
 cdef extern from "math.h" nogil:
     float powf(float, float)
 
+
+cdef extern from "math.h" nogil:
+    double floor(double)
+
+cdef extern from "math.h" nogil:
+    double sqrt(double)
+
+cdef extern from "math.h" nogil:
+    double atan2(double, double)
+
+cdef extern from "math.h" nogil:
+    double cos(double)
+
+cdef extern from "math.h" nogil:
+    double log1p(double)
@@ -7,8 +7,22 @@ ctypedef fused complexing:
     float complex
     double complex
 
+cdef class SymbolSlicer:
+    cdef double complex[:] symbols
+    cdef int M
+    cdef double x0, y0, invdx, invdy
+    cdef int nx, ny
+    cdef bint full
+    cdef int[:] cell_start
+    cdef int[:] cell_idx
+    cdef int nearest(self, double re, double im) noexcept nogil
+    cdef int nearest_linear(self, double re, double im) noexcept nogil
+
+cpdef SymbolSlicer get_symbol_slicer(symbols)
+
 cdef class ErrorFct:
     cpdef double complex calc_error(self, double complex Xest)
     cpdef float complex calc_errorf(self, float complex Xest)
 cdef partition_value(cython.floating signal, double[:] partitions, double[:] codebook)
 cdef complexing det_symbol(complexing[:] syms, int M, complexing value, cython.floating *dists) nogil
+cdef complexing det_symbol_slicer(complexing[:] syms, SymbolSlicer slicer, complexing value, cython.floating *dists) noexcept nogil
@@ -25,6 +25,9 @@ from cpython cimport bool
 cimport numpy as np
 cimport scipy.linalg.cython_blas as scblas
 from ccomplex cimport *
+from cmath cimport floor
+from libc.string cimport memcpy
+from libc.stdint cimport uint64_t
 
 cdef class ErrorFct:
     cpdef double complex calc_error(self, double complex Xest):
@@ -63,6 +66,209 @@ cdef complexing det_symbol(complexing[:] syms, int M, complexing value, cython.f
     dists[0] = dist0
     return symbol
 
+def _lattice_coordinates(symbols, rtol=1e-6):
+    """
+    Find the integer lattice coordinates of a constellation if the symbols lie on a rectangular lattice.
+
+    Parameters
+    ----------
+    symbols : array_like
+        symbol alphabet (1D array, dtype=complex)
+    rtol    : float, optional
+        relative tolerance for symbols to lie on the lattice
+
+    Returns
+    -------
+    coords : tuple(array_like, array_like, float, float, float, float) or None
+        integer coordinates along the real and imaginary axes, position of the lattice point (0,0) and the lattice
+        spacing along the real and imaginary axes. None if the symbols do not lie on a lattice.
+    """
+    out = []
+    for x in [symbols.real, symbols.imag]:
+        ux = np.unique(x)
+        if ux.size < 2:
+            return None
+        d = np.min(np.diff(ux))
+        a = (x - ux[0])/d
+        ai = np.round(a).astype(np.intc)
+        if np.max(abs(a - ai)) > rtol*ai.max():
+            return None
+        out.append((ai, ux[0], d))
+    (a, x0, dx), (b, y0, dy) = out
+    if np.unique(a.astype(np.int64)*(b.max()+1) + b).size != symbols.size:
+        return None
+    return a, b, x0, y0, dx, dy
+
+cdef inline bint _isfinite(double x) noexcept nogil:
+    # test the exponent bits, comparisons with NaN can be optimised away with -ffast-math
+    cdef uint64_t bits
+    memcpy(&bits, &x, sizeof(double))
+    return (bits & 0x7ff0000000000000ULL) != 0x7ff0000000000000ULL
+
+cdef class SymbolSlicer:
+    """
+    Nearest symbol search (slicer) using a 2D grid lookup table.
+
+    For constellations on a full rectangular lattice (square QAM) the decision is done by rounding the real and
+    imaginary part onto the lattice. For constellations which occupy only part of a lattice (e.g. cross QAM) every
+    cell of the lattice which contains a symbol decides for that symbol, while the empty cells contain a list of
+    the candidate symbols which can be nearest to any point in the cell. For arbitrary constellations a grid
+    with candidate lists is used for all cells. Values outside of the grid fall back to a linear search.
+
+    Parameters
+    ----------
+    symbols : array_like
+        symbol alphabet (1D array, dtype=complex)
+    ncells_max : int, optional
+        maximum number of grid cells along one axis for non-lattice constellations
+    """
+    def __init__(self, symbols, int ncells_max=128):
+        syms = np.ascontiguousarray(symbols, dtype=np.complex128)
+        self.symbols = syms
+        self.M = syms.shape[0]
+        coords = _lattice_coordinates(syms)
+        if coords is not None:
+            a, b, x0, y0, dx, dy = coords
+            nx = a.max() + 1
+            ny = b.max() + 1
+            self.full = nx*ny == self.M
+            # cross constellations get a margin of empty cells to catch the values around the missing corners
+            margin = 0 if self.full else 2
+            a = a + margin
+            b = b + margin
+            nx += 2*margin
+            ny += 2*margin
+            x0 -= (margin + 0.5)*dx
+            y0 -= (margin + 0.5)*dy
+            grid = np.full((nx, ny), -1, dtype=np.intc)
+            grid[a, b] = np.arange(self.M)
+        else:
+            self.full = False
+            xmin, xmax = syms.real.min(), syms.real.max()
+            ymin, ymax = syms.imag.min(), syms.imag.max()
+            span = max(xmax - xmin, ymax - ymin, 1e-12)
+            n = int(min(ncells_max, max(8, 4*np.sqrt(self.M))))
+            dx = dy = 1.2*span/n
+            x0 = (xmin + xmax)/2 - n*dx/2
+            y0 = (ymin + ymax)/2 - n*dy/2
+            nx = ny = n
+            grid = np.full((nx, ny), -1, dtype=np.intc)
+        self.x0 = x0
+        self.y0 = y0
+        self.invdx = 1/dx
+        self.invdy = 1/dy
+        self.nx = nx
+        self.ny = ny
+        # candidates for the cells without a symbol: any point p in a cell with centre c and half diagonal r
+        # has its nearest symbol s within |c-s| <= min_s|c-s| + 2r
+        r = 0.5*np.sqrt(dx**2 + dy**2)
+        ai, bi = np.nonzero(grid < 0)
+        centres = (x0 + (ai + 0.5)*dx) + 1j*(y0 + (bi + 0.5)*dy)
+        cands = [None]*centres.size
+        for i in range(0, centres.size, 1024):
+            d = abs(centres[i:i+1024, np.newaxis] - syms[np.newaxis, :])
+            mask = d <= d.min(axis=1)[:, np.newaxis] + 2*r*(1 + 1e-9)
+            for j in range(mask.shape[0]):
+                cands[i+j] = np.nonzero(mask[j])[0]
+        cell_lists = [[g] for g in grid.flatten()]
+        for j, k in enumerate(ai*ny + bi):
+            cell_lists[k] = cands[j]
+        counts = np.array([len(c) for c in cell_lists])
+        self.cell_start = np.hstack([[0], np.cumsum(counts)]).astype(np.intc)
+        self.cell_idx = np.hstack(cell_lists).astype(np.intc)
+
+    cdef int nearest_linear(self, double re, double im) noexcept nogil:
+        cdef int j, idx = 0
+        cdef double dist, dist0 = 1e300
+        for j in range(self.M):
+            dist = (self.symbols[j].real - re)**2 + (self.symbols[j].imag - im)**2
+            if dist < dist0:
+                idx = j
+                dist0 = dist
+        return idx
+
+    cdef int nearest(self, double re, double im) noexcept nogil:
+        cdef double fx = (re - self.x0)*self.invdx
+        cdef double fy = (im - self.y0)*self.invdy
+        cdef int a, b, c, j, k, idx
+        cdef double dist, dist0
+        if not (_isfinite(fx) and _isfinite(fy)):
+            return 0
+        if self.full:
+            a = 0 if fx < 0 else (self.nx - 1 if fx >= self.nx else <int>fx)
+            b = 0 if fy < 0 else (self.ny - 1 if fy >= self.ny else <int>fy)
+            return self.cell_idx[a*self.ny + b]
+        if fx < 0 or fy < 0 or fx >= self.nx or fy >= self.ny:
+            return self.nearest_linear(re, im)
+        # clamp against rounding at the upper edge so the cell index is always in range
+        a = min(<int>floor(fx), self.nx - 1)
+        b = min(<int>floor(fy), self.ny - 1)
+        c = a*self.ny + b
+        idx = self.cell_idx[self.cell_start[c]]
+        if self.cell_start[c+1] - self.cell_start[c] == 1:
+            return idx
+        dist0 = 1e300
+        for j in range(self.cell_start[c], self.cell_start[c+1]):
+            k = self.cell_idx[j]
+            dist = (self.symbols[k].real - re)**2 + (self.symbols[k].imag - im)**2
+            if dist < dist0:
+                idx = k
+                dist0 = dist
+        return idx
+
+    def decide(self, values):
+        """
+        Find the index of the nearest symbol for each value.
+
+        Parameters
+        ----------
+        values : array_like
+            values to decide on (1D array, dtype=complex)
+
+        Returns
+        -------
+        idx : array_like
+            index of the nearest symbol for each value
+        """
+        cdef double complex[:] E = np.ascontiguousarray(values, dtype=np.complex128)
+        cdef int[:] idx = np.zeros(E.shape[0], dtype=np.intc)
+        cdef int i
+        for i in prange(E.shape[0], nogil=True, schedule='static'):
+            idx[i] = self.nearest(E[i].real, E[i].imag)
+        return np.array(idx)
+
+_slicer_cache = {}
+
+cpdef SymbolSlicer get_symbol_slicer(symbols):
+    """
+    SymbolSlicer for a symbol alphabet, cached so that repeated decisions on the same alphabet (e.g. for every
+    block of a signal) do not rebuild the lookup table.
+
+    Parameters
+    ----------
+    symbols : array_like
+        symbol alphabet (1D array, dtype=complex)
+
+    Returns
+    -------
+    slicer : SymbolSlicer
+        slicer for the alphabet
+    """
+    syms = np.ascontiguousarray(symbols, dtype=np.complex128)
+    key = syms.tobytes()
+    slicer = _slicer_cache.get(key)
+    if slicer is None:
+        slicer = SymbolSlicer(syms)
+        _slicer_cache[key] = slicer
+        while len(_slicer_cache) > 16:
+            del _slicer_cache[next(iter(_slicer_cache))]
+    return slicer
+
+cdef complexing det_symbol_slicer(complexing[:] syms, SymbolSlicer slicer, complexing value, cython.floating *dists) noexcept nogil:
+    cdef int idx = slicer.nearest(value.real, value.imag)
+    dists[0] = (syms[idx].real - value.real)**2 + (syms[idx].imag - value.imag)**2
+    return syms[idx]
+
 def make_decision(complexing[:] E, complexing[:] symbols):
     """
     Quantize signal to symbols, based on closest distance.
@@ -79,26 +285,61 @@ def make_decision(complexing[:] E, complexing[:] symbols):
         array of detected symbols
     """
     cdef int L = E.shape[0]
-    cdef int M = symbols.shape[0]
-    cdef int i, j, k
+    cdef int i
     cdef double distd
     cdef float distf
     cdef complexing[:] det_syms
     cdef complexing out_sym
+    cdef SymbolSlicer slicer = get_symbol_slicer(np.asarray(symbols))
 
     if complexing is complex64_t:
         det_syms = np.zeros(L, dtype=np.complex64)
         for i in prange(L, nogil=True, schedule='static'):
-            out_sym = det_symbol(symbols, M, E[i], &distf)
+            out_sym = det_symbol_slicer(symbols, slicer, E[i], &distf)
             det_syms[i] = out_sym
         return det_syms
     else:
         det_syms = np.zeros(L, dtype=np.complex128)
         for i in prange(L, nogil=True, schedule='static'):
-            out_sym = det_symbol(symbols, M, E[i], &distd)
+            out_sym = det_symbol_slicer(symbols, slicer, E[i], &distd)
             det_syms[i] = out_sym
         return det_syms
 
+def make_decision_index(complexing[:] E, complexing[:] symbols):
+    """
+    Quantize signal to symbols, based on closest distance and return the index of the symbols.
+
+    Parameters
+    ----------
+    sig     : array_like
+        input signal field, 1D array of complex values
+    symbols : array_like
+        symbol alphabet to quantize to (1D array, dtype=complex)
+
+    Returns:
+    idx : array_like
+        array of indices of the detected symbols in symbols, dtype is np.uint8 for up to 256 symbols
+        and np.uint16 otherwise
+    """
+    cdef int L = E.shape[0]
+    cdef int M = symbols.shape[0]
+    cdef int i
+    cdef np.uint8_t[:] idx8
+    cdef np.uint16_t[:] idx16
+    cdef SymbolSlicer slicer = get_symbol_slicer(np.asarray(symbols))
+    if M <= 2**8:
+        idx8 = np.zeros(L, dtype=np.uint8)
+        for i in prange(L, nogil=True, schedule='static'):
+            idx8[i] = slicer.nearest(E[i].real, E[i].imag)
+        return np.asarray(idx8)
+    elif M <= 2**16:
+        idx16 = np.zeros(L, dtype=np.uint16)
+        for i in prange(L, nogil=True, schedule='static'):
+            idx16[i] = slicer.nearest(E[i].real, E[i].imag)
+        return np.asarray(idx16)
+    else:
+        raise ValueError("Symbol indices are only supported for up to 2**16 symbols")
+
 cdef partition_value(cython.floating signal,
                      double[:] partitions,
                      double[:] codebook):
@@ -226,3 +467,53 @@ def train_eq(complexing[:,:] E,
         if adaptive and i > 0:
             mu = adapt_step(mu, err[i-1], err[i])
     return err, wx, mu
+
+def cal_block_errors(complexing[:] Xest,
+                     cython.floating mu,
+                     ErrorFct errfct,
+                     bool adaptive=False,
+                     complexing err_prev=0):
+    """
+    Calculate the equaliser error for a block of equalised symbols. This is used by the block (frequency-domain)
+    equalisers, which update the taps only once per block.
+
+    Parameters
+    ----------
+    Xest : array_like
+        equalised symbols of the block
+    mu : float
+        tap update stepsize at the start of the block
+    errfct : ErrorFct
+        the equaliser error function to use
+    adaptive : bool
+        whether to use an adaptive step size
+    err_prev : complex
+        error of the last symbol of the previous block (only used for the adaptive step size)
+
+    Returns
+    -------
+    err : array_like
+        error for every symbol in the block
+    mus : array_like
+        step size for every symbol in the block
+    mu : float
+        adjusted step size for the next block
+    """
+    cdef complexing[:] err
+    cdef double[:] mus
+    cdef unsigned int i
+    cdef unsigned int N = Xest.shape[0]
+    err = np.zeros(N, dtype="c%d"%Xest.itemsize)
+    mus = np.zeros(N, dtype=np.float64)
+    for i in range(N):
+        if complexing is complex64_t:
+            err[i] = errfct.calc_errorf(Xest[i])
+        else:
+            err[i] = errfct.calc_error(Xest[i])
+        mus[i] = mu
+        if adaptive:
+            if i > 0:
+                mu = adapt_step(mu, err[i-1], err[i])
+            elif err_prev != 0:
+                mu = adapt_step(mu, err_prev, err[i])
+    return np.array(err), np.array(mus), mu
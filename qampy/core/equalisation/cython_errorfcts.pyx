@@ -21,36 +21,40 @@ cimport cython
 cimport numpy as np
 from cmath cimport *
 from ccomplex cimport *
-from .cython_equalisation cimport complexing, det_symbol, complex64_t, \
-    complex128_t, ErrorFct, partition_value
+from .cython_equalisation cimport complexing, det_symbol_slicer, complex64_t, \
+    complex128_t, ErrorFct, partition_value, SymbolSlicer, get_symbol_slicer
 import numpy as np
 
 cdef class ErrorFctGenericDD_d(ErrorFct): #TODO: need to figure out how to change this one
     cdef double complex[:] symbols
     cdef public double dist
     cdef int N
+    cdef SymbolSlicer slicer
     def __init__(self, double complex[:] symbols):
         self.symbols = symbols
         self.N = symbols.shape[0]
+        self.slicer = get_symbol_slicer(np.asarray(symbols))
 
 cdef class ErrorFctGenericDD_f(ErrorFct): #TODO: need to figure out how to change this one
     cdef public float complex[:] symbols
     cdef public float dist
     cdef int N
+    cdef SymbolSlicer slicer
     def __init__(self, float complex[:] symbols):
         self.symbols = symbols
         self.N = symbols.shape[0]
+        self.slicer = get_symbol_slicer(np.asarray(symbols))
 
 cdef class ErrorFctSBD_d(ErrorFctGenericDD_d):
     cpdef double complex calc_error(self, double complex Xest):
         cdef double complex R
-        R = det_symbol(self.symbols, self.N, Xest, &self.dist)
+        R = det_symbol_slicer(self.symbols, self.slicer, Xest, &self.dist)
         return (R.real - Xest.real)*abs(R.real) + 1.j*(R.imag - Xest.imag)*abs(R.imag)
 
 cdef class ErrorFctSBD_f(ErrorFctGenericDD_f):
     cpdef float complex calc_errorf(self, float complex Xest):
         cdef float complex R
-        R = det_symbol(self.symbols, self.N, Xest, &self.dist)
+        R = det_symbol_slicer(self.symbols, self.slicer, Xest, &self.dist)
         #return (Xest.real - R.real)*cabsf(R.real) + 1.j*(Xest.imag - R.imag)*acbs(R.imag)
         return (crealf(R) - crealf(Xest))*cabsf(R.real) + 1.j*(cimagf(R) - cimagf(Xest))*cabsf(R.imag)
 
@@ -63,13 +67,13 @@ cpdef ErrorFctSBD(complexing[:] symbols): # this is needed to work around bug wi
 cdef class ErrorFctMDDMA_d(ErrorFctGenericDD_d):
     cpdef double complex calc_error(self, double complex Xest):
         cdef double complex R
-        R = det_symbol(self.symbols, self.N, Xest, &self.dist)
+        R = det_symbol_slicer(self.symbols, self.slicer, Xest, &self.dist)
         return (R.real**2 - Xest.real**2)*Xest.real + 1.j*(R.imag**2 - Xest.imag**2)*Xest.imag
 
 cdef class ErrorFctMDDMA_f(ErrorFctGenericDD_f):
     cpdef float complex calc_errorf(self, float complex Xest):
         cdef float complex R
-        R = det_symbol(self.symbols, self.N, Xest, &self.dist)
+        R = det_symbol_slicer(self.symbols, self.slicer, Xest, &self.dist)
         return (R.real**2 - Xest.real**2)*Xest.real + 1.j*(R.imag**2 - Xest.imag**2)*Xest.imag
 
 cpdef ErrorFctMDDMA(complexing[:] symbols): # this is needed to work around bug with fused types and special functions in cython
@@ -81,13 +85,13 @@ cpdef ErrorFctMDDMA(complexing[:] symbols): # this is needed to work around bug
 cdef class ErrorFctDD_d(ErrorFctGenericDD_d):
     cpdef double complex calc_error(self, double complex Xest):
         cdef double complex R
-        R = det_symbol(self.symbols, self.N, Xest, &self.dist)
+        R = det_symbol_slicer(self.symbols, self.slicer, Xest, &self.dist)
         return R - Xest
 
 cdef class ErrorFctDD_f(ErrorFctGenericDD_f):
     cpdef float complex calc_errorf(self, float complex Xest):
         cdef float complex R
-        R = det_symbol(self.symbols, self.N, Xest, &self.dist)
+        R = det_symbol_slicer(self.symbols, self.slicer, Xest, &self.dist)
         return R - Xest
 
 cpdef ErrorFctDD(complexing[:] symbols): # this is needed to work around bug with fused types and special functions in cython
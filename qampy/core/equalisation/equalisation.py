@@ -39,6 +39,13 @@ Adaptive Step Size Algorithms
 -----------------------------
 based on the step size adoption in _[9]  it is possible to use an adaptive step for all equalisers using the adaptive_stepsize keyword parameter
 
+Frequency Domain Block Update
+-----------------------------
+all of the above error functions can also be used in a frequency-domain block equaliser after _[10], by prefixing the
+method with "fd_" (e.g. "fd_cma", "fd_mcma" or "fd_sbd"). The taps are then only updated once per block of symbols and
+both the filter output and the tap gradient are calculated using overlap-save fast convolutions, which is significantly
+faster for long filters.
+
 References
 ----------
 ...[3] Oh, K. N., & Chin, Y. O. (1995). Modified constant modulus algorithm: blind equalization and carrier phase recovery algorithm. Proceedings IEEE International Conference on Communications ICC ’95, 1, 498–502. http://doi.org/10.1109/ICC.1995.525219
@@ -47,10 +54,12 @@ References
 ...[7] Filho, M., Silva, M. T. M., & Miranda, M. D. (2008). A FAMILY OF ALGORITHMS FOR BLIND EQUALIZATION OF QAM SIGNALS. In 2011 IEEE International Conference on Acoustics, Speech and Signal Processing (ICASSP) (pp. 6–9).
 ...[8] Fernandes, C. A. R., Favier, G., & Mota, J. C. M. (2007). Decision directed adaptive blind equalization based on the constant modulus algorithm. Signal, Image and Video Processing, 1(4), 333–346. http://doi.org/10.1007/s11760-007-0027-2
 ...[9] D. Ashmawy, K. Banovic, E. Abdel-Raheem, M. Youssif, H. Mansour, and M. Mohanna, “Joint MCMA and DD blind equalization algorithm with variable-step size,” Proc. 2009 IEEE Int. Conf. Electro/Information Technol. EIT 2009, no. 1, pp. 174–177, 2009.
+...[10] J. J. Shynk, "Frequency-domain and multirate adaptive filtering," IEEE Signal Processing Magazine, 9(1), 14–37 (1992). http://doi.org/10.1109/79.109205
 
 """
 
 from __future__ import division
+import os as _os
 import warnings
 import numpy as np
 
@@ -63,7 +72,7 @@ from qampy.core.segmentaxis import segment_axis
 try:
     from qampy.core.equalisation.cython_errorfcts import ErrorFctMCMA, ErrorFctMRDE, ErrorFctSBD, ErrorFctMDDMA, ErrorFctDD,\
         ErrorFctCMA, ErrorFctRDE, ErrorFctSCA, ErrorFctCME
-    from qampy.core.equalisation.cython_equalisation import train_eq, ErrorFct
+    from qampy.core.equalisation.cython_equalisation import train_eq, ErrorFct, cal_block_errors
     from qampy.core.equalisation.cython_equalisation import apply_filter_to_signal as apply_filter_pyx
 except:
     ##use python code if cython code is not available
@@ -76,6 +85,8 @@ TRAINING_FCTS = ["cma", "mcma",
                  "sbd", "mddma",
                  "sca", "cme",
                  "dd"]
+FD_TRAINING_FCTS = ["fd_" + m for m in TRAINING_FCTS]
+
 def _select_errorfct(method, M, symbols, dtype, **kwargs):
     #TODO: investigate if it makes sense to include the calculations of constants inside the methods
     if method in ["mcma"]:
@@ -122,7 +133,7 @@ def _select_errorfct(method, M, symbols, dtype, **kwargs):
     else:
         raise ValueError("%s is unknown method"%method)
 
-def apply_filter(E, os, wxy, method="pyx"):
+def apply_filter(E, os, wxy, method="auto"):
     """
     Apply the equaliser filter taps to the input signal.
 
@@ -139,7 +150,8 @@ def apply_filter(E, os, wxy, method="pyx"):
         filter taps for the x and y polarisation
 
     method : string
-        use python ("py") based or cython ("pyx") based function
+        use python ("py") based, cython ("pyx") based or overlap-save FFT ("fft") based function. "auto" selects
+        between "pyx" and "fft" depending on the number of taps, oversampling and signal length.
 
     Returns
     -------
@@ -147,12 +159,33 @@ def apply_filter(E, os, wxy, method="pyx"):
     Eest   : array_like
         equalised signal
     """
+    if method == "auto":
+        E = np.atleast_2d(E)
+        method = _select_apply_method(E.shape[1], os, np.shape(wxy)[-1], E.shape[0], np.shape(wxy)[0])
     if method == "py":
         return apply_filter_py(E, os, wxy)
     elif method == "pyx":
         return apply_filter_pyx(E, os, wxy)
+    elif method == "fft":
+        return apply_filter_fft(E, os, wxy)
     else:
-        raise NotImplementedError("Only py and pyx methods are implemented")
+        raise NotImplementedError("Only py, pyx, fft and auto methods are implemented")
+
+def _select_apply_method(L, os, Ntaps, pols, modes):
+    """
+    Select the faster of the time-domain ("pyx") and the overlap-save ("fft") filter implementation using a
+    simple cost model (in units of complex multiply-accumulates), calibrated on the two implementations. The
+    time-domain implementation is OpenMP parallel, while the FFTs are not, which is why the time-domain cost is
+    divided by the number of CPUs.
+    """
+    N = (L - Ntaps + os)//os
+    Nfft = max(2**int(np.ceil(np.log2(4*Ntaps))), 256)
+    Sd = (Nfft - Ntaps + 1)//os
+    if N < 1 or Sd < 1:
+        return "pyx"
+    cost_td = N*modes*(pols*Ntaps + 400)/(_os.cpu_count() or 1)
+    cost_fft = -(-N//Sd)*(pols + modes)*Nfft*np.log2(Nfft)*4 + 2e4
+    return "fft" if cost_fft < cost_td else "pyx"
 
 def apply_filter_py(E, os, wxy):
     """
@@ -208,6 +241,131 @@ def apply_filter_py(E, os, wxy):
 
     return Eest
 
+def apply_filter_fft(E, os, wxy, Nfft=None, batch=32):
+    """
+    Apply the equaliser filter taps to the input signal using overlap-save fast convolution.
+
+    Parameters
+    ----------
+
+    E      : array_like
+        input signal to be equalised
+
+    os     : int
+        oversampling factor
+
+    wxy    : tuple(array_like, array_like,optional)
+        filter taps for the x and y polarisation
+
+    Nfft   : int, optional
+        FFT length of the overlap-save blocks. Default is None which means using the next power of 2 larger
+        than 4 times the number of taps (but at least 256)
+
+    batch  : int, optional
+        number of overlap-save blocks which are transformed at once, this bounds the required memory
+
+    Returns
+    -------
+
+    Eest   : array_like
+        equalised signal
+    """
+    E = np.atleast_2d(E)
+    wxy = np.asarray(wxy)
+    pols, L = E.shape
+    modes = wxy.shape[0]
+    Ntaps = wxy.shape[-1]
+    N = (L - Ntaps + os)//os
+    if Nfft is None:
+        Nfft = max(2**int(np.ceil(np.log2(4*Ntaps))), 256)
+    # number of (decimated) output samples per block, the block shift has to be a multiple of os to keep the sampling phase
+    Sd = (Nfft - Ntaps + 1)//os
+    if Sd < 1:
+        raise ValueError("Nfft has to be larger than Ntaps+os-1")
+    S = Sd*os
+    # Xest[i] = sum_k sum_n conj(w[k,n]) E[k, i*os+n], i.e. a cross-correlation, so we multiply by the conjugate
+    Wc = np.fft.fft(wxy, Nfft, axis=-1).conj()
+    Eest = np.zeros((modes, N), dtype=E.dtype)
+    nblocks = -(-N//Sd)
+    nfull = min(max(0, (L - Nfft)//S + 1), nblocks)
+    # the blocks which lie completely inside the signal are only a view of the data,
+    # the remaining ones at the end are zero padded
+    tail = np.zeros((pols, (nblocks - nfull - 1)*S + Nfft), dtype=E.dtype)
+    tail[:, :L-nfull*S] = E[:, nfull*S:]
+    for x, nb, b0 in [(E, nfull, 0), (tail, nblocks - nfull, nfull)]:
+        frms = np.lib.stride_tricks.as_strided(x, shape=(pols, nb, Nfft), strides=(x.strides[0], S*x.strides[1],
+                                                                                   x.strides[1]), writeable=False)
+        for i in range(0, frms.shape[1], batch):
+            X = np.fft.fft(frms[:, i:i+batch], axis=-1)
+            Y = np.zeros((modes,) + X.shape[1:], dtype=X.dtype)
+            for k in range(pols):
+                Y += Wc[:, k, np.newaxis, :] * X[k]
+            Y = np.fft.ifft(Y, axis=-1)[:, :, :S:os].reshape(modes, -1)
+            idx = (b0 + i)*Sd
+            Nb = min(Y.shape[1], N - idx)
+            Eest[:, idx:idx+Nb] = Y[:, :Nb]
+    return Eest
+
+def train_eq_fd(E, TrSyms, os, mu, wx, errfct, adaptive=False, block_size=None):
+    """
+    Generate the filter taps by training the equaliser in the frequency domain. In contrast to train_eq the taps are
+    only updated once per block of symbols, which allows calculating the filter output and the tap gradient of a whole
+    block using overlap-save fast convolutions.
+
+    Parameters
+    ----------
+    E : array_like
+        signal to be equalised
+    TrSyms : int
+        number of training symbols to use
+    os : int
+        oversampling ratio
+    mu : float
+        tap update stepsize
+    wx : array_like
+        equaliser taps
+    errfct : ErrorFct
+        the equaliser error function to use
+    adaptive : bool, optional
+        whether to use an adaptive step size
+    block_size : int, optional
+        number of symbols per block. Default is None which means the block is chosen so that the FFT length is the
+        next power of 2 larger than twice the number of taps
+
+    Returns
+    -------
+    err : array_like
+        error
+    wxy : array_like
+        adjusted taps
+    mu : float
+        adjusted step size
+    """
+    Ntaps = wx.shape[1]
+    if block_size is None:
+        Nfft = 2**int(np.ceil(np.log2(2*Ntaps)))
+        block_size = (Nfft - Ntaps)//os + 1
+    else:
+        Nfft = 2**int(np.ceil(np.log2((block_size-1)*os + Ntaps)))
+    err = np.zeros(TrSyms, dtype=E.dtype)
+    eu = np.zeros(Nfft, dtype=E.dtype)
+    err_prev = 0
+    for i in range(0, TrSyms, block_size):
+        B = min(block_size, TrSyms - i)
+        Ns = (B - 1)*os + 1
+        X = np.fft.fft(E[:, i*os:i*os + Ns + Ntaps - 1], Nfft, axis=-1)
+        W = np.fft.fft(wx, Nfft, axis=-1)
+        # Xest[i] = sum_k sum_n conj(w[k,n]) E[k, i*os+n], i.e. a cross-correlation of taps and signal
+        Xest = np.fft.ifft(np.sum(X * W.conj(), axis=0))[:Ns:os].astype(E.dtype)
+        errs, mus, mu = cal_block_errors(Xest, mu, errfct, adaptive, err_prev)
+        err[i:i+B] = errs
+        err_prev = errs[-1]
+        # the gradient is the cross-correlation of the (upsampled) error with the signal
+        eu[:] = 0
+        eu[:Ns:os] = errs*mus
+        wx += np.fft.ifft(X * np.fft.fft(eu).conj(), axis=-1)[:, :Ntaps].astype(wx.dtype)
+    return err, wx, mu
+
 def _cal_Rdash(syms):
      return (abs(syms.real + syms.imag) + abs(syms.real - syms.imag)) * (np.sign(syms.real + syms.imag) + np.sign(syms.real-syms.imag) + 1.j*(np.sign(syms.real+syms.imag) - np.sign(syms.real-syms.imag)))*syms.conj()
 
@@ -406,7 +564,7 @@ def dual_mode_equalisation(E, os, mu, M, Ntaps, TrSyms=(None,None), Niter=(1,1),
     else:
         return wxy2, (err1, err2)
 
-def equalise_signal(E, os, mu, M, wxy=None, Ntaps=None, TrSyms=None, Niter=1, method="mcma", adaptive_stepsize=False,  symbols=None, avoid_cma_sing=False, apply=False, **kwargs):
+def equalise_signal(E, os, mu, M, wxy=None, Ntaps=None, TrSyms=None, Niter=1, method="mcma", adaptive_stepsize=False,  symbols=None, avoid_cma_sing=False, apply=False, block_size=None, **kwargs):
     """
     Blind equalisation of PMD and residual dispersion, using a chosen equalisation method. The method can be any of the keys in the TRAINING_FCTS dictionary. 
     
@@ -438,6 +596,7 @@ def equalise_signal(E, os, mu, M, wxy=None, Ntaps=None, TrSyms=None, Niter=1, me
 
     method  : string, optional
         equaliser method has to be one of cma, rde, mrde, mcma, sbd, mddma, sca, dd_adaptive, sbd_adaptive, mcma_adaptive
+        or one of the frequency-domain block equalisers fd_cma, fd_mcma, fd_sbd, ... (see FD_TRAINING_FCTS)
 
     adaptive_stepsize : bool, optional
         whether to use an adaptive stepsize or a fixed
@@ -447,6 +606,9 @@ def equalise_signal(E, os, mu, M, wxy=None, Ntaps=None, TrSyms=None, Niter=1, me
         avoid the CMA polarization demux singularity by orthogonallizing taps after first pol convergence
     apply: Bool, optional
         whether to apply the filter taps and return the equalised signal
+    block_size : int, optional
+        number of symbols per tap update for the frequency-domain methods (default: None, determine from
+        the number of taps)
 
     Returns
     -------
@@ -462,13 +624,21 @@ def equalise_signal(E, os, mu, M, wxy=None, Ntaps=None, TrSyms=None, Niter=1, me
 
     """
     method = method.lower()
+    fd = method in FD_TRAINING_FCTS
+    if fd:
+        method = method[3:]
     eqfct = _select_errorfct(method, M, symbols, E.dtype, **kwargs)
     # scale signal
     E, wxy, TrSyms, Ntaps, err, pols = _lms_init(E, os, wxy, Ntaps, TrSyms, Niter)
     wxy = wxy.astype(E.dtype)
     for l in range(pols):
         for i in range(Niter):
-            err[l, i * TrSyms:(i+1)*TrSyms], wxy[l], mu = train_eq(E, TrSyms, os, mu, wxy[l], eqfct, adaptive=adaptive_stepsize)
+            if fd:
+                err[l, i * TrSyms:(i+1)*TrSyms], wxy[l], mu = train_eq_fd(E, TrSyms, os, mu, wxy[l], eqfct,
+                                                                          adaptive=adaptive_stepsize,
+                                                                          block_size=block_size)
+            else:
+                err[l, i * TrSyms:(i+1)*TrSyms], wxy[l], mu = train_eq(E, TrSyms, os, mu, wxy[l], eqfct, adaptive=adaptive_stepsize)
         if (l < 1) and avoid_cma_sing:
             wxy[l+1] = orthogonalizetaps(wxy[l])
 
@@ -16,6 +16,7 @@
 #
 # Copyright 2018 Jochen Schröder, Mikael Mazur
 import numpy as np
+from qampy.core.dsp_cython import rotate_phase, rotate_ramp
 
 
 def H_PMD(theta, t_dgd, omega):
@@ -148,8 +149,16 @@ def phase_noise(sz, df, fs):
     f = np.random.normal(scale=np.sqrt(var), size=sz)
     return np.cumsum(f, axis=1)
 
+def _as_complex(sig):
+    """
+    Cast real input to the matching complex dtype, the rotation kernels only accept complex signals.
+    """
+    if np.iscomplexobj(sig):
+        return sig
+    return np.asarray(sig).astype(np.result_type(sig, np.complex64))
+
 #TODO: make multi-dim phase noise configurable
-def apply_phase_noise(signal, df, fs):
+def apply_phase_noise(signal, df, fs, out=None):
     """
     Add phase noise from local oscillators, based on a Wiener noise process.
 
@@ -165,6 +174,9 @@ def apply_phase_noise(signal, df, fs):
     fs : float
         sampling frequency of the signal
 
+    out : array_like, optional
+        output array with the shape and dtype of signal, can be signal itself
+
     Returns
     -------
     out : array_like
@@ -173,7 +185,11 @@ def apply_phase_noise(signal, df, fs):
     """
     N = signal.shape
     ph = phase_noise(N, df, fs)
-    return signal*np.exp(1.j*ph).astype(signal.dtype)
+    signal = _as_complex(signal)
+    if out is None:
+        out = np.empty_like(signal)
+    rotate_phase(np.atleast_2d(np.asarray(signal)), np.atleast_2d(ph), out=np.atleast_2d(np.asarray(out)))
+    return out
 
 def add_awgn(sig, strgth):
     """
@@ -220,7 +236,7 @@ def change_snr(sig, snr, fb, fs):
     n = 10 ** (-snr / 20) * np.sqrt(os)
     return add_awgn(sig, p*n)
 
-def add_carrier_offset(sig, fo, fs):
+def add_carrier_offset(sig, fo, fs, out=None):
     """
     Add frequency offset to signal
 
@@ -232,17 +248,21 @@ def add_carrier_offset(sig, fo, fs):
         frequency offset
     fs : float
         sampling rate
+    out : array_like, optional
+        output array with the shape and dtype of sig, can be sig itself
 
     Returns
     -------
     signal : array_like
         signal with added offset
     """
-    sign = np.atleast_2d(sig)
-    if sig.ndim == 1:
-        return  (sign * np.exp(2.j * np.pi * np.arange(sign.shape[1], dtype=sign.dtype) * fo / fs)).flatten()
-    else:
-        return  sign * np.exp(2.j * np.pi * np.arange(sign.shape[1], dtype=sign.dtype) * fo / fs)
+    sig = _as_complex(sig)
+    sign = np.atleast_2d(np.asarray(sig))
+    if out is None:
+        out = np.empty_like(sig)
+    dphi = np.broadcast_to(2*np.pi*np.asarray(fo, dtype=np.float64).reshape(-1)/fs, (sign.shape[0],))
+    rotate_ramp(sign, np.zeros(sign.shape[0]), dphi, out=np.atleast_2d(np.asarray(out)))
+    return out
 
 def add_modal_delay(sig, delay):
     """
@@ -18,13 +18,20 @@
 
 #vim:fileencoding=utf-8
 from __future__ import division, print_function
+import functools
 import numpy as np
-from qampy.core.segmentaxis import segment_axis
 from qampy.core.signal_quality import cal_s0
+from qampy.theory import cal_symbols_qam, cal_scaling_factor_qam
 from qampy.core.dsp_cython import bps as _bps_idx_pyx
+from qampy.core.dsp_cython import bps_modes as _bps_modes_idx_pyx
+from qampy.core.dsp_cython import bps_twostage_modes as _bps_twostage_pyx
 from qampy.core.dsp_cython import select_angles
+from qampy.core.dsp_cython import viterbiviterbi_phase as _viterbiviterbi_pyx
+from qampy.core.dsp_cython import rotate_phase, rotate_ramp
+from qampy.core.dsp_cython import pll_dd as _pll_dd_pyx
 
 from qampy.core.filter import moving_average
+from qampy.core.segmentaxis import segment_axis
 try:
     import arrayfire as af
 except ImportError:
@@ -32,7 +39,21 @@ except ImportError:
 
 NMAX = 4*1024**3
 
-def viterbiviterbi(E, N, M):
+def _power(x, M):
+    """
+    Integer power of an array by repeated squaring and multiplication, avoiding the transcendental functions
+    used by the power operator.
+    """
+    out = None
+    while M > 0:
+        if M & 1:
+            out = x.copy() if out is None else out*x
+        M >>= 1
+        if M:
+            x = x*x
+    return out
+
+def viterbiviterbi(E, N, M, method="py"):
     """
     Viterbi-Viterbi blind phase recovery for an M-PSK signal
 
@@ -44,28 +65,40 @@ def viterbiviterbi(E, N, M):
         number of samples to average over
     M : int
         order of the M-PSK
+    method : string, optional
+        "py" for a vectorised numpy implementation or "pyx" for a Cython-OpenMP kernel which does not need
+        any temporary arrays of the signal size
 
     Returns
     -------
     Eout : array_like
-        Field with compensated phases
+        Field with compensated phases, the first and last samples which are not covered by the averaging
+        window are zero
+    phase_est : array_like
+        phase estimate of the samples covered by the averaging window, for every mode
     """
     E2d = np.atleast_2d(E)
-    Eout = np.zeros_like(E2d)
     L = E2d.shape[1]
-    for i in range(E2d.shape[0]):
-        Et = E2d[i]
-        L = len(Et)
-        phi = np.angle(Et)
-        E_raised = np.exp(1.j * phi)**M
-        sa = segment_axis(E_raised, N, N - 1)
-        phase_est = np.sum(sa, axis=1)
-        phase_est = np.unwrap(np.angle(phase_est))
-        phase_est = (phase_est - np.pi)/M
-        if N % 2:
-            Eout[i, (N - 1) // 2:L - (N - 1) // 2] = E2d[i, (N - 1) // 2:L - (N - 1) // 2] * np.exp(-1.j*phase_est)
-        else:
-            Eout[i, N // 2 - 1:L - (N // 2)] = E2d[i, N // 2 - 1:L - (N // 2)] * np.exp(-1.j*phase_est)
+    if method.lower() == "pyx":
+        phase_est = _viterbiviterbi_pyx(np.asarray(E2d), N, M)
+    elif method.lower() == "py":
+        # normalise to the unit circle, zero values have a phase of zero
+        Ea = abs(E2d)
+        En = np.where(Ea > 0, E2d/np.where(Ea > 0, Ea, 1), 1).astype(np.complex128)
+        cs = np.cumsum(_power(En, M), axis=-1)
+        # moving sum over N samples from the cumulative sum
+        ssum = cs[:, N-1:].copy()
+        ssum[:, 1:] -= cs[:, :-N]
+        phase_est = np.angle(ssum)
+    else:
+        raise ValueError("Method needs to be 'pyx' or 'py'")
+    phase_est = np.unwrap(phase_est, axis=-1)
+    phase_est = (phase_est - np.pi)/M
+    Eout = np.zeros_like(E2d)
+    if N % 2:
+        rotate_phase(E2d[:, (N - 1) // 2:L - (N - 1) // 2], -phase_est, out=Eout[:, (N - 1) // 2:L - (N - 1) // 2])
+    else:
+        rotate_phase(E2d[:, N // 2 - 1:L - (N // 2)], -phase_est, out=Eout[:, N // 2 - 1:L - (N // 2)])
     #if M == 4: # QPSK needs pi/4 shift
     # need a shift by pi/M for constellation points to not be on the axis
     if E.ndim == 1:
@@ -85,7 +118,7 @@ def _bps_idx_py(E, angles, symbols, N):
     idx[N:-N] = mvg.argmin(1)
     return idx
 
-def bps(E, Mtestangles, symbols, N, method="pyx", **kwargs):
+def bps(E, Mtestangles, symbols, N, method="pyx", joint=False, **kwargs):
     """
     Perform a blind phase search after _[1]
 
@@ -107,6 +140,10 @@ def bps(E, Mtestangles, symbols, N, method="pyx", **kwargs):
     method      : string, optional
         implementation method to use has to be "af" for arrayfire (uses OpenCL) or "pyx" for a cython-OpenMP based parallel search or "py" for slow python search
 
+    joint       : bool, optional
+        search the phase jointly on all modes by summing their distances, this selects the same angle for all modes
+        and should only be used if the modes share the same LO (only supported by the "pyx" method)
+
     **kwargs    :
         arguments to be passed to the search function
 
@@ -131,25 +168,34 @@ def bps(E, Mtestangles, symbols, N, method="pyx", **kwargs):
         bps_fct = _bps_idx_py
     else:
         raise ValueError("Method needs to be 'pyx', 'py' or 'af'")
+    if joint and method.lower() != "pyx":
+        raise ValueError("Joint phase search is only supported by the 'pyx' method")
     if E.dtype is np.dtype(np.complex64):
         dtype = np.float32
     else:
         dtype = np.float64
     angles = np.linspace(-np.pi/4, np.pi/4, Mtestangles, endpoint=False, dtype=dtype).reshape(1,-1)
     Ew = np.atleast_2d(E).astype(E.dtype)
-    ph = []
-    for i in range(Ew.shape[0]):
-        idx =  bps_fct(Ew[i], angles, symbols, N)
-        ph.append(select_angles(angles, idx))
-    ph = np.asarray(ph, dtype=dtype)
+    if method.lower() == "pyx":
+        # all modes in one parallel region
+        idx = _bps_modes_idx_pyx(Ew, angles, symbols.astype(Ew.dtype), N, joint)
+        ph = angles[0, idx]
+    else:
+        ph = []
+        for i in range(Ew.shape[0]):
+            idx =  bps_fct(Ew[i], angles, symbols, N)
+            ph.append(select_angles(angles, idx))
+        ph = np.asarray(ph, dtype=dtype)
     # ignore the phases outside the averaging window
     # better to use normal unwrap instead of fancy tricks
     #ph[N:-N] = unwrap_discont(ph[N:-N], 10*np.pi/2/Mtestangles, np.pi/2)
     ph[:, N:-N] = np.unwrap(ph[:, N:-N]*4)/4
+    # Ew is a copy of the input so we can rotate in-place
+    rotate_phase(Ew, ph, out=Ew)
     if E.ndim == 1:
-        return (Ew*np.exp(1.j*ph)).flatten(), ph.flatten()
+        return Ew.flatten(), ph.flatten()
     else:
-        return Ew*np.exp(1.j*ph), ph
+        return Ew, ph
 
 def _movavg_af(X, N, axis=0):
     """
@@ -212,7 +258,7 @@ def bps_pyx(E, testangles, symbols, N, **kwargs):
     return bps(E, testangles, symbols, N, method="pyx", **kwargs)
 
 
-def bps_twostage(E, Mtestangles, symbols, N , B=4, method="pyx", **kwargs):
+def bps_twostage(E, Mtestangles, symbols, N , B=4, method="pyx", joint=False, **kwargs):
     """
     Perform a blind phase search phase recovery using two stages after _[1]
 
@@ -238,6 +284,10 @@ def bps_twostage(E, Mtestangles, symbols, N , B=4, method="pyx", **kwargs):
         implementation method to use has to be "af" for arrayfire (uses OpenCL) or
         "pyx" for a Cython-OpenMP based parallel search or "py" for a slower python based search
 
+    joint       : bool, optional
+        search the phase jointly on all modes by summing their distances, this selects the same angle for all modes
+        and should only be used if the modes share the same LO (only supported by the "pyx" method)
+
     **kwargs    :
         arguments to be passed to the search function
 
@@ -260,23 +310,31 @@ def bps_twostage(E, Mtestangles, symbols, N , B=4, method="pyx", **kwargs):
         bps_fct = _bps_idx_py
     else:
         raise ValueError("Method needs to be 'pyx', 'py' or 'af'")
+    if joint and method.lower() != "pyx":
+        raise ValueError("Joint phase search is only supported by the 'pyx' method")
     if E.dtype is np.dtype(np.complex64):
         dtype = np.float32
     else:
         dtype = np.float64
     angles = np.linspace(-np.pi/4, np.pi/4, Mtestangles, endpoint=False, dtype=dtype).reshape(1,-1)
     Ew = np.atleast_2d(E)
+    b = np.linspace(-B/2, B/2, B)
     ph_out = []
-    for i in range(Ew.shape[0]):
-        idx =  bps_fct(Ew[i], angles, symbols, N, **kwargs)
-        ph = select_angles(angles, idx)
-        b = np.linspace(-B/2, B/2, B)
-        phn = ph[:,np.newaxis] + b[np.newaxis,:]/(B*Mtestangles)*np.pi/2
-        idx2 = bps_fct(Ew[i], phn, symbols, N, **kwargs)
-        phf = select_angles(phn, idx2)
-        ph_out.append(np.unwrap(phf*4, discont=np.pi*4/4)/4)
+    if method.lower() == "pyx":
+        # both stages for all modes in one parallel region
+        phf = _bps_twostage_pyx(Ew.astype(E.dtype), angles[0].astype(np.float64), b/(B*Mtestangles)*np.pi/2,
+                                symbols.astype(E.dtype), N, joint)
+        ph_out = np.unwrap(phf*4, discont=np.pi*4/4, axis=1)/4
+    else:
+        for i in range(Ew.shape[0]):
+            idx =  bps_fct(Ew[i], angles, symbols, N, **kwargs)
+            ph = select_angles(angles, idx)
+            phn = ph[:,np.newaxis] + b[np.newaxis,:]/(B*Mtestangles)*np.pi/2
+            idx2 = bps_fct(Ew[i], phn, symbols, N, **kwargs)
+            phf = select_angles(phn, idx2)
+            ph_out.append(np.unwrap(phf*4, discont=np.pi*4/4)/4)
     ph_out = np.asarray(ph_out, dtype=dtype)
-    En = Ew*np.exp(1.j*ph_out)
+    En = rotate_phase(Ew, ph_out, out=np.empty_like(Ew))
     if E.ndim == 1:
         return En.flatten(), ph_out.flatten()
     else:
@@ -284,6 +342,58 @@ def bps_twostage(E, Mtestangles, symbols, N , B=4, method="pyx", **kwargs):
 
 
 
+def pll(E, symbols, kp=0.05, ki=5e-4, state=None, coarse=None):
+    """
+    Decision-directed second-order PLL carrier recovery for streaming (chunked) processing.
+
+    Every symbol is rotated by the current phase estimate and decided onto the constellation (using the same
+    slicer as make_decision), the phase error to the decision drives a proportional-integral loop filter which
+    tracks the phase and the frequency offset. In contrast to the block estimators the loop only needs O(1)
+    state per mode, which is returned and can be passed with the next chunk of the signal. The result of
+    processing a signal in chunks is identical to processing it at once.
+
+    Parameters
+    ----------
+    E           : array_like
+        input signal (single or dual polarisation)
+    symbols     : array_like
+        the symbols of the modulation format
+    kp          : float, optional
+        proportional gain of the loop filter
+    ki          : float, optional
+        integral gain of the loop filter
+    state       : array_like, optional
+        loop state of shape (2, nmodes) returned by a previous call, the phase and the phase increment per
+        symbol of every mode. Zero phase and frequency if not given.
+    coarse      : array_like, optional
+        feed-forward coarse phase estimate (e.g. from viterbiviterbi or bps) of the same shape as E, the loop
+        then tracks the residual phase
+
+    Returns
+    -------
+    Eout    : array_like
+        signal with compensated phase
+    ph      : array_like
+        total phase estimate (unwrapped)
+    state   : array_like
+        loop state after the last symbol, to be passed with the next chunk
+    """
+    E2d = np.atleast_2d(E)
+    nmodes = E2d.shape[0]
+    if state is None:
+        state = np.zeros((2, nmodes), dtype=np.float64)
+    else:
+        state = np.array(state, dtype=np.float64).reshape(2, nmodes)
+    if coarse is not None:
+        coarse = np.atleast_2d(coarse)
+    Eout, ph = _pll_dd_pyx(np.asarray(E2d), np.asarray(symbols, dtype=E2d.dtype), kp, ki, state, coarse,
+                           out=np.empty_like(E2d))
+    if E.ndim == 1:
+        return Eout.flatten(), ph.flatten(), state
+    else:
+        return Eout, ph, state
+
+
 def partition_16qam(E):
     r"""
     Partition a 16-QAM signal into the inner and outer circles.
@@ -320,19 +430,151 @@ def partition_16qam(E):
     return class1_mask, class2_mask
 
 
+@functools.lru_cache(maxsize=None)
+def _qam_ring_partition(M):
+    """
+    Ring radii and QPSK-partition rotations of a square M-QAM constellation.
+
+    Parameters
+    ----------
+        M : int
+            QAM order
+
+    Returns
+    -------
+        thresholds : array_like
+            decision thresholds between neighbouring rings (normalised to unit average power)
+        offsets : array_like
+            (Nrings, K) angles that rotate the points of each ring onto the QPSK diagonals, rings with
+            fewer than K distinct rotations are padded by repeating their first one
+        class1 : array_like
+            boolean mask of the rings which only contain points on the QPSK diagonals and are
+            separated by at least a quarter of the symbol spacing from rings which do not
+    """
+    syms = cal_symbols_qam(M)/np.sqrt(cal_scaling_factor_qam(M))
+    d = np.min(abs(np.diff(np.unique(syms.real))))
+    r = np.round(abs(syms), 8)
+    # angle of every point relative to the nearest diagonal, wrapped to [-pi/4, pi/4)
+    a = np.round(np.angle(syms)%(np.pi/2) - np.pi/4, 8)
+    radii = np.unique(r)
+    # for the larger constellations neighbouring rings are closer than the symbol spacing, a
+    # symbol decided onto one of them may lie on any of the others
+    close = abs(radii[:, None] - radii[None, :]) < d/4
+    offs = [np.unique(a[np.isin(r, radii[c])]) for c in close]
+    K = max(len(o) for o in offs)
+    offsets = np.array([np.pad(o, (0, K-len(o)), mode="edge") for o in offs])
+    class1 = np.array([np.all(o == 0) for o in offs])
+    return (radii[1:] + radii[:-1])/2, offsets, class1
+
+
+def _centred_sum(x, N):
+    """
+    Sum over a window of N samples centred on every sample along the last axis, the window is truncated at the
+    edges. Calculated from the cumulative sum in double precision.
+    """
+    L = x.shape[-1]
+    cs = np.zeros(x.shape[:-1] + (L + 1,), dtype=np.complex128)
+    np.cumsum(x, axis=-1, out=cs[..., 1:])
+    lo = np.clip(np.arange(L) - N//2, 0, L)
+    return cs[..., np.minimum(lo + N, L)] - cs[..., lo]
+
+
+def _partition_select(S, rot, ring, ref):
+    """
+    Rotate the 4th power of every symbol by the candidate rotation of its ring (rot[ring, k]) which agrees best
+    with the reference, keeping only the running best instead of all candidates.
+    """
+    Ssel = S*rot[:, 0][ring]
+    best = (Ssel*ref.conj()).real
+    for k in range(1, rot.shape[1]):
+        c = S*rot[:, k][ring]
+        m = (c*ref.conj()).real
+        better = m > best
+        Ssel[better] = c[better]
+        best[better] = m[better]
+    return Ssel
+
+
+def phase_partition_qam(E, Nblock, M):
+    r"""Blind phase recovery for square M-QAM using QPSK partitioning.
+
+    A low-complexity alternative to blind phase search after Fatadin et al _[1], generalised from
+    16-QAM to square M-QAM up to 256-QAM. Every symbol is assigned to its nearest constellation ring.
+    Symbols on rings which only contain points on the QPSK diagonals (class 1) give a first
+    4th-power phase estimate over a window of Nblock samples centred on every symbol. The remaining
+    symbols are rotated onto the diagonals by the one of their ring's rotation angles that agrees
+    best with that estimate. Because for the dense constellations only a small fraction of the
+    symbols are class 1, the rotations are then chosen twice more against the estimate from all
+    symbols. All operations are vectorised over modes and symbols.
+
+    Parameters
+    ----------
+        E : array_like
+            electric field of the signal
+        Nblock : int
+            number of samples in the averaging window
+        M : int
+            QAM order, the ring radii and rotations are taken from the square M-QAM constellation
+
+    Returns
+    -------
+        E_rec : array_like
+            electric field of the signal with recovered phase.
+        phase : array_like
+            recovered phase array
+
+    Notes
+    -----
+    For 1024-QAM the rings are too dense to select the rotations reliably, use blind phase search
+    instead. 256-QAM needs windows of about 100 symbols, at a linewidth symbol-duration product of
+    1e-5 and 33 dB SNR this gives a symbol error rate of about 0.5-1%, a few times higher than blind
+    phase search.
+
+    References
+    ----------
+    .. [1] I. Fatadin, D. Ives, and S. Savory, “Laser linewidth tolerance
+       for 16-QAM coherent optical systems using QPSK partitioning,”
+       Photonics Technol. Lett. IEEE, vol. 22, no. 9, pp. 631–633, May 2010.
+    """
+    if np.log2(M) % 2 > 0.5:
+        raise ValueError("QPSK partitioning is only defined for square QAM")
+    if M > 256:
+        raise ValueError("QPSK partitioning only supports QAM orders up to 256")
+    E2d = np.atleast_2d(E)
+    modes, L = E2d.shape
+    thresholds, offsets, class1 = _qam_ring_partition(M)
+    S0 = np.array([cal_s0(E2d[j], M) for j in range(modes)])
+    En = E2d/np.sqrt(S0)[:, None]
+    ring = np.searchsorted(thresholds, abs(En))
+    S = _power(En, 4)
+    rot = np.exp(-4.j*offsets).astype(S.dtype)
+    # first estimate from the class 1 symbols only
+    ref = _centred_sum(np.where(class1[ring], S, 0), Nblock)
+    Ssel = _partition_select(S, rot, ring, ref)
+    for i in range(2):
+        Ssel = _partition_select(S, rot, ring, _centred_sum(Ssel, Nblock))
+    ph = (np.unwrap(np.angle(_centred_sum(Ssel, Nblock)), axis=1) - np.pi)/4
+    Eout = rotate_phase(E2d, -ph, out=np.empty_like(E2d))
+    if E.ndim == 1:
+        return Eout.flatten(), ph.flatten()
+    else:
+        return Eout, ph
+
+
 def phase_partition_16qam(E, Nblock):
     r"""16-QAM blind phase recovery using QPSK partitioning.
 
     A blind phase estimator for 16-QAM signals based on partitioning the signal
     into 3 rings, which are then phase estimated using traditional V-V phase
-    estimation after Fatadin et al _[1].
+    estimation after Fatadin et al _[1]. See `phase_partition_qam` for arbitrary
+    square M-QAM.
 
     Parameters
     ----------
         E : array_like
             electric field of the signal
         Nblock : int
-            number of samples in an averaging block
+            number of samples in the averaging window
 
     Returns
     -------
@@ -348,33 +590,7 @@ def phase_partition_16qam(E, Nblock):
        Photonics Technol. Lett. IEEE, vol. 22, no. 9, pp. 631–633, May 2010.
 
     """
-    E2d = np.atleast_2d(E)
-    dphi = np.pi / 4 + np.arctan(1 / 3)
-    modes, L = E2d.shape
-    ph_out = []
-    for j in range(modes):
-        # partition QPSK signal into qpsk constellation and non-qpsk const
-        c1_m, c2_m = partition_16qam(E2d[j])
-        Sx = np.zeros(L, dtype=np.complex128)
-        Sx[c2_m] = (E2d[j, c2_m] * np.exp(1.j * dphi))**4
-        So = np.zeros(L, dtype=np.complex128)
-        So[c2_m] = (E2d[j, c2_m] * np.exp(1.j * -dphi))**4
-        S1 = np.zeros(L, dtype=np.complex128)
-        S1[c1_m] = (E2d[j, c1_m])**4
-        E_n = np.zeros(L, dtype=np.complex128)
-        phi_est = np.zeros(L, dtype=np.float64)
-        for i in range(0, L, Nblock):
-            S1_sum = np.sum(S1[i:i + Nblock])
-            Sx_tmp = np.min(
-                [S1_sum - Sx[i:i + Nblock], S1_sum - So[i:i + Nblock]],
-                axis=0)[c2_m[i:i + Nblock]]
-            phi_est[i:i + Nblock] = np.angle(S1_sum + Sx_tmp.sum())
-        ph_out.append(np.unwrap(phi_est) / 4 - np.pi / 4)
-    phi_out = np.asarray(ph_out)
-    if E.ndim == 1:
-        return (E2d * np.exp(-1.j * phi_est)).flatten(), phi_out.flatten()
-    else:
-        return E2d * np.exp(-1.j * phi_est), phi_out
+    return phase_partition_qam(E, Nblock, 16)
 
 
 def find_freq_offset(sig, os=1, average_over_modes = True, fft_size = 2**16):
@@ -427,7 +643,65 @@ def find_freq_offset(sig, os=1, average_over_modes = True, fft_size = 2**16):
 
     return freq_offset
 
-def comp_freq_offset(sig, freq_offset, os=1 ):
+def find_freq_offset_welch(sig, os=1, average_over_modes=True, fft_size=2**12, overlap=0.5, chunksize=2**20):
+    """
+    Find the frequency offset from the Welch-averaged spectrum of the signal raised to 4.
+
+    Unlike `find_freq_offset`, which uses a single FFT of the first fft_size samples, the power
+    spectra of Hann-windowed, overlapping segments of length fft_size are accumulated over the
+    whole signal. The segments are processed in chunks of about chunksize samples for all modes
+    at once, so memory use is bounded independently of the signal length. The spectral peak is
+    refined by parabolic interpolation of the logarithm of the averaged power spectrum, which
+    gives an estimate well below the bin resolution.
+
+    Parameters
+    ----------
+        sig : array_line
+            signal array with N modes
+        os: int
+            oversampling ratio (Samples per symbols in sig)
+        average_over_modes : bool
+            Sum the spectra of all modes before searching for the peak
+        fft_size: int
+            Size of the FFT segments. Should be power of 2, otherwise the
+            next higher power of 2 will be used.
+        overlap : float, optional
+            fraction of overlap between neighbouring segments
+        chunksize : int, optional
+            approximate number of samples per mode processed at once
+
+    Returns
+    -------
+        freq_offset : array_like
+            found frequency offset for every mode, shape (N, 1)
+    """
+    fft_size = 2**(int(np.ceil(np.log2(fft_size))))
+    sig = np.atleast_2d(sig)
+    npols, L = sig.shape
+    if L < fft_size:
+        sig = np.pad(sig, ((0, 0), (0, fft_size - L)))
+        L = fft_size
+    hop = max(1, int(fft_size*(1 - overlap)))
+    nseg = (L - fft_size)//hop + 1
+    seg_chunk = max(1, chunksize//hop)
+    win = np.hanning(fft_size)
+    psd = np.zeros((npols, fft_size))
+    for i in range(0, nseg, seg_chunk):
+        n = min(seg_chunk, nseg - i)
+        x = _power(sig[:, i*hop:(i + n - 1)*hop + fft_size], 4)
+        segs = segment_axis(x, fft_size, fft_size - hop, axis=1)
+        psd += (abs(np.fft.fft(segs*win, axis=-1))**2).sum(axis=1)
+    if average_over_modes:
+        psd = np.broadcast_to(psd.sum(axis=0), psd.shape)
+    k = np.argmax(psd, axis=1)
+    idx = np.arange(npols)
+    lp = np.log(np.maximum(psd[idx[:, None], (k[:, None] + np.array([-1, 0, 1]))%fft_size], np.finfo(float).tiny))
+    denom = lp[:, 0] - 2*lp[:, 1] + lp[:, 2]
+    delta = np.where(denom < 0, 0.5*(lp[:, 0] - lp[:, 2])/np.where(denom < 0, denom, 1), 0.)
+    kf = (k + delta + fft_size/2)%fft_size - fft_size/2
+    return (kf*os/fft_size/4)[:, None]
+
+def comp_freq_offset(sig, freq_offset, os=1, out=None):
     """
     Compensate for frequency offset in signal
 
@@ -439,6 +713,8 @@ def comp_freq_offset(sig, freq_offset, os=1 ):
             frequency offset to compensate for if 1D apply to all modes
         os: int
             oversampling ratio (Samples per symbols in sig)
+        out : array_like, optional
+            output array with the shape and dtype of sig, can be sig itself
 
 
     Returns
@@ -450,19 +726,14 @@ def comp_freq_offset(sig, freq_offset, os=1 ):
     # Fix number of stuff
     ndim = sig.ndim
     sig = np.atleast_2d(sig)
-    #freq_offset = np.atleast_2d(freq_offset)
     npols = sig.shape[0]
-
-    # Output Vector
-    comp_signal = np.zeros([npols, np.shape(sig)[1]], dtype=sig.dtype)
-
-    # Fix output
-    sig_len = len(sig[0,:])
-    time_vec = np.arange(1,sig_len + 1,dtype = float)
-    for l in range(npols):
-        lin_phase = 2 * np.pi * time_vec * freq_offset[l] /  os
-        comp_signal[l,:] = sig[l,:] * np.exp(-1j * lin_phase)
+    if out is None:
+        out = np.empty(sig.shape, dtype=sig.dtype)
+    dphi = np.broadcast_to(-2*np.pi*np.asarray(freq_offset, dtype=np.float64).reshape(-1)/os, (npols,))
+    # the time vector starts at 1
+    comp_signal = rotate_ramp(np.asarray(sig), dphi, dphi,
+                              out=np.atleast_2d(out))
     if ndim == 1:
-        return comp_signal.flatten()
+        return comp_signal[0]
     else:
         return comp_signal
@@ -23,6 +23,7 @@
 import numpy as np
 from qampy.core import equalisation
 from qampy.core import phaserecovery
+from qampy.core.dsp_cython import rotate_ramp, rotate_phase
 
 
 def pilot_based_foe(rec_symbs,pilot_symbs):
@@ -68,12 +69,36 @@ def pilot_based_foe(rec_symbs,pilot_symbs):
     
     return foe, foePerMode, condNum
 
-def pilot_based_cpe(rec_symbs, pilot_symbs, pilot_ins_ratio, num_average = 1, use_pilot_ratio = 1, max_num_blocks = None, remove_phase_pilots = True):
+def _pilot_phase_average(raw, g0, i0, i1, h, ntotal=None):
+    """
+    Averaged pilot phases a[i0:i1] from the unwrapped raw pilot phases raw (global pilot index g0 onwards).
+    The first h pilots use their raw phase, if ntotal is given the last h pilots of the signal use the last
+    full average.
+    """
+    cs = np.cumsum(np.insert(raw, 0, 0, axis=-1), axis=-1)
+    idx = np.arange(i0, i1)
+    if ntotal is not None:
+        idx = np.minimum(idx, ntotal - h - 1)
+    idxc = np.maximum(idx, h)
+    avg = (cs[:, idxc + h + 1 - g0] - cs[:, idxc - h - g0])/(2*h + 1)
+    return np.where(idx < h, raw[:, np.maximum(np.minimum(idx, h - 1) - g0, 0)], avg)
+
+
+def pilot_based_cpe(rec_symbs, pilot_symbs, pilot_ins_ratio, num_average = 1, use_pilot_ratio = 1, max_num_blocks = None, remove_phase_pilots = True, state = None, flush = False):
     """
     Carrier phase recovery using periodically inserted symbols.
     
     Performs a linear interpolation with averaging over n symbols to estimate
-    the phase drift from laser phase noise to compensate for this.
+    the phase drift from laser phase noise to compensate for this. All modes
+    are processed at once and the dtype of the input is preserved.
+
+    Long signals can be processed in chunks (e.g. frame by frame) by passing a
+    state dictionary, empty for the first chunk and the same dictionary for the
+    following ones. The pilot phases and the received blocks which can not be
+    interpolated yet are carried in the state, so every call returns the blocks
+    up to (num_average+1)/2 pilots before the end of the chunk and the last call
+    (flush=True) returns the rest. The concatenated outputs are the same as
+    processing the whole signal at once.
     
     Input: 
         rec_symbs: Received symbols in block (first of each block is the pilot)
@@ -85,6 +110,10 @@ def pilot_based_cpe(rec_symbs, pilot_symbs, pilot_ins_ratio, num_average = 1, us
         use_pilot_ratio: Use ever n pilots. Can be used to sweep required rate.
         max_num_blocks: Maximum number of blocks to process
         remove_phase_pilots: Remove phase pilots after CPE. Default: True
+        state: Dictionary with the state between chunks, enables chunk mode.
+            The chunks need to contain a multiple of 
+            pilot_ins_ratio*use_pilot_ratio symbols.
+        flush: Process the remaining blocks in the state in chunk mode 
         
     Output:
         data_symbs: Complex symbols after pilot-aided CPE. Pilot symbols removed
@@ -94,73 +123,88 @@ def pilot_based_cpe(rec_symbs, pilot_symbs, pilot_ins_ratio, num_average = 1, us
     rec_symbs = np.atleast_2d(rec_symbs)
     pilot_symbs = np.atleast_2d(pilot_symbs)
     npols = rec_symbs.shape[0]
+    pilot_ins_ratio = int(pilot_ins_ratio)
+    use_pilot_ratio = int(use_pilot_ratio)
+    seg_len = pilot_ins_ratio*use_pilot_ratio
+
+    if state is None:
+        # Extract the pilot symbols
+        numBlocks = rec_symbs.shape[1]//pilot_ins_ratio
+        # If selected, only process a limited number of blocks. 
+        if (max_num_blocks is not None) and numBlocks > max_num_blocks:
+            numBlocks = int(max_num_blocks)
+        # Check that the number of blocks are equal and is valid
+        numBlocks = min(numBlocks, pilot_symbs.shape[1])
+        # Make sure that a given number of pilots can be used
+        numBlocks -= numBlocks % use_pilot_ratio
+        if use_pilot_ratio >= numBlocks:
+            raise ValueError("Can not use every %d pilots since only %d pilot symbols are present"%(use_pilot_ratio,numBlocks))
+        # Check for a out of bounch error
+        if numBlocks//use_pilot_ratio <= num_average:
+            raise ValueError("Inpropper pilot symbol configuration. Larger averaging block size than total number of pilot symbols")
+        rec_symbs = rec_symbs[:, :pilot_ins_ratio*numBlocks]
+        pilot_symbs = pilot_symbs[:, :numBlocks]
+        flush = True
+        state = {}
+    else:
+        if rec_symbs.shape[1] % seg_len:
+            raise ValueError("Chunks need to contain a multiple of pilot_ins_ratio*use_pilot_ratio symbols")
+        numBlocks = rec_symbs.shape[1]//pilot_ins_ratio
+        if pilot_symbs.shape[1] < numBlocks:
+            raise ValueError("Not enough pilot symbols for the chunk")
+        pilot_symbs = pilot_symbs[:, :numBlocks]
 
-    # Extract the pilot symbols
-    numBlocks = np.floor(np.shape(rec_symbs)[1]/pilot_ins_ratio)
-    # If selected, only process a limited number of blocks. 
-    if (max_num_blocks is not None) and numBlocks > max_num_blocks:
-        numBlocks = max_num_blocks   
-    
-    # Make sure that a given number of pilots can be used
-    if (numBlocks % use_pilot_ratio):
-        numBlocks -= (numBlocks % use_pilot_ratio)            
-
-    # Adapt for number of blocks
-    rec_pilots = rec_symbs[:,::int(pilot_ins_ratio)]
-    rec_pilots = rec_pilots[:,:int(numBlocks)]
-    rec_symbs = rec_symbs[:,:int(pilot_ins_ratio*numBlocks)]
-
-    # Check that the number of blocks are equal and is valid
-    numRefPilots = np.shape(pilot_symbs)[1]
-    if numBlocks > numRefPilots:
-        numBlocks = numRefPilots
-        rec_symbs = rec_symbs[:,int(numBlocks*pilot_ins_ratio)]
-        rec_pilots = rec_pilots[:,:int(numBlocks)]
-    elif numRefPilots > numBlocks:
-        pilot_symbs = pilot_symbs[:,:int(numBlocks)]
-    
-    # Remove every X pilot symbol if selected
-    if use_pilot_ratio >= pilot_symbs.shape[1]:
-        raise ValueError("Can not use every %d pilots since only %d pilot symbols are present"%(use_pilot_ratio,pilot_symbs.shape[1]))
-    rec_pilots = rec_pilots[:,::int(use_pilot_ratio)]
-    pilot_symbs = pilot_symbs[:,::int(use_pilot_ratio)]
-    
-    # Check for a out of bounch error
-    if pilot_symbs.shape[1] <= num_average:
-        raise ValueError("Inpropper pilot symbol configuration. Larger averaging block size than total number of pilot symbols")
-    
     # Should be an odd number to keey symmetry in averaging
     if not(num_average % 2):
         num_average += 1
-    
-    # Allocate output memory and process modes
-    data_symbs = np.zeros([npols,np.shape(rec_symbs)[1]], dtype = complex)
-    phase_trace = np.zeros([npols,np.shape(rec_symbs)[1]])
-    for l in range(npols):
-        # Calculate phase respons
-        res_phase = pilot_symbs[l,:].conjugate()*rec_pilots[l,:]
-        pilot_phase = np.unwrap(np.angle(res_phase))
-
-        # Fix! Need moving average in numpy
-        pilot_phase_average = np.transpose(moving_average(pilot_phase,num_average))
-        pilot_phase = np.hstack([pilot_phase[:int((num_average-1)/2)], pilot_phase_average,np.ones(pilot_phase[:int((num_average-1)/2)].shape)*pilot_phase_average[-1]])
-           
-        # Pilot positions in the received data set
-        pilot_pos = np.arange(0,len(pilot_phase)*pilot_ins_ratio*use_pilot_ratio,pilot_ins_ratio*use_pilot_ratio)
-#        pilot_pos_int = np.arange(0,(len(pilot_phase)+1)*pilot_ins_ratio*use_pilot_ratio,pilot_ins_ratio*use_pilot_ratio)
-        
-        # Lineary interpolate the phase evolution
-        phase_trace[l,:] = np.interp(np.arange(0,len(pilot_phase)*pilot_ins_ratio*use_pilot_ratio),\
-                               pilot_pos,pilot_phase)
+    h = num_average//2
+
+    # Pilot phases of the used pilots, unwrapped continuously from the previous chunk
+    rec_pilots = rec_symbs[:, ::seg_len]
+    pilot_phase = np.angle(pilot_symbs[:, ::use_pilot_ratio].conjugate()*rec_pilots)
+    if "raw" in state:
+        pilot_phase = np.unwrap(np.hstack([state["raw"][:, -1:], pilot_phase]), axis=-1)[:, 1:]
+        raw = np.hstack([state["raw"], pilot_phase])
+        pending = np.hstack([state["symbs"], rec_symbs])
+    else:
+        pilot_phase = np.unwrap(pilot_phase, axis=-1)
+        raw = pilot_phase
+        pending = rec_symbs
+    # global index of the first pilot in raw and of the first pending segment, total number of pilots
+    g0 = state.get("g0", 0)
+    i0 = state.get("i0", 0)
+    n = g0 + raw.shape[1]
+
+    # Segment i between the used pilots i and i+1 can be interpolated once the average of pilot i+1 is known
+    if flush:
+        i1 = n
+        a = _pilot_phase_average(raw, g0, i0, n, h, ntotal=n)
+        a = np.hstack([a, a[:, -1:]])
+    else:
+        i1 = max(n - 1 - h, i0)
+        a = _pilot_phase_average(raw, g0, i0, i1 + 1, h)
 
-        # Compensate phase
-        data_symbs[l,:] = rec_symbs[l,:]*np.exp(-1j*phase_trace[l,:])
-        
-    # Remove the phase pilots after compensation. This is an option since they can be used for SNR estimation e.g.
+    # Lineary interpolate the phase evolution
+    nseg = i1 - i0
+    frac = np.arange(seg_len)/seg_len
+    phase_trace = (a[:, :nseg, None] + (a[:, 1:nseg + 1] - a[:, :nseg])[:, :, None]*frac).reshape(npols, -1)
+
+    # Compensate phase, removing the phase pilots after compensation with a strided view of the blocks. This is
+    # an option since they can be used for SNR estimation e.g.
+    rec_out = pending[:, :nseg*seg_len]
     if remove_phase_pilots:
-        pilot_pos = np.arange(0,np.shape(data_symbs)[1],pilot_ins_ratio)
-        data_symbs = np.delete(data_symbs,pilot_pos, axis = 1)
-        
+        rec_out = rec_out.reshape(npols, -1, pilot_ins_ratio)[:, :, 1:].reshape(npols, -1)
+        trace_out = phase_trace.reshape(npols, -1, pilot_ins_ratio)[:, :, 1:].reshape(npols, -1)
+    else:
+        trace_out = phase_trace
+    data_symbs = rotate_phase(np.ascontiguousarray(rec_out), -trace_out)
+
+    # keep the raw phases needed for the averages of the pending segments
+    gn = max(min(i1, n) - h, 0)
+    state["raw"] = raw[:, gn - g0:]
+    state["symbs"] = pending[:, nseg*seg_len:]
+    state["g0"] = gn
+    state["i0"] = i1
     return data_symbs, phase_trace
     
     
@@ -393,7 +437,7 @@ def find_const_phase_offset(rec_pilots, ref_symbs):
     return  phase_corr
     
 
-def correct_const_phase_offset(symbs, phase_offsets):
+def correct_const_phase_offset(symbs, phase_offsets, out=None):
     """
     Corrects a constant phase offset between the decoded pilot 
     symbols and the transmitted ones
@@ -401,6 +445,7 @@ def correct_const_phase_offset(symbs, phase_offsets):
     Input:
         symbs: Complex symbols to be compensated
         phase_offsets: Phase offset for each mode
+        out: Output array, by default the symbols are rotated in-place
         
     Output:
         symbs: Symbols after phase rotation
@@ -409,11 +454,12 @@ def correct_const_phase_offset(symbs, phase_offsets):
     symbs = np.atleast_2d(symbs)
     phase_offsets = np.atleast_2d(phase_offsets)
     npols = symbs.shape[0]
+    if out is None:
+        out = symbs
 
-    for l in range(npols):
-        symbs[l,:] = symbs[l,:] * np.exp(-1j*phase_offsets[l,0])
-
-    return symbs
+    rotate_ramp(symbs, np.ascontiguousarray(-phase_offsets[:npols, 0], dtype=np.float64), np.zeros(npols),
+                out=np.atleast_2d(out))
+    return np.atleast_2d(out)
 
 
 
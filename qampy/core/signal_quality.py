@@ -21,8 +21,12 @@ import numpy as np
 from qampy.helpers import cabssquared
 from qampy.theory import  cal_symbols_qam, cal_scaling_factor_qam
 from qampy.core.equalisation.cython_equalisation import make_decision as _decision_pyx
+from qampy.core.equalisation.cython_equalisation import make_decision_index as _decision_idx_pyx
 from qampy.core.dsp_cython import soft_l_value_demapper
 from qampy.core.dsp_cython import soft_l_value_demapper_minmax
+from qampy.core.dsp_cython import soft_l_value_demapper_pam as _soft_l_value_demapper_pam_pyx
+from qampy.core.dsp_cython import count_bit_errors
+from qampy.core.dsp_cython import gmi_accumulate as _gmi_accumulate_pyx
 
 try:
     import arrayfire as af
@@ -39,7 +43,70 @@ def _soft_l_value_demapper_af(rx_symbs, M, snr, bits_map):
     lvl = af.log(tmp[:,:,:,1]) - af.log(tmp[:,:,:,0])
     return np.array(lvl)
 
-def make_decision(signal, symbols, method="pyx", **kwargs):
+def symbol_index_dtype(M):
+    """
+    Smallest unsigned integer dtype that can hold the symbol indices of an M-ary constellation.
+
+    Parameters
+    ----------
+    M : int
+        number of symbols
+
+    Returns
+    -------
+    dtype : np.dtype
+        np.uint8 for M <= 256 otherwise np.uint16
+    """
+    if M <= 2**8:
+        return np.dtype(np.uint8)
+    elif M <= 2**16:
+        return np.dtype(np.uint16)
+    else:
+        raise ValueError("Symbol indices are only supported for up to 2**16 symbols")
+
+def hamming_distance_table(bit_table):
+    """
+    Table of the Hamming distances between the bit words of all symbol pairs.
+
+    Parameters
+    ----------
+    bit_table : array_like
+        (M, Nbits) boolean array of the bits of each symbol
+
+    Returns
+    -------
+    table : array_like
+        (M, M) uint8 array of the number of differing bits between symbol i and j
+    """
+    bit_table = np.asarray(bit_table, dtype=np.bool_)
+    return np.count_nonzero(bit_table[:, np.newaxis, :] ^ bit_table[np.newaxis, :, :], axis=-1).astype(np.uint8)
+
+def cal_ber_idx(idx_tx, idx_rx, hamming_table):
+    """
+    Calculate the bit error rate from transmitted and received symbol indices without demodulating to bits.
+
+    Parameters
+    ----------
+    idx_tx : array_like
+        transmitted symbol indices, synchronized to idx_rx (1D or 2D with modes as first dimension)
+    idx_rx : array_like
+        received (decided) symbol indices
+    hamming_table : array_like
+        (M, M) table of Hamming distances between symbols see `hamming_distance_table`
+
+    Returns
+    -------
+    ber : array_like
+        bit error rate per mode
+    """
+    idx_tx = np.atleast_2d(idx_tx)
+    idx_rx = np.atleast_2d(idx_rx).astype(idx_tx.dtype, copy=False)
+    hamming_table = np.ascontiguousarray(hamming_table, dtype=np.uint8)
+    nbits = np.log2(hamming_table.shape[0])
+    nerr = np.array([count_bit_errors(idx_tx[i], idx_rx[i], hamming_table) for i in range(idx_tx.shape[0])])
+    return nerr / (idx_tx.shape[1] * nbits)
+
+def make_decision(signal, symbols, method="pyx", return_indices=False, **kwargs):
     """
     Quantize signal array onto symbols.
 
@@ -51,15 +118,21 @@ def make_decision(signal, symbols, method="pyx", **kwargs):
         array of symbols to quantize onto
     method : string, optional
         what method to use ('af' for arrayfire or 'pyx' for python)
+    return_indices : bool, optional
+        return the indices of the decided symbols in symbols (see symbol_index_dtype) instead of the symbols
     kwargs
         keyword arguments passed to pyx or af functions
 
     Returns
     -------
     out : array_like
-        array of quantized symbols
+        array of quantized symbols or symbol indices
 
     """
+    if return_indices:
+        if method != "pyx":
+            raise ValueError("returning symbol indices is only supported for the 'pyx' method")
+        return _decision_idx_pyx(signal, symbols)
     if method == "pyx":
         return _decision_pyx(signal, symbols, **kwargs)
     elif method == "af":
@@ -135,29 +208,45 @@ def norm_to_s0(sig, M):
     return sig / norm
 
 
-def _cal_evm_blind(sig, M):
+def _cal_evm_blind(sig, M, chunksize=2**16):
     """Blind calculation of the linear Error Vector Magnitude for an M-QAM
     signal. Does not consider Symbol errors.
 
     Parameters
     ----------
     sig : array_like
-        input signal
+        input signal, 1D or 2D array of shape (nmodes, N)
     M : int
        QAM order
+    chunksize : int, optional
+        number of samples that are normalised and decided at once, which bounds the temporary memory
 
     Returns
     -------
-    evm : float
-        Error Vector Magnitude
+    evm : float or array_like
+        Error Vector Magnitude (per mode for 2D input)
         """
     ideal = cal_symbols_qam(M).flatten()
     Pi = norm_to_s0(ideal, M)
-    Pm = norm_to_s0(sig, M)
-    evm = np.mean(np.min(abs(Pm[:,np.newaxis].real-Pi.real)**2 +\
-            abs(Pm[:,np.newaxis].imag-Pi.imag)**2, axis=1))
-    evm /= np.mean(abs(Pi)**2)
-    return np.sqrt(evm)
+    ndim = np.ndim(sig)
+    sig = np.atleast_2d(sig)
+    if sig.dtype not in (np.complex64, np.complex128):
+        sig = sig.astype(np.complex128)
+    syms = Pi.astype(sig.dtype)
+    nmodes, N = sig.shape
+    evm = np.zeros(nmodes, dtype=np.float64)
+    for mode in range(nmodes):
+        norm = np.sqrt(cal_s0(sig[mode], M))
+        # errors to the nearest symbol of the normalised signal, decided in chunks with the symbol slicer
+        for i in range(0, N, chunksize):
+            Pm = np.ascontiguousarray(sig[mode, i:i + chunksize]/norm, dtype=sig.dtype)
+            idx = _decision_idx_pyx(Pm, syms)
+            evm[mode] += np.sum(cabssquared(Pm - Pi[idx]), dtype=np.float64)
+    evm /= N*np.mean(abs(Pi)**2)
+    evm = np.sqrt(evm)
+    if ndim == 1:
+        return evm[0]
+    return evm
 
 
 def cal_evm(sig, M, known=None):
@@ -167,7 +256,7 @@ def cal_evm(sig, M, known=None):
     Parameters
     ----------
     sig : array_like
-        input signal
+        input signal, for the blind calculation this can also be a 2D array of shape (nmodes, N)
     M : int
        QAM order
     known : array_like
@@ -175,8 +264,8 @@ def cal_evm(sig, M, known=None):
 
     Returns
     -------
-    evm : float
-        Error Vector Magnitude
+    evm : float or array_like
+        Error Vector Magnitude (per mode for blind calculation on 2D input)
     """
     if known is None:
         return _cal_evm_blind(sig, M)
@@ -300,6 +389,156 @@ def generate_bitmapping_mtx(coded_symbs, coded_bits, M, dtype=np.complex128):
         bit_map[bit,:,1] = coded_symbs[out_mtx[:,bit]]
     return bit_map
 
+def pam_bit_tables(bits_map):
+    """
+    Decompose the bit mapping of a square QAM constellation into the bit mappings of its in-phase and
+    quadrature PAM components.
+
+    Parameters
+    ----------
+    bits_map : array_like
+        bit mapping matrix of shape (nbits, M/2, 2) as generated by generate_bitmapping_mtx
+
+    Returns
+    -------
+    tables : tuple or None
+        (levels, bit_table, bit_dim) as used by soft_l_value_demapper_pam, or None if the constellation is not a
+        full square grid or a bit depends on both the in-phase and quadrature component
+    """
+    num_bits, k, _ = bits_map.shape
+    syms = np.concatenate([bits_map[0, :, 0], bits_map[0, :, 1]])
+    levels = np.unique(syms.real).astype(np.float64)
+    npam = levels.size
+    if npam**2 != 2*k or not np.allclose(levels, np.unique(syms.imag)):
+        return None
+    bit_table = np.zeros((2, npam, num_bits), dtype=np.uint8)
+    bit_dim = np.zeros(num_bits, dtype=np.intc)
+    for bit in range(num_bits):
+        for d, coord in enumerate([np.real, np.imag]):
+            # the level indices of the symbols with the bit set and cleared
+            i1 = np.searchsorted(levels, coord(bits_map[bit, :, 1]))
+            i0 = np.searchsorted(levels, coord(bits_map[bit, :, 0]))
+            if np.intersect1d(i0, i1).size == 0:
+                bit_table[d, i1, bit] = 1
+                bit_dim[bit] = d
+                break
+        else:
+            return None
+    return levels, bit_table, bit_dim
+
+def soft_l_value_demapper_pam(rx_symbs, snr, tables, maxlog=False):
+    """
+    Separable soft demapper for square QAM, working on the PAM components of every dimension (see pam_bit_tables).
+
+    Parameters
+    ----------
+    rx_symbs : array_like
+        received symbols
+    snr : float
+        linear signal-to-noise ratio
+    tables : tuple
+        PAM bit tables from pam_bit_tables
+    maxlog : bool, optional
+        use the max-log approximation instead of the exact calculation
+
+    Returns
+    -------
+    L_values : array_like
+        L-values for every symbol and bit (bits of a symbol are consecutive), the same as soft_l_value_demapper
+        (or soft_l_value_demapper_minmax for maxlog)
+    """
+    levels, bit_table, bit_dim = tables
+    return _soft_l_value_demapper_pam_pyx(np.ascontiguousarray(rx_symbs), snr, levels, bit_table, bit_dim, maxlog)
+
+def demapping_tables(symbols, bit_table):
+    """
+    Demapping points and bit tables used by the fused GMI functions. Square QAM constellations whose bits depend on
+    either the in-phase or quadrature component only are demapped on their PAM components (see pam_bit_tables),
+    all other constellations on the full set of symbols.
+
+    Parameters
+    ----------
+    symbols : array_like
+        constellation symbols
+    bit_table : array_like
+        (M, Nbits) boolean array of the bits of each symbol
+
+    Returns
+    -------
+    points : array_like
+        demapping points of shape (ndim, npts)
+    point_bits : array_like
+        uint8 bits of the points of shape (ndim, npts, Nbits)
+    bit_dim : array_like
+        dimension that every bit depends on
+    separable : bool
+        whether the points are the PAM levels of the in-phase and quadrature dimension
+    """
+    M = symbols.shape[0]
+    bit_table = np.asarray(bit_table, dtype=np.uint8)
+    tables = pam_bit_tables(generate_bitmapping_mtx(symbols, bit_table.astype(np.bool_).reshape(-1), M))
+    if tables is not None:
+        levels, point_bits, bit_dim = tables
+        return np.tile(levels.astype(np.complex128), (2, 1)), point_bits, bit_dim, True
+    points = np.asarray(symbols, dtype=np.complex128).reshape(1, -1)
+    return points, np.ascontiguousarray(bit_table[np.newaxis]), np.zeros(bit_table.shape[1], dtype=np.intc), False
+
+def cal_gmi_idx(signal_rx, idx_tx, snr, symbols, bit_table, maxlog=False, return_l_values=False):
+    """
+    Calculate the generalized mutual information from received symbols and the indices of the transmitted symbols.
+
+    Demapping and accumulation of the GMI are fused into one parallel pass over the symbols of all modes, so
+    neither the L-values nor the transmitted bits are materialised. See demapping_tables for how the constellation
+    is demapped.
+
+    Parameters
+    ----------
+    signal_rx : array_like
+        received signal, 1D or 2D array of shape (nmodes, N)
+    idx_tx : array_like
+        indices of the transmitted symbols into symbols (see symbol_index_dtype), synchronized to signal_rx
+    snr : float or array_like
+        linear signal-to-noise ratio (per mode)
+    symbols : array_like
+        constellation symbols
+    bit_table : array_like
+        (M, Nbits) boolean array of the bits of each symbol
+    maxlog : bool, optional
+        use the max-log approximation of the L-values
+    return_l_values : bool, optional
+        also return the L-values
+
+    Returns
+    -------
+    gmi : float or array_like
+        generalized mutual information (per mode for 2D input)
+    gmi_per_bit : array_like
+        generalized mutual information per bit (per mode for 2D input)
+    l_values : array_like
+        L-values for every symbol and bit (bits of a symbol are consecutive), only if return_l_values is True
+    """
+    ndim = np.ndim(signal_rx)
+    signal_rx = np.atleast_2d(signal_rx)
+    if signal_rx.dtype not in (np.complex64, np.complex128):
+        signal_rx = signal_rx.astype(np.complex128)
+    nmodes, N = signal_rx.shape
+    M = symbols.shape[0]
+    bit_table = np.asarray(bit_table, dtype=np.uint8)
+    num_bits = bit_table.shape[1]
+    idx_tx = np.atleast_2d(idx_tx).astype(symbol_index_dtype(M), copy=False)
+    snr = np.broadcast_to(np.asarray(snr, dtype=np.float64), (nmodes,)).copy()
+    points, point_bits, bit_dim, separable = demapping_tables(symbols, bit_table)
+    l_values = np.zeros((nmodes, N*num_bits)) if return_l_values else None
+    gmi, gmi_per_bit = _gmi_accumulate_pyx(signal_rx, idx_tx, snr, points, point_bits, bit_dim, bit_table,
+                                          separable, maxlog, l_values)
+    if ndim == 1:
+        gmi, gmi_per_bit = gmi[0], gmi_per_bit[0]
+        if return_l_values:
+            l_values = l_values[0]
+    if return_l_values:
+        return gmi, gmi_per_bit, l_values
+    return gmi, gmi_per_bit
+
 def estimate_snr(signal_rx, symbols_tx, gray_symbols, verbose=False):
     """
     Estimate the signal-to-noise ratio from received and known transmitted symbols.
@@ -307,7 +546,7 @@ def estimate_snr(signal_rx, symbols_tx, gray_symbols, verbose=False):
     Parameters
     ----------
     signal_rx : array_like
-        received signal
+        received signal, 1D or 2D array of shape (nmodes, L)
     symbols_tx : array_like
         transmitted symbol sequence
     gray_symbols : array_like
@@ -317,34 +556,229 @@ def estimate_snr(signal_rx, symbols_tx, gray_symbols, verbose=False):
 
     Note
     ----
-    signal_rx and symbols_tx need to be synchronized and have the same length.
+    signal_rx and symbols_tx need to be synchronized and have the same length. symbols_tx can also be given as
+    integer indices into gray_symbols. Complex symbols are converted to indices with the symbol slicer and
+    transmitted symbols which are not part of gray_symbols are ignored. The per-symbol statistics of all modes
+    are then calculated with bincounts, so the cost does not depend on the number of symbols.
     
     Returns
     -------
-    snr : float
-        estimated linear signal-to-noise ratio
+    snr : float or array_like
+        estimated linear signal-to-noise ratio (per mode for 2D input)
     if verbose is True also return:
-    S0 : float
+    S0 : float or array_like
         estimated linear signal power
-    N0 : float
+    N0 : float or array_like
         estimated linear noise power
     """
 
     N = gray_symbols.shape[0]
-    Px = np.zeros(N, dtype=np.float64)
-    N0 = 0.
-    mus = np.zeros(N, dtype=np.complex128)
-    sigmas = np.zeros(N, dtype=np.complex128)
-    in_pow = 0.
-    for ind in range(N):
-        sel_symbs = signal_rx[np.bool_(symbols_tx == gray_symbols[ind])]
-        Px[ind] = sel_symbs.shape[0] / signal_rx.shape[0]
-        mus[ind] = np.mean(sel_symbs)
-        sigmas[ind] = np.std(sel_symbs)
-        N0 += np.abs(sigmas[ind])**2*Px[ind]
-        in_pow += np.abs(mus[ind])**2*Px[ind]
-    snr = in_pow/N0
+    symbols_tx = np.asarray(symbols_tx)
+    if not np.issubdtype(symbols_tx.dtype, np.integer):
+        gray_symbols = np.asarray(gray_symbols, dtype=np.complex128)
+        sym_flat = np.ascontiguousarray(symbols_tx.reshape(-1), dtype=np.complex128)
+        idx = make_decision(sym_flat, gray_symbols, return_indices=True).astype(np.intp)
+        # transmitted values which are not symbols go into an extra bin which is not counted
+        idx[gray_symbols[idx] != sym_flat] = N
+        symbols_tx = idx.reshape(symbols_tx.shape)
+    return _estimate_snr_idx(signal_rx, symbols_tx, N, verbose=verbose)
+
+def _estimate_snr_idx(signal_rx, idx_tx, M, verbose=False):
+    """
+    Estimate the signal-to-noise ratio from received symbols and the indices of the known transmitted symbols, using
+    bincounts for the per-symbol statistics of all modes at once. Indices >= M are ignored. See estimate_snr for
+    details.
+    """
+    ndim = np.ndim(signal_rx)
+    signal_rx = np.atleast_2d(signal_rx)
+    counts, mus, m2 = _symbol_moments(signal_rx, idx_tx, M)
+    snr, in_pow, N0 = _snr_from_moments(counts, mus, m2, signal_rx.shape[1])
+    if ndim == 1:
+        snr, in_pow, N0 = snr[0], in_pow[0], N0[0]
     if verbose:
         return snr, in_pow, N0
     else:
         return snr
+
+def _symbol_moments(signal_rx, idx_tx, M):
+    """
+    Count, mean and sum of squared deviations from the mean of the received samples for every transmitted symbol
+    and mode of a 2D signal, calculated with bincounts. Indices >= M are ignored.
+    """
+    nmodes, L = signal_rx.shape
+    # one bin per symbol and mode plus one for the ignored values
+    bins = np.atleast_2d(idx_tx).astype(np.intp)
+    bins = np.where(bins < M, bins, M) + (M + 1)*np.arange(nmodes)[:, None]
+    bins = bins.reshape(-1)
+    rx = signal_rx.reshape(-1)
+    nbins = nmodes*(M + 1)
+    counts = np.bincount(bins, minlength=nbins)
+    nz = counts > 0
+    mus = np.zeros(nbins, dtype=np.complex128)
+    mus[nz] = (np.bincount(bins, weights=rx.real, minlength=nbins)[nz] +
+               1j*np.bincount(bins, weights=rx.imag, minlength=nbins)[nz])/counts[nz]
+    # use the residuals instead of E|x|^2-|mu|^2 to avoid cancellation at high SNR
+    m2 = np.bincount(bins, weights=cabssquared(rx - mus[bins]), minlength=nbins)
+    return (counts.reshape(nmodes, M + 1)[:, :M], mus.reshape(nmodes, M + 1)[:, :M],
+            m2.reshape(nmodes, M + 1)[:, :M])
+
+def _snr_from_moments(counts, mus, m2, L):
+    """
+    SNR, signal and noise power per mode from the per-symbol moments of _symbol_moments, where L is the number of
+    samples per mode (including ignored ones).
+    """
+    nz = counts > 0
+    var = np.zeros(counts.shape, dtype=np.float64)
+    var[nz] = m2[nz]/counts[nz]
+    Px = counts/np.reshape(L, (-1, 1))
+    in_pow = np.sum(cabssquared(mus)*Px, axis=-1)
+    N0 = np.sum(var*Px, axis=-1)
+    return in_pow/N0, in_pow, N0
+
+
+class MetricAccumulator(object):
+    """
+    MetricAccumulator(symbols, bit_table, nmodes=1)
+
+    Running signal quality metrics of an unbounded stream of synchronized received and transmitted chunks.
+
+    Only per-mode running counts and moments are kept, so the memory does not grow with the number of symbols.
+    Symbol and bit errors are counted from the symbol decisions, the EVM is the running mean of the squared error
+    vector, for the SNR the per-symbol counts, means and squared deviations of estimate_snr are merged with the
+    parallel form of Welford's algorithm, and the GMI is accumulated as partial sums of the fused GMI calculation.
+    Accumulators of the same constellation (e.g. from different worker processes) can be merged.
+
+    Parameters
+    ----------
+    symbols : array_like
+        constellation symbols (coded symbols)
+    bit_table : array_like
+        (M, Nbits) boolean array of the bits of each symbol
+    nmodes : int, optional
+        number of modes
+
+    Attributes
+    ----------
+    N : array_like
+        number of received symbols per mode
+    """
+
+    def __init__(self, symbols, bit_table, nmodes=1):
+        self.symbols = np.asarray(symbols)
+        self.bit_table = np.asarray(bit_table, dtype=np.bool_)
+        self.M = self.symbols.shape[0]
+        self.Nbits = self.bit_table.shape[1]
+        self.nmodes = nmodes
+        self._hamming_table = hamming_distance_table(self.bit_table)
+        self.N = np.zeros(nmodes, dtype=np.int64)
+        self._symbol_errors = np.zeros(nmodes, dtype=np.int64)
+        self._bit_errors = np.zeros(nmodes, dtype=np.int64)
+        self._err_power = np.zeros(nmodes, dtype=np.float64)
+        self._counts = np.zeros((nmodes, self.M), dtype=np.int64)
+        self._mus = np.zeros((nmodes, self.M), dtype=np.complex128)
+        self._m2 = np.zeros((nmodes, self.M), dtype=np.float64)
+        self._gmi_sums = np.zeros((nmodes, self.Nbits), dtype=np.float64)
+
+    @classmethod
+    def from_signal(cls, signal):
+        """
+        Create an accumulator for the constellation and number of modes of a signal object.
+        """
+        return cls(signal.coded_symbols, signal._bit_table, nmodes=signal.shape[0])
+
+    def update(self, signal_rx, idx_tx, snr=None):
+        """
+        Add a chunk of received symbols.
+
+        Parameters
+        ----------
+        signal_rx : array_like
+            received (equalised) signal chunk of shape (nmodes, L)
+        idx_tx : array_like
+            indices of the transmitted symbols into symbols, synchronized to signal_rx
+        snr : float or array_like, optional
+            linear SNR (per mode) used for the GMI demapping. Default: use the running SNR estimate including this
+            chunk, pass a fixed SNR to get the same GMI as a calculation over the whole signal at that SNR.
+        """
+        signal_rx = np.atleast_2d(signal_rx)
+        if signal_rx.dtype not in (np.complex64, np.complex128):
+            signal_rx = signal_rx.astype(np.complex128)
+        idx_tx = np.atleast_2d(idx_tx).astype(symbol_index_dtype(self.M), copy=False)
+        if signal_rx.shape[0] != self.nmodes or idx_tx.shape != signal_rx.shape:
+            raise ValueError("signal_rx and idx_tx need to be of shape (nmodes, L)")
+        L = signal_rx.shape[1]
+        if L == 0:
+            return self
+        syms = self.symbols.astype(signal_rx.dtype)
+        idx_rx = np.zeros(signal_rx.shape, dtype=idx_tx.dtype)
+        for i in range(self.nmodes):
+            idx_rx[i] = make_decision(np.ascontiguousarray(signal_rx[i]), syms, return_indices=True)
+            self._bit_errors[i] += count_bit_errors(idx_tx[i], idx_rx[i], self._hamming_table)
+        self._symbol_errors += np.count_nonzero(idx_rx != idx_tx, axis=-1)
+        err_power = np.mean(cabssquared(self.symbols[idx_tx] - signal_rx), axis=-1, dtype=np.float64)
+        self._merge_moments(np.full(self.nmodes, L, dtype=np.int64), err_power,
+                            *_symbol_moments(signal_rx, idx_tx, self.M))
+        if snr is None:
+            snr = self.est_snr()
+        gmi_per_bit = cal_gmi_idx(signal_rx, idx_tx, snr, self.symbols, self.bit_table)[1]
+        self._gmi_sums += (1 - gmi_per_bit)*L
+        return self
+
+    def _merge_moments(self, N, err_power, counts, mus, m2):
+        Ntot = self.N + N
+        self._err_power += (err_power - self._err_power)*N/Ntot
+        ctot = self._counts + counts
+        nz = ctot > 0
+        delta = mus - self._mus
+        self._mus[nz] += delta[nz]*counts[nz]/ctot[nz]
+        self._m2[nz] += m2[nz] + cabssquared(delta[nz])*self._counts[nz]*counts[nz]/ctot[nz]
+        self._counts = ctot
+        self.N = Ntot
+
+    def merge(self, other):
+        """
+        Merge the statistics of another accumulator of the same constellation and number of modes into this one.
+        """
+        if other.M != self.M or other.nmodes != self.nmodes:
+            raise ValueError("Can only merge accumulators with the same constellation and number of modes")
+        if np.all(other.N == 0):
+            return self
+        self._symbol_errors += other._symbol_errors
+        self._bit_errors += other._bit_errors
+        self._gmi_sums += other._gmi_sums
+        self._merge_moments(other.N, other._err_power, other._counts, other._mus, other._m2)
+        return self
+
+    def cal_ser(self):
+        """
+        Symbol error rate per mode.
+        """
+        return self._symbol_errors/self.N
+
+    def cal_ber(self):
+        """
+        Bit error rate per mode.
+        """
+        return self._bit_errors/(self.N*self.Nbits)
+
+    def cal_evm(self):
+        """
+        RMS EVM per mode against the transmitted symbols (see SignalBase.cal_evm).
+        """
+        return np.sqrt(self._err_power)
+
+    def est_snr(self, verbose=False):
+        """
+        Linear SNR per mode as calculated by estimate_snr, and signal and noise power if verbose is True.
+        """
+        snr, in_pow, N0 = _snr_from_moments(self._counts, self._mus, self._m2, self.N)
+        if verbose:
+            return snr, in_pow, N0
+        return snr
+
+    def cal_gmi(self):
+        """
+        GMI and GMI per bit per mode.
+        """
+        gmi_per_bit = 1 - self._gmi_sums/self.N[:, np.newaxis]
+        return np.sum(gmi_per_bit, axis=-1), gmi_per_bit
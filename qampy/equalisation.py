@@ -20,7 +20,7 @@ from qampy import core
 from qampy.core import equalisation
 __doc__= equalisation.equalisation.__doc__
 
-def apply_filter(sig, wxy, method="pyx"):
+def apply_filter(sig, wxy, method="auto"):
     """
     Apply the equaliser filter taps to the input signal.
 
@@ -34,7 +34,8 @@ def apply_filter(sig, wxy, method="pyx"):
         filter taps for the x and y polarisation
 
     method : basestring
-        which apply filter method to use (pyx=cython, py=python)
+        which apply filter method to use (pyx=cython, py=python, fft=overlap-save fast convolution, auto=select
+        pyx or fft based on the number of taps and signal length)
 
     Returns
     -------
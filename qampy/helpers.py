@@ -39,19 +39,32 @@ def lin2dB(x):
     return 10*np.log10(x)
 
 
-def normalise_and_center(E):
+def normalise_and_center(E, out=None):
     """
     Normalise and center the input field, by calculating the mean power for each polarisation separate and dividing by its square-root
+
+    Complex signals are normalised with parallel passes over the data, pass out=E to normalise in-place. Real
+    signals are normalised with numpy (1D real input returns a complex array).
     """
-    if E.ndim > 1:
-        E = E - np.mean(E, axis=-1)[:, np.newaxis]
-        P = np.sqrt(np.mean(cabssquared(E), axis=-1))
-        E /= P[:, np.newaxis]
-    else:
-        E = E.real - np.mean(E.real) + 1.j * (E.imag-np.mean(E.imag))
-        P = np.sqrt(np.mean(cabssquared(E)))
-        E /= P
-    return E
+    if not np.iscomplexobj(E):
+        if E.ndim > 1:
+            E = E - np.mean(E, axis=-1)[:, np.newaxis]
+            P = np.sqrt(np.mean(cabssquared(E), axis=-1))
+            E /= P[:, np.newaxis]
+        else:
+            E = E.real - np.mean(E.real) + 1.j * (E.imag-np.mean(E.imag))
+            P = np.sqrt(np.mean(cabssquared(E)))
+            E /= P
+        if out is None:
+            return E
+        out[...] = E
+        return out
+    # imported here as the core modules import helpers
+    from qampy.core.dsp_cython import normalise_center
+    if out is None:
+        out = np.empty_like(E)
+    normalise_center(np.atleast_2d(np.asarray(E)), out=np.atleast_2d(np.asarray(out)))
+    return out
 
 
 def dump_edges(E, N):
@@ -89,7 +89,7 @@ def bps(E, Mtestangles, N, **kwargs):
     """
     return core.phaserecovery.bps(E, Mtestangles, E.coded_symbols, N, **kwargs)
 
-def find_freq_offset(sig, average_over_modes = False, fft_size = 4096):
+def find_freq_offset(sig, average_over_modes = False, fft_size = 4096, method="fft", **kwargs):
     """
     Find the frequency offset by searching in the spectrum of the signal
     raised to 4. Doing so eliminates the modulation for QPSK but the method also
@@ -104,12 +104,20 @@ def find_freq_offset(sig, average_over_modes = False, fft_size = 4096):
         fft_size: array
             Size of FFT used to estimate. Should be power of 2, otherwise the
             next higher power of 2 will be used.
+        method : string, optional
+            "fft" to use a single FFT of the start of the signal or "welch" to average
+            the spectrum over the whole signal and interpolate the peak
+        **kwargs    :
+            keyword arguments to be passed to the core function
 
     Returns
     -------
         freq_offset : int
             found frequency offset
     """
+    if method == "welch":
+        return core.phaserecovery.find_freq_offset_welch(sig, sig.os, average_over_modes=average_over_modes,
+                                                         fft_size=fft_size, **kwargs)
     return core.phaserecovery.find_freq_offset(sig, sig.os, average_over_modes=average_over_modes,
                                                fft_size=fft_size)
 
@@ -133,7 +141,7 @@ def comp_freq_offset(sig, freq_offset):
     arr = core.phaserecovery.comp_freq_offset(sig, freq_offset, sig.os)
     return sig.recreate_from_np_array(arr)
 
-def viterbiviterbi(E, N):
+def viterbiviterbi(E, N, **kwargs):
     """
     Viterbi-Viterbi blind phase recovery for an M-PSK signal
 
@@ -143,11 +151,63 @@ def viterbiviterbi(E, N):
         the electric field of the signal
     N : int
         block length of samples to average over
+    **kwargs    :
+        keyword arguments to be passed to the core function
 
     Returns
     -------
     Eout : array_like
         Field with compensated phases
+    ph : array_like
+        phase estimate for every mode
     """
-    return core.phaserecovery.viterbiviterbi(E, N, E.M)
+    return core.phaserecovery.viterbiviterbi(E, N, E.M, **kwargs)
 
+
+def phase_partition_qam(E, Nblock):
+    """
+    Blind phase recovery for square M-QAM (up to 256-QAM) using QPSK partitioning
+
+    Parameters
+    ----------
+    E : SignalObject
+        input signal
+    Nblock : int
+        number of samples in the averaging window
+
+    Returns
+    -------
+    Eout : SignalObject
+        phase compensated field
+    ph : array_like
+        phase estimate for every mode
+    """
+    Eout, ph = core.phaserecovery.phase_partition_qam(E, Nblock, E.M)
+    return E.recreate_from_np_array(Eout), ph
+
+def pll(E, kp=0.05, ki=5e-4, **kwargs):
+    """
+    Decision-directed second-order PLL carrier recovery, which can process a signal in chunks
+
+    Parameters
+    ----------
+    E : SignalObject
+        input signal
+    kp : float, optional
+        proportional gain of the loop filter
+    ki : float, optional
+        integral gain of the loop filter
+    **kwargs    :
+        keyword arguments to be passed to the core function (state, coarse)
+
+    Returns
+    -------
+    Eout : SignalObject
+        phase compensated field
+    ph : array_like
+        phase estimate for every mode
+    state : array_like
+        loop state to pass with the next chunk
+    """
+    Eout, ph, state = core.phaserecovery.pll(E, E.coded_symbols, kp=kp, ki=ki, **kwargs)
+    return E.recreate_from_np_array(Eout), ph, state
@@ -21,6 +21,7 @@ import numpy as np
 import abc
 import fractions
 import warnings
+import hashlib
 from bitarray import bitarray
 
 from qampy import helpers
@@ -28,10 +29,62 @@ from qampy.core import resample
 from qampy import theory
 from qampy.core import ber_functions
 from qampy.core.prbs import make_prbs_extXOR
-from qampy.core.signal_quality import make_decision, generate_bitmapping_mtx, estimate_snr, soft_l_value_demapper_minmax, soft_l_value_demapper
+from qampy.core.signal_quality import make_decision, generate_bitmapping_mtx, estimate_snr, soft_l_value_demapper_minmax, soft_l_value_demapper, \
+    cal_gmi_idx, symbol_index_dtype, hamming_distance_table, cal_ber_idx, cal_evm, count_bit_errors
 from qampy.core.io import save_signal
 
 
+def _encoding_luts(encoding):
+    """
+    Generate lookup tables from a symbol to bitarray encoding dictionary.
+
+    Parameters
+    ----------
+    encoding : dict
+        mapping between symbols and bits
+
+    Returns
+    -------
+    symbols : array_like
+        symbol alphabet
+    words : array_like
+        integer value of the bit word (MSB first) of every symbol
+    nbits : int
+        number of bits per symbol
+    """
+    symbols = np.array(list(encoding.keys()))
+    words = np.array([int(b.to01(), 2) for b in encoding.values()])
+    nbits = len(next(iter(encoding.values())))
+    return symbols, words, nbits
+
+def _bits_to_words(bits):
+    """
+    Convert an array of bit words (last dimension, MSB first) to their integer values using np.packbits.
+    """
+    nbits = bits.shape[-1]
+    nbytes = -(-nbits//8)
+    padded = np.zeros(bits.shape[:-1] + (8*nbytes,), dtype=np.bool_)
+    padded[..., 8*nbytes-nbits:] = bits
+    packed = np.packbits(padded, axis=-1)
+    if nbytes == 1:
+        return packed[..., 0]
+    words = np.zeros(bits.shape[:-1], dtype=np.uint32)
+    for k in range(nbytes):
+        words = (words << 8) | packed[..., k]
+    return words
+
+def _words_to_bits(words, nbits):
+    """
+    Convert an array of integer values to bit words (additional last dimension, MSB first) using np.unpackbits.
+    """
+    nbytes = -(-nbits//8)
+    words = np.asarray(words)
+    if nbytes == 1:
+        packed = words.astype(np.uint8)[..., np.newaxis]
+    else:
+        packed = np.stack([(words >> 8*(nbytes-1-k)) & 0xff for k in range(nbytes)], axis=-1).astype(np.uint8)
+    return np.unpackbits(packed, axis=-1)[..., 8*nbytes-nbits:].view(np.bool_)
+
 
 class RandomBits(np.ndarray):
     """
@@ -129,6 +182,10 @@ class SignalBase(np.ndarray):
     _inheritbase_ = ["_fs", "_fb", "_M"]
     _inheritattr_ = []  # list of attributes names that should be inherited
     __array_priority__ = 1
+    _sync_window_ = 2**12 # length of the correlation window for the synchronisation of long signals
+    _sync_key_samples_ = 2**12 # number of samples per mode hashed for the synchronisation cache key
+    _sync_prefix_len_ = 2**16 # number of symbols used for the synchronisation with early terminated error counting
+    _prbs_sync_len_ = 2**10 # number of symbols used for the synchronisation by PRBS state recovery
 
     def __reduce__(self):
         pickle_obj = super().__reduce__()
@@ -182,6 +239,10 @@ class SignalBase(np.ndarray):
                 self._symbols = obj
             else:
                 self._symbols = obj._symbols
+        # cache of the symbol indices, only valid as long as _symbols is the same object
+        self._symidx = getattr(obj, "_symidx", None)
+        # cache of synchronisation parameters, shared between derived signals
+        self._synccache = getattr(obj, "_synccache", None)
 
     def _signal_present(self, signal):
         if signal is None:
@@ -240,6 +301,199 @@ class SignalBase(np.ndarray):
             rx_out.append(r_tmp)
         return np.array(tx_out), np.array(rx_out)
 
+    def _rotation_permutations(self):
+        """
+        Index permutations of the symbol alphabet for rotations by 1.j**k for k=0..3
+        """
+        syms = self.coded_symbols
+        return np.array([make_decision(syms * 1.j**k, syms, return_indices=True) for k in range(4)])
+
+    def _sync_key(self, signal_rx):
+        """
+        Key identifying a received signal in the synchronisation cache. The key contains the buffer address, shape,
+        strides and dtype of the signal and a hash of _sync_key_samples_ evenly spaced samples per mode, so that
+        in-place modifications of the signal do not return stale synchronisation parameters, while the key costs
+        the same for any signal length. Modifications touching only unsampled elements are not detected, set
+        _synccache to None to force resynchronisation in that case.
+        """
+        rx = np.asarray(signal_rx)
+        step = max(1, rx.shape[-1]//self._sync_key_samples_)
+        sample = np.ascontiguousarray(rx[..., ::step])
+        return (rx.__array_interface__['data'][0], rx.shape, rx.strides, rx.dtype.str,
+                hashlib.sha1(sample).digest())
+
+    def _find_sync_params(self, tx, rx, sync_key=None):
+        """
+        Find the synchronisation parameters between the transmitted symbol indices and received data. For every
+        received mode this returns the index of the matching transmitted mode, the offset and the power k of the
+        rotation 1.j**k. If a sync_key is given the parameters are cached on the signal, so that subsequent metric
+        calculations on the same received signal do not need to resynchronise. Only pass a sync_key if tx are the
+        symbol indices of this signal.
+        """
+        cache = self._synccache
+        if sync_key is not None and cache is not None:
+            entry = cache.get(sync_key)
+            if entry is not None and entry[0] is self._symbols:
+                return entry[1]
+        syms = self.coded_symbols
+        rx_is_idx = np.issubdtype(rx.dtype, np.integer)
+        Nw = self._sync_window_
+        lanes = self._prbs_lanes()
+        params = []
+        idxx = list(range(rx.shape[0]))
+        for j in range(rx.shape[0]):
+            acm = -100.
+            par = None
+            # for PRBS data try to recover the shift register state first
+            if lanes is not None:
+                par = self._find_prbs_sync_params(tx, rx[j], idxx, lanes)
+            if par is not None:
+                idxx.remove(par[0])
+                params.append(par)
+                continue
+            rxc = syms[rx[j]] if rx_is_idx else rx[j]
+            # first try the windowed search, only if no mode can be verified use the full correlation
+            if Nw is not None and Nw < min(rxc.shape[0], tx.shape[1])//2:
+                for i in idxx:
+                    offset, ii, act = ber_functions.find_sequence_offset_window(rxc, syms[tx[i]], Nw)
+                    if offset is not None and act > acm:
+                        acm = act
+                        par = (i, offset, ii)
+            if par is None:
+                for i in idxx:
+                    offset, ii, act = ber_functions.find_sync_params(syms[tx[i]], rxc)
+                    if act > acm:
+                        acm = act
+                        par = (i, offset, ii)
+            idxx.remove(par[0])
+            params.append(par)
+        if sync_key is not None:
+            if cache is None:
+                cache = {}
+                self._synccache = cache
+            cache[sync_key] = (self._symbols, params)
+            while len(cache) > 8:
+                del cache[next(iter(cache))]
+        return params
+
+    def _find_sync_params_lookup(self, tx, rx):
+        """
+        Find the synchronisation parameters (see _find_sync_params) by looking up the symbol decisions of the
+        received data in the transmitted symbol indices (see ber_functions.find_index_offset), which avoids the
+        correlation over the full length of the transmitted data. Falls back to _find_sync_params if a mode can not
+        be synchronised this way.
+        """
+        rot = self._rotation_permutations()
+        Ntx = tx.shape[1]
+        params = []
+        idxx = list(range(rx.shape[0]))
+        for j in range(rx.shape[0]):
+            idx_rx = make_decision(np.ascontiguousarray(rx[j]), self.coded_symbols, return_indices=True)
+            # undo the rotation rx = tx*1.j**ii for all rotations
+            rxr = np.array([rot[(4 - ii) % 4][idx_rx] for ii in range(4)])
+            par = None
+            for i in idxx:
+                try:
+                    ii, d = ber_functions.find_index_offset(tx[i], rxr, self.M)
+                except ber_functions.DataSyncError:
+                    continue
+                par = (i, -d % Ntx, ii)
+                break
+            if par is None:
+                return self._find_sync_params(tx, rx)
+            idxx.remove(par[0])
+            params.append(par)
+        return params
+
+    def _prbs_lanes(self):
+        """
+        Description of the PRBS patterns in the transmitted bits, used for synchronisation by PRBS state recovery.
+        Returns None if the bits are not generated from a PRBS, otherwise a list with an entry for every mode
+        containing a list of (order, start, stride) tuples, where bits[start::stride] is a PRBS of the given order
+        generated by an external XOR shift register.
+        """
+        return None
+
+    def _find_prbs_sync_params(self, tx, rx, candidates, lanes):
+        """
+        Find the synchronisation parameters (see _find_sync_params) of a received mode rx (complex samples or symbol
+        indices) by recovering the PRBS state of the transmitted bits from the first _prbs_sync_len_ symbols. Returns
+        None if no candidate transmitted mode and rotation can be decoded and verified.
+        """
+        rot = self._rotation_permutations()
+        bit_table = self._bit_table
+        nbits = bit_table.shape[1]
+        Ntx = tx.shape[1]
+        rx_is_idx = np.issubdtype(rx.dtype, np.integer)
+        rxh = rx[:self._prbs_sync_len_]
+        if not rx_is_idx:
+            rxh = make_decision(np.ascontiguousarray(rxh), self.coded_symbols, return_indices=True)
+        n = np.arange(rxh.shape[0])
+        tx_positions = {}
+        for ii in range(4):
+            # undo the rotation rx = tx*1.j**ii
+            rxi = rot[(4 - ii) % 4][rxh]
+            bits_rx = bit_table[rxi].reshape(-1)
+            for i in candidates:
+                # the longest pattern gives the least ambiguous offset
+                order, start, stride = max(lanes[i])
+                if order > 23 or tx_positions.get(i, 0) is None:
+                    continue
+                bits_tx = self.bits[i][start::stride]
+                if i not in tx_positions:
+                    try:
+                        tx_positions[i] = ber_functions.prbs_tx_positions(bits_tx, order)
+                    except ber_functions.DataSyncError:
+                        tx_positions[i] = None
+                        continue
+                try:
+                    o = ber_functions.find_prbs_offset(bits_tx, bits_rx[start::stride], order,
+                                                       tx_positions=tx_positions[i])
+                except ber_functions.DataSyncError:
+                    continue
+                # the pattern can repeat inside the transmitted data, so the offset is only known modulo the period
+                period = 2**order - 1
+                Nlane = Ntx*nbits//stride
+                offsets = []
+                for oo in range(o % period - period*(Nlane//period + 1), Nlane, period):
+                    if (oo*stride) % nbits != 0:
+                        continue
+                    D = oo*stride//nbits
+                    # verify on the symbols, a wrong alignment has a symbol error rate close to 1
+                    if np.count_nonzero(tx[i][(n + D) % Ntx] != rxi) < rxh.shape[0]//4:
+                        offsets.append(D % Ntx)
+                offsets = list(set(offsets))
+                if len(offsets) > 1:
+                    # resolve the ambiguity on the full received mode
+                    rxf = rx if rx_is_idx else make_decision(np.ascontiguousarray(rx), self.coded_symbols,
+                                                             return_indices=True)
+                    rxf = rot[(4 - ii) % 4][rxf]
+                    nf = np.arange(rxf.shape[0])
+                    nerr = [np.count_nonzero(tx[i][(nf + D) % Ntx] != rxf) for D in offsets]
+                    offsets = [offsets[np.argmin(nerr)]]
+                if offsets:
+                    return i, -offsets[0] % Ntx, ii
+        return None
+
+    def _sync_and_adjust_idx(self, tx, rx, synced=False, sync_key=None):
+        """
+        Synchronize and adjust the length of transmitted symbol indices and received data, where the received data
+        can either be a complex signal or symbol indices. The correlation for the synchronization is calculated on the
+        complex symbol values, while the shifting and rotation is done on the indices. See _find_sync_params for
+        the sync_key.
+        """
+        if synced:
+            return self._adjust_only(tx, rx)
+        params = self._find_sync_params(tx, rx, sync_key)
+        rot = self._rotation_permutations()
+        tx_out = []
+        rx_out = []
+        for j, (i, offset, ii) in enumerate(params):
+            t, r = ber_functions.apply_sync(rot[ii][tx[i]], rx[j], offset)
+            tx_out.append(t)
+            rx_out.append(r)
+        return np.array(tx_out), np.array(rx_out)
+
     def _adjust_only(self, tx, rx, which="tx"):
         if tx.shape == rx.shape:
             return tx, rx
@@ -265,7 +519,7 @@ class SignalBase(np.ndarray):
         return np.array(tx_out), np.array(rx_out)
 
 
-    def cal_ser(self, signal_rx=None, synced=False, verbose=False):
+    def cal_ser(self, signal_rx=None, synced=False, verbose=False, target_errors=None, ci_width=None, confidence=0.95):
         """
         Calculate the symbol error rate of the received signal.Currently does not check
         for correct polarization.
@@ -282,6 +536,13 @@ class SignalBase(np.ndarray):
             whether signal_tx and symbol_tx are synchronised.
         verbose   : bool, optional
             return the vector of symbol errors
+        target_errors : int, optional
+            process the signal in growing chunks and stop once this number of symbol errors is counted
+        ci_width : float, optional
+            process the signal in growing chunks and stop once the confidence interval of the SER relative to the
+            SER is at most this wide
+        confidence : float, optional
+            confidence level of the interval returned with target_errors or ci_width
         Note
         ----
         If neither symbols_tx or bits_tx are given use self.symbols_tx
@@ -295,19 +556,28 @@ class SignalBase(np.ndarray):
             symbol errors
         symbols_tx : array_like
             synchronized transmitted symbols
+        if target_errors or ci_width are given instead return:
+        interval : array_like
+            lower and upper bound of the confidence interval of the SER per dimension
         """
         signal_rx = self._signal_present(signal_rx)
+        if target_errors is not None or ci_width is not None:
+            if verbose:
+                raise ValueError("verbose output is not supported with target_errors or ci_width")
+            return self._cal_error_rate_chunked(signal_rx, synced, False, target_errors, ci_width, confidence)
         nmodes = signal_rx.shape[0]
-        data_demod = self.make_decision(signal_rx)
-        symbols_tx, data_demod = self._sync_and_adjust(self.symbols, data_demod, synced)
-        #errs = np.count_nonzero(data_demod - symbols_tx, axis=-1)
-        errs = data_demod - symbols_tx
+        sync_key = None if synced else self._sync_key(signal_rx)
+        idx_demod = self.make_decision(signal_rx, return_indices=True)
+        idx_tx, idx_demod = self._sync_and_adjust_idx(self.symbol_indices, idx_demod, synced, sync_key)
+        ser = np.count_nonzero(idx_demod != idx_tx, axis=-1) / idx_demod.shape[1]
         if verbose:
-            return np.count_nonzero(errs, axis=-1) / data_demod.shape[1], errs, symbols_tx
+            symbols_tx = self.coded_symbols[idx_tx]
+            errs = self.coded_symbols[idx_demod] - symbols_tx
+            return ser, errs, symbols_tx
         else:
-            return np.count_nonzero(errs, axis=-1) / data_demod.shape[1]
+            return ser
 
-    def cal_ber(self, signal_rx=None, synced=False, verbose=False):
+    def cal_ber(self, signal_rx=None, synced=False, verbose=False, target_errors=None, ci_width=None, confidence=0.95):
         """
         Calculate the bit-error-rate for the received signal compared to transmitted symbols or bits. Currently does not check
         for correct polarization.
@@ -324,6 +594,13 @@ class SignalBase(np.ndarray):
             whether signal_tx and symbol_tx are synchronised.
         verbose   : bool, optional
             return the vector of symbol errors
+        target_errors : int, optional
+            process the signal in growing chunks and stop once this number of bit errors is counted
+        ci_width : float, optional
+            process the signal in growing chunks and stop once the confidence interval of the BER relative to the
+            BER is at most this wide
+        confidence : float, optional
+            confidence level of the interval returned with target_errors or ci_width
 
         Note
         ----
@@ -339,18 +616,59 @@ class SignalBase(np.ndarray):
             bit errors
         tx_synced : array_like
             synchronized transmitter bits
+        if target_errors or ci_width are given instead return:
+        interval : array_like
+            lower and upper bound of the confidence interval of the BER per dimension
         """
         signal_rx = self._signal_present(signal_rx)
+        if target_errors is not None or ci_width is not None:
+            if verbose:
+                raise ValueError("verbose output is not supported with target_errors or ci_width")
+            return self._cal_error_rate_chunked(signal_rx, synced, True, target_errors, ci_width, confidence)
         nmodes = signal_rx.shape[0]
-        syms_demod = self.make_decision(signal_rx)
-        symbols_tx, syms_demod = self._sync_and_adjust(self.symbols, syms_demod, synced)
-        bits_demod = self.demodulate(syms_demod)
-        tx_synced = self.demodulate(symbols_tx)
+        sync_key = None if synced else self._sync_key(signal_rx)
+        idx_demod = self.make_decision(signal_rx, return_indices=True)
+        idx_tx, idx_demod = self._sync_and_adjust_idx(self.symbol_indices, idx_demod, synced, sync_key)
+        if not verbose:
+            return cal_ber_idx(idx_tx, idx_demod, self._hamming_table)
+        bits_demod = self.demodulate(idx_demod)
+        tx_synced = self.demodulate(idx_tx)
         errs = tx_synced ^ bits_demod
-        if verbose:
-            return np.count_nonzero(errs, axis=-1) / bits_demod.shape[1], errs, tx_synced
+        return np.count_nonzero(errs, axis=-1) / bits_demod.shape[1], errs, tx_synced
+
+    def _cal_error_rate_chunked(self, signal_rx, synced, bits, target_errors, ci_width, confidence):
+        """
+        Symbol or bit error rate with early termination (see ber_functions.count_errors_chunked). The
+        synchronisation parameters are found on the first _sync_prefix_len_ symbols only and the offset and rotation
+        are applied to the transmitted symbol indices of every processed chunk, so that the cost scales with the
+        number of processed symbols and not with the signal length.
+        """
+        rx = np.asarray(signal_rx)
+        tx = self.symbol_indices
+        nmodes, N = rx.shape
+        Ntx = tx.shape[1]
+        rot = self._rotation_permutations()
+        if synced:
+            params = [(i, 0, 0) for i in range(nmodes)]
         else:
-            return np.count_nonzero(errs, axis=-1) / bits_demod.shape[1]
+            params = self._find_sync_params_lookup(tx, rx[:, :self._sync_prefix_len_])
+        rate = np.zeros(nmodes, dtype=np.float64)
+        interval = np.zeros((nmodes, 2), dtype=np.float64)
+        for j, (i, offset, ii) in enumerate(params):
+            def count_errors(start, stop):
+                # the synchronised transmitted sequence is the periodically extended tx rolled by the offset
+                idx_tx = rot[ii][tx[i, (np.arange(start, stop) - offset) % Ntx]]
+                idx_rx = make_decision(np.ascontiguousarray(rx[j, start:stop]), self.coded_symbols,
+                                       return_indices=True).astype(idx_tx.dtype, copy=False)
+                if bits:
+                    return count_bit_errors(idx_tx, idx_rx, self._hamming_table)
+                return np.count_nonzero(idx_rx != idx_tx)
+            nerr, ntrials = ber_functions.count_errors_chunked(count_errors, N, target_errors=target_errors,
+                                                               ci_width=ci_width, confidence=confidence,
+                                                               trials_per_item=self.Nbits if bits else 1)
+            rate[j] = nerr/ntrials
+            interval[j] = ber_functions.error_rate_interval(nerr, ntrials, confidence)
+        return rate, interval
 
     def cal_evm(self, signal_rx=None, synced=False, blind=False):
         """
@@ -386,8 +704,12 @@ class SignalBase(np.ndarray):
         of EVM, e.g. on wikipedia.
         """
         signal_rx = self._signal_present(signal_rx)
+        if blind:
+            return np.atleast_1d(cal_evm(np.asarray(signal_rx), self.M))
         nmodes = signal_rx.shape[0]
-        symbols_tx, signal_rx = self._sync_and_adjust(self.symbols, signal_rx, synced)
+        sync_key = None if synced else self._sync_key(signal_rx)
+        idx_tx, signal_rx = self._sync_and_adjust_idx(self.symbol_indices, signal_rx, synced, sync_key)
+        symbols_tx = self.coded_symbols[idx_tx]
         return np.asarray(
             np.sqrt(np.mean(helpers.cabssquared(symbols_tx - signal_rx), axis=-1)))  # /np.mean(abs(self.symbols)**2))
 
@@ -412,21 +734,39 @@ class SignalBase(np.ndarray):
             snr estimate per dimension
         """
         signal_rx = self._signal_present(signal_rx)
-        nmodes = signal_rx.shape[0]
         if symbols_tx is None:
-            symbols_tx = self.symbols
-        symbols_tx, signal_rx = self._sync_and_adjust(symbols_tx, signal_rx, synced)
-        snr = np.zeros(nmodes, dtype=np.float64)
-        if verbose:
-            s0 = np.zeros(nmodes, dtype=np.float64)
-            n0 = np.zeros(nmodes, dtype=np.float64)
-            for i in range(nmodes):
-                snr[i], s0[i], n0[i] = estimate_snr(signal_rx[i], symbols_tx[i], self.coded_symbols, verbose=verbose)
-            return snr, s0, n0
+            sync_key = None if synced else self._sync_key(signal_rx)
+            symbols_tx, signal_rx = self._sync_and_adjust_idx(self.symbol_indices, signal_rx, synced, sync_key)
         else:
-            for i in range(nmodes):
-                snr[i] = estimate_snr(signal_rx[i], symbols_tx[i], self.coded_symbols, verbose=verbose)
-            return snr
+            symbols_tx, signal_rx = self._sync_and_adjust(symbols_tx, signal_rx, synced)
+        return estimate_snr(np.asarray(signal_rx), symbols_tx, self.coded_symbols, verbose=verbose)
+
+    def cal_confusion_matrix(self, signal_rx=None, synced=False):
+        """
+        Count how often each transmitted symbol is detected as each of the symbols of the alphabet.
+
+        Parameters
+        ----------
+        signal_rx : array_like
+            received signal
+        synced : bool, optional
+            whether signal_rx and the transmitted symbols are synchronised
+
+        Returns
+        -------
+        counts : array_like
+            array of shape (nmodes, M, M), where counts[k, i, j] is the number of times symbol coded_symbols[i]
+            was transmitted and coded_symbols[j] detected in mode k
+        """
+        signal_rx = self._signal_present(signal_rx)
+        M = self.coded_symbols.shape[0]
+        sync_key = None if synced else self._sync_key(signal_rx)
+        idx_demod = self.make_decision(signal_rx, return_indices=True)
+        idx_tx, idx_demod = self._sync_and_adjust_idx(self.symbol_indices, idx_demod, synced, sync_key)
+        counts = np.zeros((idx_tx.shape[0], M, M), dtype=np.int64)
+        for i in range(idx_tx.shape[0]):
+            counts[i] = np.bincount(idx_tx[i].astype(np.intp)*M + idx_demod[i], minlength=M*M).reshape(M, M)
+        return counts
 
     def cal_gmi(self, signal_rx=None, synced=False, llr_minmax=False):
         """
@@ -451,25 +791,12 @@ class SignalBase(np.ndarray):
             generalized mutual information per transmitted bit per mode
         """
         signal_rx = self._signal_present(signal_rx)
-        symbols_tx = self.symbols
-        nmodes = signal_rx.shape[0]
-        GMI = np.zeros(nmodes, dtype=np.float64)
-        GMI_per_bit = np.zeros((nmodes, self.Nbits), dtype=np.float64)
-        tx, rx = self._sync_and_adjust(symbols_tx, signal_rx, synced)
-        snr = self.est_snr(rx, synced=True, symbols_tx=tx)
-        bits = self.demodulate(self.make_decision(tx)).astype(np.int)
-        # For every mode present, calculate GMI based on SD-demapping
-        for mode in range(nmodes):
-            if llr_minmax:
-                l_values = soft_l_value_demapper_minmax(rx[mode], self.M, snr[mode], self._bitmap_mtx)
-            else:
-                l_values = soft_l_value_demapper(rx[mode], self.M, snr[mode], self._bitmap_mtx)
-            # GMI per bit
-            for bit in range(self.Nbits):
-                GMI_per_bit[mode, bit] = 1 - np.mean(
-                    np.log2(1 + np.exp(((-1) ** bits[mode, bit::self.Nbits]) * l_values[bit::self.Nbits])))
-            GMI[mode] = np.sum(GMI_per_bit[mode])
-        return GMI, GMI_per_bit
+        sync_key = None if synced else self._sync_key(signal_rx)
+        tx, rx = self._sync_and_adjust_idx(self.symbol_indices, signal_rx, synced, sync_key)
+        rx = np.asarray(rx)
+        snr = estimate_snr(rx, tx, self.coded_symbols)
+        # demapping and the GMI of all modes in one pass, square QAM is demapped on the in-phase and quadrature PAM
+        return cal_gmi_idx(rx, tx, snr, self.coded_symbols, self._bit_table, maxlog=llr_minmax)
 
     def normalize_and_center(self, symbol_based=False, synced=False):
         """
@@ -602,7 +929,8 @@ class SignalQAMGrayCoded(SignalBase):
     @staticmethod
     def _demodulate(symbols, encoding):
         """
-        Decode array of input symbols to bits according to the coding of the modulator.
+        Decode array of input symbols to bits according to the coding of the modulator. Symbols are
+        decided onto the alphabet and translated to bits using lookup tables.
 
         Parameters
         ----------
@@ -615,6 +943,35 @@ class SignalQAMGrayCoded(SignalBase):
         ----
         Unlike the other functions this function does not always return a 2D array.
 
+        Returns
+        -------
+        outbits   : array_like
+            array of booleans representing bits with same number of dimensions as symbols
+        """
+        syms, words, nbits = _encoding_luts(encoding)
+        syms = syms.astype(symbols.dtype)
+        if symbols.ndim == 1:
+            idx = make_decision(np.ascontiguousarray(symbols), syms, return_indices=True)
+        else:
+            idx = np.zeros(symbols.shape, dtype=symbol_index_dtype(syms.shape[0]))
+            for i in range(symbols.shape[0]):
+                idx[i] = make_decision(np.ascontiguousarray(symbols[i]), syms, return_indices=True)
+        bits = _words_to_bits(words[idx], nbits)
+        return bits.reshape(bits.shape[:-2] + (-1,))
+
+    @staticmethod
+    def _demodulate_bitarray(symbols, encoding):
+        """
+        Decode array of input symbols to bits according to the coding of the modulator, using bitarray decoding.
+        The symbols need to be exactly the symbols of the encoding.
+
+        Parameters
+        ----------
+        symbols   : array_like
+            array of complex input symbols
+        encoding  : array_like
+            mapping between symbols and bits
+
         Returns
         -------
         outbits   : array_like
@@ -634,7 +991,31 @@ class SignalQAMGrayCoded(SignalBase):
     @staticmethod
     def _modulate(data, encoding, M, dtype=np.complex128):
         """
-        Modulate a bit sequence into QAM symbols
+        Modulate a bit sequence into QAM symbols. The bits are packed into integer words which
+        are translated to symbols using a lookup table.
+
+        Parameters
+        ----------
+        data     : array_like
+           1D array of bits represented as bools. If the len(data)%self.M != 0 then we only encode up to the nearest divisor
+
+        Returns
+        -------
+        outdata  : array_like
+            1D array of complex symbol values. Normalised to energy of 1
+        """
+        data = np.atleast_2d(data)
+        nmodes = data.shape[0]
+        syms, words, bitspsym = _encoding_luts(encoding)
+        Nsym = data.shape[1] // bitspsym
+        lut = np.zeros(2**bitspsym, dtype=dtype)
+        lut[words] = syms
+        return lut[_bits_to_words(np.asarray(data[:, :Nsym*bitspsym]).reshape(nmodes, Nsym, bitspsym))]
+
+    @staticmethod
+    def _modulate_bitarray(data, encoding, M, dtype=np.complex128):
+        """
+        Modulate a bit sequence into QAM symbols, using bitarray decoding
 
         Parameters
         ----------
@@ -767,7 +1148,7 @@ class SignalQAMGrayCoded(SignalBase):
         bitmap_mtx = generate_bitmapping_mtx(coded_symbols, cls._demodulate(coded_symbols, encoding), M, dtype=dtype)
         return coded_symbols, _graycode, encoding, bitmap_mtx
 
-    def make_decision(self, signal=None):
+    def make_decision(self, signal=None, return_indices=False):
         """
         Make symbol decisions based on the input field. Decision is made based on difference from constellation points
 
@@ -775,13 +1156,20 @@ class SignalQAMGrayCoded(SignalBase):
         ----------
         signal   : array_like
             2D array of the input signal
+        return_indices : bool, optional
+            return the indices of the detected symbols in coded_symbols instead of the symbols
 
         Returns
         -------
         symbols  : array_like
-            2d array of the detected symbols
+            2d array of the detected symbols or symbol indices (np.uint8 for M <= 256, np.uint16 otherwise)
         """
         signal = self._signal_present(signal)
+        if return_indices:
+            outidx = np.zeros(signal.shape, dtype=symbol_index_dtype(self.coded_symbols.shape[0]))
+            for i in range(signal.shape[0]):
+                outidx[i] = make_decision(signal[i], self.coded_symbols, return_indices=True)
+            return outidx
         outsyms = np.zeros_like(signal)
         for i in range(signal.shape[0]):
             outsyms[i] = make_decision(signal[i], self.coded_symbols)
@@ -791,6 +1179,17 @@ class SignalQAMGrayCoded(SignalBase):
     def symbols(self):
         return self._symbols
 
+    @property
+    def symbol_indices(self):
+        """
+        The transmitted symbols as indices into coded_symbols (np.uint8 for M <= 256, np.uint16 otherwise)
+        """
+        symidx = getattr(self, "_symidx", None)
+        if symidx is None or symidx[0] is not self._symbols:
+            symidx = (self._symbols, self.make_decision(self._symbols, return_indices=True))
+            self._symidx = symidx
+        return symidx[1]
+
     @property
     def coded_symbols(self):
         return self._coded_symbols
@@ -829,7 +1228,7 @@ class SignalQAMGrayCoded(SignalBase):
         Parameters
         ----------
         symbols   : array_like
-            array of complex input symbols
+            array of complex input symbols or of integer indices into coded_symbols
 
         Note
         ----
@@ -841,8 +1240,39 @@ class SignalQAMGrayCoded(SignalBase):
              for i in range(signal.shape[0]):
             outsyms[i] = make_decision(utils.normalise_and_center(signal[i]), self.coded_symbols)       array of booleans representing bits with same number of dimensions as symbols
         """
+        if np.issubdtype(symbols.dtype, np.integer):
+            bits = self._bit_table[symbols]
+            return bits.reshape(bits.shape[:-2] + (-1,))
         return self._demodulate(symbols, self._encoding)
 
+    @property
+    def _bit_table(self):
+        """
+        Bits of each symbol in coded_symbols as (M, Nbits) boolean array
+        """
+        bt = getattr(self, "_bittable", None)
+        if bt is None:
+            bt = self._demodulate(self.coded_symbols, self._encoding).reshape(-1, self.Nbits)
+            self._bittable = bt
+        return bt
+
+    @property
+    def _hamming_table(self):
+        """
+        Hamming distances between the bits of all symbols in coded_symbols as (M, M) uint8 array
+        """
+        ht = getattr(self, "_hammingtable", None)
+        if ht is None:
+            ht = hamming_distance_table(self._bit_table)
+            self._hammingtable = ht
+        return ht
+
+    def _prbs_lanes(self):
+        bits = getattr(self, "_bits", None)
+        if not isinstance(bits, PRBSBits) or bits._order is None:
+            return None
+        return [[(bits._order[i], 0, 1)] for i in range(bits.shape[0])]
+
 class QPSKfromBERT(SignalQAMGrayCoded):
     """
     QPSKfromBERT(N, nmodes=1, fb=1, prbsorders=((15,),(15,)), prbsshifts=(0,0), prbsinvert=(False, False), dtype=np.complex128)
@@ -867,6 +1297,8 @@ class QPSKfromBERT(SignalQAMGrayCoded):
     dtype : np.dtype, optional
             dtype of the signal, must be one of np.complex128 or np.complex64
     """
+    _inheritattr_ = SignalQAMGrayCoded._inheritattr_ + ["_prbsorders"]
+
     def __new__(cls, N, nmodes=1, fb=1, prbsorders=((15,),(15,)), prbsshifts=(0,0), prbsinvert=(False, False), dtype=np.complex128):
         assert dtype in [np.complex128, np.complex64], "only np.complex128 and np.complex64  or None dtypes are supported"
         M = 4
@@ -895,8 +1327,15 @@ class QPSKfromBERT(SignalQAMGrayCoded):
         obj._code = _graycode
         obj._bits = bits
         obj._symbols = obj.copy()
+        obj._prbsorders = (bitsI._order, bitsQ._order)
         return obj
 
+    def _prbs_lanes(self):
+        orders = getattr(self, "_prbsorders", None)
+        if orders is None:
+            return None
+        return [[(orders[0][i], 0, 2), (orders[1][i], 1, 2)] for i in range(self.shape[0])]
+
 class SymbolOnlySignal(SignalQAMGrayCoded):
     """
     SymbolOnlySignal(M, N, symbols nmodes=1, fb=1, dtype=np.complex128)
@@ -953,7 +1392,7 @@ class SymbolOnlySignal(SignalQAMGrayCoded):
         obj._symbols = obj.copy()
         return obj
 
-    def make_decision(self, signal=None):
+    def make_decision(self, signal=None, return_indices=False):
         """
         Make symbol decisions based on the input field. Decision is made based on difference from constellation points
 
@@ -961,13 +1400,20 @@ class SymbolOnlySignal(SignalQAMGrayCoded):
         ----------
         signal   : array_like
             2D array of the input signal
+        return_indices : bool, optional
+            return the indices of the detected symbols in coded_symbols instead of the symbols
 
         Returns
         -------
         symbols  : array_like
-            2d array of the detected symbols
+            2d array of the detected symbols or symbol indices (np.uint8 for M <= 256, np.uint16 otherwise)
         """
         signal = self._signal_present(signal)
+        if return_indices:
+            outidx = np.zeros(signal.shape, dtype=symbol_index_dtype(self.coded_symbols.shape[0]))
+            for i in range(signal.shape[0]):
+                outidx[i] = make_decision(signal[i], self.coded_symbols, return_indices=True)
+            return outidx
         outsyms = np.zeros_like(signal)
         for i in range(signal.shape[0]):
             outsyms[i] = make_decision(signal[i], self.coded_symbols)
@@ -1529,7 +1975,8 @@ class SignalWithPilots(SignalBase):
     def __getattr__(self, attr):
         return getattr(self._symbols, attr)
 
-    def cal_ser(self, signal_rx=None, shift_factors=None, verbose=False):
+    def cal_ser(self, signal_rx=None, shift_factors=None, verbose=False, target_errors=None, ci_width=None,
+                confidence=0.95):
         """
         Calculate Symbol Error Rate on the data payload.
 
@@ -1541,6 +1988,12 @@ class SignalWithPilots(SignalBase):
             integer shift factors to align frame. Default: None -> do not perform shifting (assume frame is aligned)
         verbose   : bool, optional
             return the vector of symbol errors
+        target_errors : int, optional
+            stop once this number of errors is counted (see SignalBase.cal_ser)
+        ci_width : float, optional
+            stop once the relative width of the confidence interval is at most this (see SignalBase.cal_ser)
+        confidence : float, optional
+            confidence level of the interval
 
         Returns
         -------
@@ -1549,9 +2002,11 @@ class SignalWithPilots(SignalBase):
         """
         if signal_rx is None:
             signal_rx = self.get_data(shift_factors)
-        return super().cal_ser(signal_rx, synced=False, verbose=verbose)
+        return super().cal_ser(signal_rx, synced=False, verbose=verbose, target_errors=target_errors,
+                                ci_width=ci_width, confidence=confidence)
 
-    def cal_ber(self, signal_rx=None, shift_factors=None, verbose=False):
+    def cal_ber(self, signal_rx=None, shift_factors=None, verbose=False, target_errors=None, ci_width=None,
+                confidence=0.95):
         """
         Calculate Bit Error Rate on the data payload.
 
@@ -1563,6 +2018,12 @@ class SignalWithPilots(SignalBase):
             integer shift factors to align frame. Default: None -> do not perform shifting (assume frame is aligned)
         verbose   : bool, optional
             return the vector of symbol errors
+        target_errors : int, optional
+            stop once this number of errors is counted (see SignalBase.cal_ber)
+        ci_width : float, optional
+            stop once the relative width of the confidence interval is at most this (see SignalBase.cal_ber)
+        confidence : float, optional
+            confidence level of the interval
 
         Returns
         -------
@@ -1571,7 +2032,8 @@ class SignalWithPilots(SignalBase):
         """
         if signal_rx is None:
             signal_rx = self.get_data(shift_factors)
-        return super().cal_ber(signal_rx, synced=False, verbose=verbose)
+        return super().cal_ber(signal_rx, synced=False, verbose=verbose, target_errors=target_errors,
+                                ci_width=ci_width, confidence=confidence)
 
     def cal_evm(self, signal_rx=None, shift_factors=None, blind=False):
         """
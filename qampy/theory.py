@@ -17,6 +17,7 @@
 # Copyright 2018 Jochen Schröder, Mikael Mazur
 
 from __future__ import division
+import functools
 import numpy as np
 from scipy.special import erfc
 
@@ -256,10 +257,52 @@ def hybrid_qam_ber_vs_esn0(snr, pr, fr, M1, M2):
     bps2 = np.log2(M2)
     return 1/((1-fr)*bps1+fr*bps2)*((1-fr)*bps1*theory.MQAM_BERvsEsN0(snr/((1-fr)+fr*pr), M1) + fr*bps2*theory.MQAM_BERvsEsN0(pr*snr/((1-fr)+fr*pr), M2))
 
-def cal_gmi(M, snr, N=10**3):
+# SNR grid in dB of the interpolation tables of cal_gmi
+_GMI_TABLE_SNR = np.arange(-10, 40.5, 0.5)
+
+@functools.lru_cache(maxsize=None)
+def _gmi_demapping_tables(M):
+    from qampy.signals import SignalQAMGrayCoded
+    from qampy.core.signal_quality import demapping_tables
+    s = SignalQAMGrayCoded(M, 1000, nmodes=1)
+    return demapping_tables(s.coded_symbols, s._bit_table)
+
+@functools.lru_cache(maxsize=None)
+def _gmi_table(M):
+    from scipy.interpolate import CubicSpline
+    return CubicSpline(_GMI_TABLE_SNR, cal_gmi_quadrature(M, _GMI_TABLE_SNR))
+
+def cal_gmi_quadrature(M, snr, nquad=None):
+    """
+    Calculate the soft-decision GMI for a gray-coded QAM format in AWGN using Gauss-Hermite quadrature over
+    the noise. The result is deterministic and the SNRs are calculated in parallel.
+
+    Parameters
+    ----------
+    M : int
+        QAM order
+    snr : float or array_like
+        Signal-to-noise-ratio in dB where to calculate the gmi
+    nquad : int, optional
+        Number of quadrature nodes per dimension (default: 64 for square QAM where the in-phase and quadrature
+        bits are separable, 20 otherwise where a 2D quadrature is needed)
+
+    Returns
+    -------
+    GMI
+    """
+    from qampy.core.dsp_cython import gmi_quadrature
+    points, point_bits, bit_dim, separable = _gmi_demapping_tables(M)
+    if nquad is None:
+        nquad = 64 if separable else 20
+    nodes, weights = np.polynomial.hermite.hermgauss(nquad)
+    snr = np.asarray(snr, dtype=np.float64)
+    snr_lin = np.ascontiguousarray(dB2lin(snr).reshape(-1))
+    return gmi_quadrature(points, point_bits, bit_dim, separable, snr_lin, nodes, weights).reshape(np.shape(snr) or (1,))
+
+def cal_gmi(M, snr, N=10**3, method="table"):
     """
-    Calculate the soft-decision GMI for a given modulation format
-    based on a Monte-Carlo method. Assumes a gray-coded square QAM format.
+    Calculate the soft-decision GMI for a given modulation format. Assumes a gray-coded QAM format.
 
     Parameters
     ----------
@@ -268,15 +311,34 @@ def cal_gmi(M, snr, N=10**3):
     snr : float or array_like
         Signal-to-noise-ratio in dB where to calculate the gmi
     N : int, optional
-        Number of noise realisations for the Monte-Carlo simulation
+        Number of noise realisations for the Monte-Carlo simulation (only used for method "mc")
+    method : string, optional
+        "table" to interpolate a table of the GMI over SNR which is calculated with cal_gmi_quadrature on the
+        first call for every M (SNRs outside -10 to 40 dB are calculated directly), "quadrature" to use
+        cal_gmi_quadrature or "mc" for a Monte-Carlo simulation. For the cross QAM formats the 2D quadrature is
+        expensive, so "table" only builds the table if more SNRs than table entries are requested and otherwise
+        calculates them directly.
 
     Returns
     -------
     GMI
     """
+    snr = np.atleast_1d(snr)
+    if method == "table":
+        if not _gmi_demapping_tables(M)[3] and snr.size < _GMI_TABLE_SNR.size:
+            return cal_gmi_quadrature(M, snr)
+        gmi = np.zeros(snr.shape, dtype=np.float64)
+        inside = (snr >= _GMI_TABLE_SNR[0]) & (snr <= _GMI_TABLE_SNR[-1])
+        gmi[inside] = np.clip(_gmi_table(M)(snr[inside]), 0, np.log2(M))
+        if not np.all(inside):
+            gmi[~inside] = cal_gmi_quadrature(M, snr[~inside])
+        return gmi
+    elif method == "quadrature":
+        return cal_gmi_quadrature(M, snr)
+    elif method != "mc":
+        raise ValueError("method '%s' unknown has to be either 'table', 'quadrature' or 'mc'"%method)
     from qampy.signals import SignalQAMGrayCoded
     from qampy.core.dsp_cython import cal_gmi_mc
-    snr = np.atleast_1d(snr)
     s = SignalQAMGrayCoded(M, 1000, nmodes=1)
     btx = s._bitmap_mtx
     syms = s.coded_symbols
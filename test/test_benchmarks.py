@@ -64,6 +64,26 @@ def test_equalisation_prec(dtype, benchmark):
     ser = E.cal_ser().mean()
     npt.assert_allclose(0, ser, atol=3e-5)
 
+@pytest.mark.parametrize("method", ["mcma", "fd_mcma"])
+@pytest.mark.parametrize("ntaps", [21, 51, 101, 201, 501])
+def test_equalisation_fd_benchmark(method, ntaps, benchmark):
+    fb = 40.e9
+    os = 2
+    fs = os*fb
+    N = 2**16
+    mu = 1e-3
+    M = 4
+    benchmark.group = "equalisation ntaps %d"%ntaps
+    sig = signals.SignalQAMGrayCoded(M, N, fb=fb, nmodes=2)
+    S = sig.resample(fs, renormalise=True, beta=0.1)
+    S = impairments.change_snr(S, 20)
+    S = impairments.apply_PMD(S, np.pi/5.6, 50e-12)
+    wxy, err = benchmark(equalisation.equalise_signal, S, mu, Ntaps=ntaps, method=method, adaptive_stepsize=True)
+    E = equalisation.apply_filter(S, wxy)
+    E = helpers.normalise_and_center(E)
+    ser = helpers.dump_edges(E, 20).cal_ser()
+    npt.assert_allclose(0, ser, atol=3e-5)
+
 @pytest.mark.parametrize("dtype", [ np.complex64, np.complex128])
 #@pytest.m    npt.assert_allclose(0, ser, atol=3e-5)ark.parametrize("method", [cequalisation.apply_filter, cython_equalisation.apply_filter_signal, cython_equalisation.apply_filter_singal2 ])
 def test_apply_filter(dtype, benchmark):
@@ -101,7 +121,7 @@ def test_apply_filter(dtype, benchmark):
 
 
 @pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
-@pytest.mark.parametrize("method", ["py", "pyx"])
+@pytest.mark.parametrize("method", ["py", "pyx", "fft"])
 def test_apply_filter_benchmark(dtype, method, benchmark):
     benchmark.group = "apply filter "+str(dtype)
     fb = 40.e9
@@ -153,3 +173,212 @@ def test_select_angles_benchmark(dtype, method, benchmark, M):
     ser = sigo.cal_ser()
     npt.assert_allclose(0, ser, atol=3e-5)
 
+
+@pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+@pytest.mark.parametrize("M", [16, 64, 256])
+def test_bps_benchmark(dtype, M, benchmark):
+    from qampy.core.dsp_cython import bps, select_angles
+    benchmark.group = "bps M-%d"%M
+    N = 2**18
+    NL = 40
+    sig = signals.SignalQAMGrayCoded(M, N, fb=40e9, nmodes=1, dtype=dtype)
+    sig = impairments.apply_phase_noise(sig, 40e3)
+    fdtype = np.float32 if dtype is np.complex64 else np.float64
+    angles = np.linspace(-np.pi/4, np.pi/4, 64, endpoint=False, dtype=fdtype).reshape(1,-1)
+    idx = benchmark(bps, np.ascontiguousarray(sig[0]), angles, sig.coded_symbols, NL)
+    ph = np.array(select_angles(angles, idx)).reshape(1, -1)
+    ph[:, NL:-NL] = np.unwrap(ph[:, NL:-NL]*4)/4
+    sigo = sig*np.exp(1j*ph).astype(sig.dtype)
+    sigo = helpers.dump_edges(sigo, 100)
+    ser = sigo.cal_ser()
+    npt.assert_allclose(0, ser, atol=3e-5)
+
+@pytest.mark.parametrize("joint", [False, True])
+@pytest.mark.parametrize("M", [16, 64])
+def test_bps_modes_benchmark(joint, M, benchmark):
+    from qampy.core.phaserecovery import bps
+    benchmark.group = "bps dual-pol M-%d"%M
+    from qampy.core.impairments import phase_noise
+    sig = signals.SignalQAMGrayCoded(M, 2**17, fb=40e9, nmodes=2)
+    # both modes share the LO
+    sig = sig*np.exp(1.j*phase_noise((1, sig.shape[1]), 40e3, sig.fs)).astype(sig.dtype)
+    sigo, ph = benchmark(bps, sig, 64, sig.coded_symbols, 40, joint=joint)
+    sigo = helpers.dump_edges(sig.recreate_from_np_array(sigo), 100)
+    ser = sigo.cal_ser()
+    npt.assert_allclose(0, ser, atol=3e-5)
+
+@pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+@pytest.mark.parametrize("M", [16, 64])
+def test_bps_twostage_benchmark(dtype, M, benchmark):
+    from qampy.core.phaserecovery import bps_twostage
+    benchmark.group = "bps twostage M-%d"%M
+    sig = signals.SignalQAMGrayCoded(M, 2**17, fb=40e9, nmodes=2, dtype=dtype)
+    sig = impairments.apply_phase_noise(sig, 40e3)
+    sigo, ph = benchmark(bps_twostage, sig, 16, sig.coded_symbols, 40)
+    sigo = helpers.dump_edges(sig.recreate_from_np_array(sigo), 100)
+    ser = sigo.cal_ser()
+    npt.assert_allclose(0, ser, atol=3e-5)
+
+@pytest.mark.parametrize("method", ["py", "pyx"])
+def test_viterbiviterbi_benchmark(method, benchmark):
+    from qampy.core.phaserecovery import viterbiviterbi
+    benchmark.group = "viterbiviterbi"
+    sig = signals.SignalQAMGrayCoded(4, 2**20, fb=40e9, nmodes=2)
+    sig = impairments.apply_phase_noise(impairments.change_snr(sig, 15), 100e3)
+    sigo, ph = benchmark(viterbiviterbi, sig, 11, 4, method=method)
+    sigo = helpers.dump_edges(sig.recreate_from_np_array(sigo), 100)
+    ser = sigo.cal_ser()
+    npt.assert_allclose(0, ser, atol=3e-5)
+
+@pytest.mark.parametrize("M, snr, sermax", [(16, 17, 5e-3), (64, 23, 1.5e-2), (256, 33, 1.5e-2)])
+def test_phase_partition_benchmark(M, snr, sermax, benchmark):
+    from qampy.core.phaserecovery import phase_partition_qam
+    benchmark.group = "phase partition"
+    sig = signals.SignalQAMGrayCoded(M, 2**18, fb=40e9, nmodes=2)
+    # linewidth symbol-duration product of 1e-5
+    sig = impairments.apply_phase_noise(impairments.change_snr(sig, snr), 400e3)
+    sigo, ph = benchmark(phase_partition_qam, sig, 96 if M == 256 else 128, M)
+    sigo = helpers.dump_edges(sig.recreate_from_np_array(sigo), 100)
+    ser = sigo.cal_ser()
+    assert np.all(ser < sermax)
+
+@pytest.mark.parametrize("method", ["fft", "welch"])
+def test_find_freq_offset_benchmark(method, benchmark):
+    from qampy.core.phaserecovery import find_freq_offset, find_freq_offset_welch
+    benchmark.group = "freq offset"
+    sig = signals.SignalQAMGrayCoded(16, 2**20, fb=40e9, nmodes=2)
+    sig = impairments.change_snr(sig, 20)
+    fo = 1.234e-3
+    sig = sig*np.exp(2.j*np.pi*np.arange(sig.shape[1])*fo)
+    if method == "fft":
+        f = benchmark(find_freq_offset, sig, fft_size=2**16)
+    else:
+        f = benchmark(find_freq_offset_welch, sig, fft_size=2**12)
+    npt.assert_allclose(f, fo, atol=4e-6)
+
+@pytest.mark.parametrize("method", ["numpy", "pyx"])
+@pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+def test_normalise_benchmark(method, dtype, benchmark):
+    from qampy.core.dsp_cython import normalise_center
+    benchmark.group = "normalise %s"%np.dtype(dtype).name
+    E = (np.random.randn(2, 2**22) + 1.j*np.random.randn(2, 2**22) + 0.2).astype(dtype)
+    def normalise_np(E):
+        E = E - np.mean(E, axis=-1)[:, np.newaxis]
+        E /= np.sqrt(np.mean(abs(E)**2, axis=-1))[:, np.newaxis]
+        return E
+    fct = normalise_np if method == "numpy" else normalise_center
+    Eo = benchmark(fct, E)
+    assert Eo.dtype == dtype
+    npt.assert_allclose(np.mean(abs(Eo)**2, axis=-1), 1, rtol=1e-4)
+
+@pytest.mark.parametrize("method", ["numpy", "pyx"])
+@pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+def test_rotate_ramp_benchmark(method, dtype, benchmark):
+    from qampy.core.dsp_cython import rotate_ramp
+    benchmark.group = "frequency offset %s"%np.dtype(dtype).name
+    E = (np.random.randn(2, 2**22) + 1.j*np.random.randn(2, 2**22)).astype(dtype)
+    dphi = np.array([1e-3, 1e-3])
+    def rotate_np(E, phi0, dphi):
+        return E*np.exp(1.j*(phi0[:, None] + np.arange(E.shape[1])*dphi[:, None])).astype(E.dtype)
+    fct = rotate_np if method == "numpy" else rotate_ramp
+    Eo = benchmark(fct, E, np.zeros(2), dphi)
+    assert Eo.dtype == dtype
+
+@pytest.mark.parametrize("M", [16, 64])
+def test_pll_benchmark(M, benchmark):
+    from qampy.core.phaserecovery import pll
+    benchmark.group = "pll"
+    sig = signals.SignalQAMGrayCoded(M, 2**18, fb=40e9, nmodes=2)
+    sig = impairments.apply_phase_noise(impairments.change_snr(sig, 30), 100e3)
+    sigo, ph, state = benchmark(pll, sig, sig.coded_symbols)
+    sigo = helpers.dump_edges(sig.recreate_from_np_array(sigo), 2000)
+    ser = sigo.cal_ser()
+    npt.assert_allclose(0, ser, atol=3e-5)
+
+@pytest.mark.parametrize("M", [16, 256])
+def test_estimate_snr_benchmark(M, benchmark):
+    from qampy.core.signal_quality import estimate_snr
+    benchmark.group = "estimate snr"
+    s = signals.SignalQAMGrayCoded(M, 2**18, nmodes=2)
+    s2 = impairments.change_snr(s, 25)
+    snr = benchmark(estimate_snr, np.asarray(s2), s.symbols, s.coded_symbols)
+    npt.assert_allclose(10*np.log10(snr), 25, atol=0.2)
+
+@pytest.mark.parametrize("method", ["dense", "pam"])
+@pytest.mark.parametrize("M", [64, 256])
+def test_demapper_benchmark(method, M, benchmark):
+    from qampy.core import signal_quality
+    benchmark.group = "demapper M-%d"%M
+    s = signals.SignalQAMGrayCoded(M, 2**16, nmodes=1)
+    s2 = impairments.change_snr(s, 20)
+    rx = np.asarray(s2)[0]
+    snr = 10**(20/10)
+    if method == "dense":
+        l_values = benchmark(signal_quality.soft_l_value_demapper, rx, M, snr, s._bitmap_mtx)
+    else:
+        tables = signal_quality.pam_bit_tables(s._bitmap_mtx)
+        l_values = benchmark(signal_quality.soft_l_value_demapper_pam, rx, snr, tables)
+    assert np.all(np.isfinite(l_values))
+
+@pytest.mark.parametrize("M", [16, 32, 256])
+def test_cal_gmi_benchmark(M, benchmark):
+    benchmark.group = "cal gmi"
+    s = signals.SignalQAMGrayCoded(M, 2**16, nmodes=2)
+    s2 = impairments.change_snr(s, 20)
+    gmi, gmi_per_bit = benchmark(s2.cal_gmi, synced=True)
+    assert np.all(gmi <= s.Nbits)
+    assert gmi_per_bit.shape == (2, s.Nbits)
+
+@pytest.mark.parametrize("method", ["mc", "quadrature", "table"])
+def test_theory_gmi_benchmark(method, benchmark):
+    from qampy import theory
+    benchmark.group = "theory gmi"
+    snr = np.arange(0, 25, 0.5)
+    gmi = benchmark(theory.cal_gmi, 16, snr, method=method)
+    npt.assert_allclose(gmi[-1], 4, atol=1e-3)
+
+@pytest.mark.parametrize("M", [16, 256])
+def test_cal_evm_blind_benchmark(M, benchmark):
+    from qampy.core.signal_quality import cal_evm
+    benchmark.group = "blind evm"
+    s = signals.SignalQAMGrayCoded(M, 2**18, nmodes=2)
+    s2 = impairments.change_snr(s, 25)
+    evm = benchmark(cal_evm, np.asarray(s2), M)
+    assert evm.shape == (2,)
+
+@pytest.mark.parametrize("synced", [True, False])
+@pytest.mark.parametrize("target_errors", [None, 1000])
+def test_cal_ber_early_stop_benchmark(target_errors, synced, benchmark):
+    benchmark.group = "ber early stop"
+    s = signals.SignalQAMGrayCoded(64, 2**20, nmodes=2)
+    s2 = impairments.change_snr(s, 14)
+    if not synced:
+        s2 = s.recreate_from_np_array(np.ascontiguousarray(np.roll(s2, 1000, axis=-1)))
+    ber = benchmark(s2.cal_ber, synced=synced, target_errors=target_errors)
+    if target_errors is not None:
+        ber = ber[0]
+    assert np.all(ber > 0.05)
+
+@pytest.mark.parametrize("method", ["lut", "bitarray"])
+@pytest.mark.parametrize("M", [4, 16, 64, 256, 1024])
+def test_modulate_benchmark(method, M, benchmark):
+    benchmark.group = "modulate M-%d"%M
+    sig = signals.SignalQAMGrayCoded(M, 2**16, nmodes=2)
+    if method == "lut":
+        fct = sig._modulate
+    else:
+        fct = sig._modulate_bitarray
+    syms = benchmark(fct, sig.bits, sig._encoding, M, sig.dtype)
+    npt.assert_array_equal(syms, sig.symbols)
+
+@pytest.mark.parametrize("method", ["lut", "bitarray"])
+@pytest.mark.parametrize("M", [4, 16, 64, 256, 1024])
+def test_demodulate_benchmark(method, M, benchmark):
+    benchmark.group = "demodulate M-%d"%M
+    sig = signals.SignalQAMGrayCoded(M, 2**16, nmodes=2)
+    if method == "lut":
+        fct = sig._demodulate
+    else:
+        fct = sig._demodulate_bitarray
+    bits = benchmark(fct, np.asarray(sig.symbols), sig._encoding)
+    npt.assert_array_equal(bits, sig.bits)
@@ -3,7 +3,7 @@ import numpy as np
 import numpy.testing as npt
 
 from qampy import signals
-from qampy.core import ber_functions, impairments
+from qampy.core import ber_functions, impairments, prbs
 
 #TODO: We should check that all the syncing works when we have only symbols from a relatively short PRBS pattern that
 #      repeats
@@ -83,6 +83,106 @@ class TestFindSequenceOffsetComplex(object):
         offset, syms2, ii = ber_functions.find_sequence_offset_complex(syms, sig2 * 1j ** i)
         assert (4-ii)%4 == i
 
+class TestFindSequenceOffsetWindow(object):
+    s = signals.SignalQAMGrayCoded(16, 2**16, nmodes=1)
+
+    @pytest.mark.parametrize("shiftN", [0, 1001, 2**15+7, 2**16-3])
+    @pytest.mark.parametrize("i", range(4))
+    @pytest.mark.parametrize("snr", [5, 20])
+    def test_vs_full(self, shiftN, i, snr):
+        sig = impairments.change_snr(self.s, self.s.fb, self.s.fs, snr)[0]
+        sig2 = np.roll(sig, shift=shiftN)*1j**i
+        syms = self.s.symbols[0]
+        offset, syms2, ii, acm = ber_functions.find_sequence_offset_complex(sig2, syms)
+        offset_w, syms2_w, ii_w, acm_w = ber_functions.find_sequence_offset_complex(sig2, syms, Nwindow=2**12)
+        assert ii == ii_w == i
+        assert (offset - offset_w) % 2**16 == 0
+        assert offset_w % 2**16 == shiftN
+
+    @pytest.mark.parametrize("N2", [5000, 3*2**15])
+    @pytest.mark.parametrize("adjust", ["tx", "rx"])
+    def test_length(self, N2, adjust):
+        sig = self.s[0]
+        tx = self.s.symbols[0]
+        rx = np.tile(np.roll(sig, 777), 2)[:N2]*1j
+        offset, ii, acm = ber_functions.find_sync_params(tx, rx, adjust=adjust)
+        offset_w, ii_w, acm_w = ber_functions.find_sync_params(tx, rx, adjust=adjust, Nwindow=2**11)
+        t, r = ber_functions.apply_sync(tx*1j**ii, rx, offset, adjust=adjust)
+        t_w, r_w = ber_functions.apply_sync(tx*1j**ii_w, rx, offset_w, adjust=adjust)
+        npt.assert_array_equal(t, t_w)
+        npt.assert_array_equal(r, r_w)
+
+    def test_fallback(self):
+        x = np.random.randn(2**16) + 1.j*np.random.randn(2**16)
+        y = self.s.symbols[0]
+        assert ber_functions.find_sequence_offset_window(x, y, 2**12)[0] is None
+        offset, y2, ii, acm = ber_functions.find_sequence_offset_complex(x, y, Nwindow=2**12)
+        assert offset == ber_functions.find_sequence_offset_complex(x, y)[0]
+
+
+class TestFindPRBSOffset(object):
+    @pytest.mark.parametrize("order", [7, 15, 23])
+    @pytest.mark.parametrize("xor", ["ext", "int"])
+    @pytest.mark.parametrize("shiftN", [0, 1, 2**12+5])
+    def test_shift(self, order, xor, shiftN):
+        # a multiple of the period of the order 7 pattern, so that the rolled sequence stays a PRBS
+        N = 127*2**7
+        tx = prbs.make_prbs_extXOR(order, N) if xor == "ext" else prbs.make_prbs_intXOR(order, N)
+        rx = np.roll(tx, shiftN)[:2000]
+        offset = ber_functions.find_prbs_offset(tx, rx, order, xor=xor)
+        npt.assert_array_equal(rx, tx[(np.arange(2000) + offset) % N])
+
+    @pytest.mark.parametrize("invert", [False, True])
+    @pytest.mark.parametrize("seed", [None, 12345])
+    def test_errors_rolled_tx(self, invert, seed):
+        tx = np.roll(prbs.make_prbs_extXOR(23, 2**15, seed=seed), 3000)
+        if invert:
+            tx = ~tx
+        rx = np.roll(tx, -1001)[:4000]
+        err = np.random.choice(4000, 40, replace=False)
+        rx[err] = ~rx[err]
+        offset = ber_functions.find_prbs_offset(tx, rx, 23)
+        assert offset % 2**15 == 1001
+
+    def test_no_prbs(self):
+        tx = np.random.randint(0, 2, 2**14).astype(bool)
+        with pytest.raises(ber_functions.DataSyncError):
+            ber_functions.find_prbs_offset(tx, tx[:1000], 15)
+
+    def test_fallback(self):
+        tx = prbs.make_prbs_extXOR(15, 2**14)
+        rx = np.roll(tx, 77)
+        rx[::7] = ~rx[::7]
+        with pytest.raises(ber_functions.DataSyncError):
+            ber_functions.find_prbs_offset(tx, rx, 15)
+        offset, rx_sync = ber_functions.sync_rx2tx_prbs(tx, rx, 15)
+        assert offset % 2**14 == 2**14 - 77
+
+
+class TestFindIndexOffset(object):
+    @pytest.mark.parametrize("M", [4, 64, 1024])
+    @pytest.mark.parametrize("shiftN", [0, 1, 2**12+5])
+    def test_errors(self, M, shiftN):
+        N = 2**16
+        tx = np.random.randint(0, M, N)
+        rx = np.roll(tx, shiftN)[:4000]
+        err = np.random.choice(4000, 200, replace=False)
+        rx[err] = (rx[err] + 1) % M
+        row, offset = ber_functions.find_index_offset(tx, rx, M)
+        assert row == 0
+        assert np.count_nonzero(rx != tx[(np.arange(4000) + offset) % N]) == 200
+
+    def test_rows(self):
+        tx = np.random.randint(0, 16, 2**14)
+        rx = np.array([np.random.randint(0, 16, 2000), np.roll(tx, -77)[:2000]])
+        assert ber_functions.find_index_offset(tx, rx, 16) == (1, 77)
+
+    def test_not_found(self):
+        tx = np.random.randint(0, 16, 2**14)
+        with pytest.raises(ber_functions.DataSyncError):
+            ber_functions.find_index_offset(tx, np.random.randint(0, 16, 2000), 16)
+
+
 class TestSyncAndAdjust(object):
     s = signals.SignalQAMGrayCoded(16, 3 * 10 ** 4, nmodes=1)
     d = np.diff(np.unique(s.symbols.real)).min()
@@ -276,3 +376,55 @@ class TestAdjustDataLength(object):
                 N_ex = N2
         assert (tx.shape[0] == N_ex) and (rx.shape[0] == N_ex)
 
+
+
+class TestErrorRateInterval(object):
+    def test_contains_rate(self):
+        lower, upper = ber_functions.error_rate_interval(100, 10**4)
+        assert lower < 0.01 < upper
+        npt.assert_allclose([lower, upper], [0.00814, 0.01216], rtol=5e-3)
+
+    def test_limits(self):
+        assert ber_functions.error_rate_interval(0, 1000)[0] == 0
+        assert ber_functions.error_rate_interval(1000, 1000)[1] == 1
+        lower, upper = ber_functions.error_rate_interval(np.array([0, 10]), np.array([100, 100]))
+        assert lower.shape == (2,)
+
+    def test_coverage(self):
+        rng = np.random.RandomState(1)
+        p, N = 0.01, 5000
+        nerr = rng.binomial(N, p, size=2000)
+        lower, upper = ber_functions.error_rate_interval(nerr, N, confidence=0.9)
+        assert np.mean((lower <= p) & (p <= upper)) >= 0.89
+
+
+class TestCountErrorsChunked(object):
+    @pytest.mark.parametrize("target", [10, 100, 1000])
+    def test_target_errors(self, target):
+        errs = np.random.RandomState(2).rand(10**6) < 0.05
+        nerr, ntrials = ber_functions.count_errors_chunked(lambda i, j: np.count_nonzero(errs[i:j]), errs.size,
+                                                           target_errors=target)
+        assert nerr >= target
+        assert ntrials < errs.size
+        assert nerr == np.count_nonzero(errs[:ntrials])
+
+    def test_ci_width(self):
+        errs = np.random.RandomState(2).rand(10**6) < 0.05
+        nerr, ntrials = ber_functions.count_errors_chunked(lambda i, j: np.count_nonzero(errs[i:j]), errs.size,
+                                                           ci_width=0.2)
+        lower, upper = ber_functions.error_rate_interval(nerr, ntrials)
+        assert (upper - lower) <= 0.2*nerr/ntrials
+        assert ntrials < errs.size
+
+    def test_no_errors_processes_all(self):
+        nerr, ntrials = ber_functions.count_errors_chunked(lambda i, j: 0, 10**5, target_errors=10, ci_width=0.1,
+                                                           trials_per_item=4)
+        assert nerr == 0 and ntrials == 4*10**5
+
+    def test_ber_syncd(self):
+        rx = np.random.RandomState(3).rand(10**6) < 0.01
+        tx = np.zeros(10**6, dtype=bool)
+        ber, errs, N, (lower, upper) = ber_functions.cal_ber_syncd(rx, tx, target_errors=200)
+        assert errs >= 200 and N < 10**6
+        assert lower < ber < upper
+        assert len(ber_functions.cal_ber_syncd(rx, tx)) == 3
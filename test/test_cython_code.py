@@ -21,3 +21,171 @@ class TestQuantize(object):
         xx = abs(s.symbols[0] - o)
         npt.assert_array_almost_equal(xx, 0)
 
+
+    @pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+    @pytest.mark.parametrize("M", [4, 8, 16, 32, 64, 128, 256, 1024])
+    def test_vs_linear_search(self, dtype, M):
+        s = signals.SignalQAMGrayCoded(M, 2**12, dtype=dtype)
+        s = impairments.change_snr(s, 10).astype(dtype)
+        o = np.array(cython_equalisation.make_decision(s[0], s.coded_symbols))
+        d = abs(s[0][:, np.newaxis] - s.coded_symbols[np.newaxis, :])
+        idx = np.argmin(d, axis=1)
+        # allow for ties at the decision boundaries due to rounding
+        npt.assert_allclose(abs(s[0] - o), d.min(axis=1), rtol=np.finfo(dtype).eps*8, atol=np.finfo(dtype).eps*16)
+        assert np.count_nonzero(o != s.coded_symbols[idx]) <= 2
+
+
+class TestSymbolSlicer(object):
+    @pytest.mark.parametrize("M", [4, 32, 128, 256])
+    def test_lattice(self, M):
+        syms = signals.SignalQAMGrayCoded(M, 10).coded_symbols
+        x = np.random.randn(2**12)*2 + 1j*np.random.randn(2**12)*2
+        idx = cython_equalisation.SymbolSlicer(syms).decide(x)
+        npt.assert_array_equal(idx, np.argmin(abs(x[:, np.newaxis] - syms[np.newaxis, :]), axis=1))
+
+    @pytest.mark.parametrize("syms", [np.exp(2j*np.pi*np.arange(8)/8),
+                                      np.hstack([np.exp(2j*np.pi*np.arange(4)/4+0.3),
+                                                 2*np.exp(2j*np.pi*np.arange(12)/12)])])
+    def test_arbitrary(self, syms):
+        x = np.random.randn(2**12)*2 + 1j*np.random.randn(2**12)*2
+        idx = cython_equalisation.SymbolSlicer(syms).decide(x)
+        npt.assert_array_equal(idx, np.argmin(abs(x[:, np.newaxis] - syms[np.newaxis, :]), axis=1))
+
+    def test_outside_and_nan(self):
+        syms = signals.SignalQAMGrayCoded(32, 10).coded_symbols
+        x = np.array([np.nan, 1e3+1e3j, 0.1-1e3j])
+        idx = cython_equalisation.SymbolSlicer(syms).decide(x)
+        npt.assert_array_equal(idx[1:], np.argmin(abs(x[1:, np.newaxis] - syms[np.newaxis, :]), axis=1))
+        assert 0 <= idx[0] < 32
+
+    @pytest.mark.parametrize("M", [16, 32])
+    @pytest.mark.parametrize("value", [np.nan, np.inf, -np.inf, complex(np.nan, 1.), complex(1., -np.inf)])
+    def test_non_finite(self, M, value):
+        syms = signals.SignalQAMGrayCoded(M, 10).coded_symbols
+        idx = cython_equalisation.make_decision_index(np.array([value, 0.1+0.1j]), syms)
+        assert np.all(idx < M)
+
+    def test_cached(self):
+        syms = signals.SignalQAMGrayCoded(128, 10).coded_symbols
+        slicer = cython_equalisation.get_symbol_slicer(syms)
+        assert cython_equalisation.get_symbol_slicer(syms.copy()) is slicer
+        assert cython_equalisation.get_symbol_slicer(syms[::-1]) is not slicer
+
+class TestCountBitErrors(object):
+    @pytest.mark.parametrize("M", [4, 64, 1024])
+    def test_vs_bits(self, M):
+        from qampy.core.dsp_cython import count_bit_errors
+        from qampy.core.signal_quality import hamming_distance_table
+        s = signals.SignalQAMGrayCoded(M, 2**12, nmodes=1)
+        idx_tx = s.symbol_indices[0]
+        idx_rx = np.random.randint(0, M, size=idx_tx.size).astype(idx_tx.dtype)
+        nerr = count_bit_errors(idx_tx, idx_rx, hamming_distance_table(s._bit_table))
+        assert nerr == np.count_nonzero(s.demodulate(idx_tx) ^ s.demodulate(idx_rx))
+
+class TestBPS(object):
+    @pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+    @pytest.mark.parametrize("N", [1, 10])
+    @pytest.mark.parametrize("per_sample", [False, True])
+    def test_vs_python(self, dtype, N, per_sample):
+        from qampy.core.dsp_cython import bps
+        from qampy.core.phaserecovery import _bps_idx_py
+        s = signals.SignalQAMGrayCoded(16, 2**14, nmodes=1, dtype=dtype)
+        s = impairments.apply_phase_noise(impairments.change_snr(s, 20), 100e3)
+        fdtype = np.float32 if dtype is np.complex64 else np.float64
+        if per_sample:
+            angles = np.random.uniform(-np.pi/4, np.pi/4, size=(s.shape[1], 8)).astype(fdtype)
+        else:
+            angles = np.linspace(-np.pi/4, np.pi/4, 32, endpoint=False, dtype=fdtype).reshape(1, -1)
+        E = np.ascontiguousarray(s[0])
+        idx = bps(E, angles, s.coded_symbols, N)
+        idx_py = _bps_idx_py(E.astype(np.complex128), angles.astype(np.float64), s.coded_symbols.astype(np.complex128), N)
+        # allow for rounding ties of the distance sums in single precision
+        assert np.count_nonzero(idx != idx_py) <= 2
+        npt.assert_array_equal(idx[:N], 0)
+        npt.assert_array_equal(idx[-N:], 0)
+
+    def test_short(self):
+        from qampy.core.dsp_cython import bps
+        s = signals.SignalQAMGrayCoded(16, 20, nmodes=1)
+        angles = np.linspace(-np.pi/4, np.pi/4, 8, endpoint=False).reshape(1, -1)
+        npt.assert_array_equal(bps(np.ascontiguousarray(s[0]), angles, s.coded_symbols, 10), 0)
+
+    @pytest.mark.parametrize("joint", [False, True])
+    def test_modes(self, joint):
+        from qampy.core.dsp_cython import bps, bps_modes
+        s = signals.SignalQAMGrayCoded(16, 2**14, nmodes=3)
+        s = impairments.apply_phase_noise(impairments.change_snr(s, 15), 100e3)
+        angles = np.linspace(-np.pi/4, np.pi/4, 16, endpoint=False).reshape(1, -1)
+        idx = bps_modes(np.asarray(s), angles, s.coded_symbols, 10, joint)
+        assert idx.shape == s.shape
+        if joint:
+            # the python search on the summed distances
+            EE = np.asarray(s)[:, :, np.newaxis]*np.exp(1.j*angles)
+            dist = (abs(EE[:, :, :, np.newaxis] - s.coded_symbols)**2).min(axis=3).sum(axis=0)
+            csum = np.cumsum(dist, axis=0)
+            idx_py = (csum[20:] - csum[:-20]).argmin(1)
+            for i in range(3):
+                npt.assert_array_equal(idx[i, 10:-10], idx_py)
+        else:
+            for i in range(3):
+                npt.assert_array_equal(idx[i], bps(np.ascontiguousarray(s[i]), angles, s.coded_symbols, 10))
+
+    @pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+    @pytest.mark.parametrize("M", [16, 64])
+    def test_twostage_vs_per_sample(self, dtype, M):
+        from qampy.core.dsp_cython import bps, bps_twostage_modes
+        s = signals.SignalQAMGrayCoded(M, 2**14, nmodes=2, fb=40e9, dtype=dtype)
+        s = impairments.apply_phase_noise(impairments.change_snr(s, 35), 100e3)
+        angles = np.linspace(-np.pi/4, np.pi/4, 16, endpoint=False)
+        fine = np.linspace(-2, 2, 4)/64*np.pi/2
+        ph = bps_twostage_modes(np.asarray(s), angles, fine, s.coded_symbols, 10)
+        for i in range(2):
+            # second stage search with the per sample test angles
+            E = np.ascontiguousarray(s[i])
+            ph1 = angles[bps(E, angles.reshape(1, -1).astype(s.real.dtype), s.coded_symbols, 10)]
+            phn = (ph1[:, np.newaxis] + fine[np.newaxis, :]).astype(s.real.dtype)
+            phf = phn[np.arange(E.shape[0]), bps(E, phn, s.coded_symbols, 10)]
+            assert np.count_nonzero(abs(ph[i, 20:-20] - phf[20:-20]) > 1e-6) <= 2
+        npt.assert_array_equal(ph[:, :10], np.repeat(ph[:, 10:11], 10, axis=1))
+
+class TestElementwise(object):
+    @pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+    @pytest.mark.parametrize("nph", [1, 2])
+    def test_rotate_phase(self, dtype, nph):
+        from qampy.core.dsp_cython import rotate_phase
+        E = (np.random.randn(2, 2**15 + 3) + 1.j*np.random.randn(2, 2**15 + 3)).astype(dtype)
+        ph = np.random.uniform(-np.pi, np.pi, size=(nph, E.shape[1]))
+        Eo = rotate_phase(E, ph)
+        assert Eo.dtype == dtype
+        npt.assert_allclose(Eo, E*np.exp(1.j*ph), rtol=1e-5 if dtype is np.complex64 else 1e-12)
+        rotate_phase(E, ph, out=E)
+        npt.assert_array_equal(E, Eo)
+
+    @pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+    def test_rotate_ramp(self, dtype):
+        from qampy.core.dsp_cython import rotate_ramp
+        E = (np.random.randn(2, 2**15 + 3) + 1.j*np.random.randn(2, 2**15 + 3)).astype(dtype)
+        phi0 = np.array([0.1, -2.])
+        dphi = np.array([1e-3, 0.])
+        ph = phi0[:, None] + np.arange(E.shape[1])*dphi[:, None]
+        Eo = rotate_ramp(E, phi0, dphi)
+        assert Eo.dtype == dtype
+        npt.assert_allclose(Eo, E*np.exp(1.j*ph), rtol=1e-5 if dtype is np.complex64 else 1e-12)
+
+    @pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+    def test_normalise(self, dtype):
+        from qampy.core.dsp_cython import mean_power, normalise_center
+        E = (np.random.randn(3, 2**15 + 3)*2 + 1.j*np.random.randn(3, 2**15 + 3) + 0.5 - 1.j).astype(dtype)
+        mean, power = mean_power(E)
+        npt.assert_allclose(mean, E.mean(axis=1), rtol=1e-5)
+        npt.assert_allclose(power, (abs(E)**2).mean(axis=1), rtol=1e-5)
+        Eo = normalise_center(E)
+        assert Eo.dtype == dtype
+        npt.assert_allclose(Eo.mean(axis=1), 0, atol=1e-5)
+        npt.assert_allclose((abs(Eo)**2).mean(axis=1), 1, rtol=1e-5)
+
+    def test_out_mismatch(self):
+        from qampy.core.dsp_cython import normalise_center
+        E = np.ones((2, 10), dtype=np.complex128)
+        with pytest.raises(ValueError):
+            normalise_center(E, out=np.ones((2, 10), dtype=np.complex64))
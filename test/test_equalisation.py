@@ -1,4 +1,5 @@
 import pytest
+import numpy as np
 import numpy.testing as npt
 
 from qampy import signals, equalisation
@@ -33,3 +34,68 @@ class TestReturnObject(object):
         s3 = equalisation.apply_filter(s2, self.os, wx)
         assert type(s3) is type(self.s)
 
+
+
+class TestFDEqualiser(object):
+    s = signals.ResampledQAM(16, 2 ** 14, fb=20e9, fs=40e9, nmodes=2)
+
+    @pytest.mark.parametrize("method", ["cma", "mcma", "sbd"])
+    @pytest.mark.parametrize("adaptive", [True, False])
+    def test_blocksize_one_equals_lms(self, method, adaptive):
+        s2 = impairments.simulate_transmission(self.s, self.s.fb, self.s.fs, snr=20, dgd=100e-12)
+        wx1, err1 = equalisation.equalise_signal(s2, 1e-3, Ntaps=11, method=method, adaptive_stepsize=adaptive)
+        wx2, err2 = equalisation.equalise_signal(s2, 1e-3, Ntaps=11, method="fd_"+method,
+                                                 adaptive_stepsize=adaptive, block_size=1)
+        npt.assert_allclose(wx1, wx2, atol=1e-8)
+        npt.assert_allclose(err1, err2, atol=1e-8)
+
+    @pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+    @pytest.mark.parametrize("block_size", [None, 10, 33])
+    def test_apply_filter_compatible(self, dtype, block_size):
+        s2 = impairments.simulate_transmission(self.s.astype(dtype), self.s.fb, self.s.fs, snr=20, dgd=100e-12)
+        s3, wx, err = equalisation.equalise_signal(s2, 1e-3, Ntaps=21, method="fd_mcma", block_size=block_size,
+                                                   apply=True)
+        assert wx.shape == (2, 2, 21)
+        assert wx.dtype == np.dtype(dtype)
+        assert s3.dtype == np.dtype(dtype)
+        assert type(s3) is type(self.s)
+
+
+class TestApplyFilter(object):
+    @pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+    @pytest.mark.parametrize("os", [1, 2, 3])
+    @pytest.mark.parametrize("ntaps", [1, 11, 100, 301])
+    @pytest.mark.parametrize("nmodes", [1, 2])
+    def test_fft_vs_pyx(self, dtype, os, ntaps, nmodes):
+        E = (np.random.randn(nmodes, 5000) + 1j*np.random.randn(nmodes, 5000)).astype(dtype)
+        wxy = (np.random.randn(nmodes, nmodes, ntaps) + 1j*np.random.randn(nmodes, nmodes, ntaps)).astype(dtype)
+        E1 = cequalisation.apply_filter(E, os, wxy, method="pyx")
+        E2 = cequalisation.apply_filter(E, os, wxy, method="fft")
+        assert E1.shape == E2.shape
+        assert E2.dtype == np.dtype(dtype)
+        npt.assert_allclose(E1, E2, atol=1e-2 if dtype is np.complex64 else 1e-8)
+
+    @pytest.mark.parametrize("Nfft", [16, 64, 1024])
+    def test_fft_nfft(self, Nfft):
+        E = np.random.randn(2, 3000) + 1j*np.random.randn(2, 3000)
+        wxy = np.random.randn(2, 2, 15) + 1j*np.random.randn(2, 2, 15)
+        E1 = cequalisation.apply_filter(E, 2, wxy, method="pyx")
+        E2 = cequalisation.apply_filter_fft(E, 2, wxy, Nfft=Nfft)
+        npt.assert_allclose(E1, E2, atol=1e-8)
+
+    def test_fft_nfft_too_short(self):
+        E = np.random.randn(2, 3000) + 1j*np.random.randn(2, 3000)
+        wxy = np.random.randn(2, 2, 15) + 1j*np.random.randn(2, 2, 15)
+        with pytest.raises(ValueError):
+            cequalisation.apply_filter_fft(E, 2, wxy, Nfft=8)
+
+    @pytest.mark.parametrize("ntaps", [3, 301])
+    def test_auto(self, ntaps):
+        s = signals.SignalQAMGrayCoded(4, 2**12, nmodes=2).resample(2, beta=0.1, renormalise=True)
+        wxy = np.zeros((2, 2, ntaps), dtype=s.dtype)
+        wxy[0, 0, ntaps//2] = 1
+        wxy[1, 1, ntaps//2] = 1
+        s2 = equalisation.apply_filter(s, wxy, method="auto")
+        s3 = equalisation.apply_filter(s, wxy, method="pyx")
+        assert type(s2) is type(s)
+        npt.assert_allclose(s2, s3, atol=1e-10)
@@ -72,3 +72,28 @@ def test_normalise(nmodes):
 
 
 
+
+@pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+def test_normalise_inplace(dtype):
+    s = signals.SignalQAMGrayCoded(64, 2 ** 12, nmodes=2, dtype=dtype)*2 + 0.3
+    s2 = helpers.normalise_and_center(s)
+    s3 = helpers.normalise_and_center(s, out=s)
+    assert s3 is s
+    assert s2.dtype == dtype
+    npt.assert_allclose(s2, s, rtol=1e-5)
+    npt.assert_allclose(np.mean(abs(s)**2, axis=-1), 1, rtol=1e-5)
+
+@pytest.mark.parametrize("shape", [(1000,), (2, 1000)])
+def test_normalise_real(shape):
+    x = np.random.randn(*shape) + 2.
+    y = helpers.normalise_and_center(x)
+    if len(shape) == 1:
+        assert y.dtype == np.complex128
+    npt.assert_allclose(np.mean(y, axis=-1), 0, atol=1e-12)
+    npt.assert_allclose(np.mean(abs(y)**2, axis=-1), 1)
+
+def test_normalise_dc_offset():
+    s = signals.SignalQAMGrayCoded(16, 2 ** 12, nmodes=1)
+    x = np.asarray(s)*1e-4 + 1e4*(1 + 1j)
+    y = helpers.normalise_and_center(x)
+    npt.assert_allclose(y, (s - np.mean(s))/np.sqrt(np.mean(abs(s - np.mean(s))**2)), rtol=1e-3, atol=1e-3)
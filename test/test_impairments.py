@@ -87,3 +87,31 @@ class TestReturnObjects(object):
     def test_add_awgn_attr(self, attr):
         s2 = impairments.add_awgn(self.s, 0.01)
         assert getattr(self.s, attr) is getattr(s2, attr)
+
+class TestCarrierOffset(object):
+    @pytest.mark.parametrize("ndim", [1, 2])
+    def test_vs_exp(self, ndim):
+        from qampy.core import impairments as cimpairments
+        s = signals.ResampledQAM(16, 2**14, fs=2, nmodes=2)
+        s = s[0] if ndim == 1 else s
+        s2 = cimpairments.add_carrier_offset(s, 1e-3*s.fs, s.fs)
+        np.testing.assert_allclose(s2, s*np.exp(2.j*np.pi*np.arange(s.shape[-1])*1e-3), rtol=1e-10)
+
+    def test_out(self):
+        from qampy.core import impairments as cimpairments
+        s = signals.ResampledQAM(16, 2**14, fs=2, nmodes=2)
+        s2 = cimpairments.add_carrier_offset(s, 1e-3*s.fs, s.fs)
+        s3 = cimpairments.add_carrier_offset(s, 1e-3*s.fs, s.fs, out=s)
+        assert s3 is s
+        np.testing.assert_array_equal(s2, s)
+
+    @pytest.mark.parametrize("dtype, cdtype", [(np.float64, np.complex128), (np.float32, np.complex64)])
+    def test_real_input(self, dtype, cdtype):
+        from qampy.core import impairments as cimpairments
+        x = np.ones((1, 1000), dtype=dtype)
+        s2 = cimpairments.add_carrier_offset(x, 1e6, 1e9)
+        assert s2.dtype == cdtype
+        np.testing.assert_allclose(s2, np.exp(2.j*np.pi*np.arange(1000)*1e-3)[None, :], rtol=1e-5)
+        s3 = cimpairments.apply_phase_noise(x, 1e5, 1e9)
+        assert s3.dtype == cdtype
+        np.testing.assert_allclose(abs(s3), 1, rtol=1e-5)
@@ -710,6 +710,228 @@ class TestSignalQualityCorrectnes(object):
         npt.assert_almost_equal(ber.flatten(), err_syms/(N*np.log2(M)))
 
 
+class TestEarlyTermination(object):
+    @pytest.mark.parametrize("synced", [True, False])
+    @pytest.mark.parametrize("metric", ["ser", "ber"])
+    def test_target_errors(self, metric, synced):
+        s = signals.SignalQAMGrayCoded(64, 2**18, nmodes=2)
+        s2 = impairments.change_snr(s, 14)
+        full = getattr(s2, "cal_%s"%metric)(synced=synced)
+        rate, interval = getattr(s2, "cal_%s"%metric)(synced=synced, target_errors=500)
+        assert interval.shape == (2, 2)
+        assert np.all(interval[:, 0] <= rate) and np.all(rate <= interval[:, 1])
+        npt.assert_allclose(rate, full, rtol=0.15)
+
+    @pytest.mark.parametrize("metric", ["ser", "ber"])
+    def test_unsynced(self, metric, monkeypatch):
+        from qampy.core import ber_functions
+        s = signals.SignalQAMGrayCoded(64, 2**16, nmodes=2)
+        s2 = impairments.change_snr(s, 16)
+        s2 = s.recreate_from_np_array(np.ascontiguousarray(np.roll(s2, 1234, axis=-1)[::-1]*1j))
+        full = getattr(s2, "cal_%s"%metric)()
+        def fail(*args, **kwargs):
+            raise AssertionError("correlation should not be used")
+        monkeypatch.setattr(ber_functions, "find_sync_params", fail)
+        monkeypatch.setattr(ber_functions, "find_sequence_offset_window", fail)
+        rate, interval = getattr(s2, "cal_%s"%metric)(target_errors=10**9)
+        npt.assert_allclose(rate, full)
+
+    def test_unsynced_fallback(self):
+        # at this SNR the symbol decisions are too noisy for the synchronisation by lookup
+        s = signals.SignalQAMGrayCoded(4, 2**16, nmodes=2)
+        s2 = impairments.change_snr(s, -2)
+        s2 = s.recreate_from_np_array(np.ascontiguousarray(np.roll(s2, 1234, axis=-1)[::-1]))
+        ser, interval = s2.cal_ser(target_errors=10**9)
+        npt.assert_allclose(ser, s2.cal_ser())
+
+    def test_ci_width(self):
+        s = signals.SignalQAMGrayCoded(16, 2**18, nmodes=1)
+        s2 = impairments.change_snr(s, 10)
+        ber, interval = s2.cal_ber(ci_width=0.1)
+        assert interval[0, 1] - interval[0, 0] <= 0.1*ber[0]
+
+    def test_no_errors(self):
+        s = signals.SignalQAMGrayCoded(16, 2**14, nmodes=1)
+        ser, interval = s.cal_ser(target_errors=100)
+        assert ser[0] == 0
+        assert interval[0, 0] == 0 and 0 < interval[0, 1] < 1e-3
+
+    def test_verbose_raises(self):
+        s = signals.SignalQAMGrayCoded(16, 2**10, nmodes=1)
+        with pytest.raises(ValueError):
+            s.cal_ber(verbose=True, target_errors=10)
+
+    def test_pilot_signal(self):
+        s = signals.SignalWithPilots(16, 2**14, 256, 32, nmodes=2)
+        s2 = impairments.change_snr(s, 10)
+        ser, interval = s2.cal_ser(target_errors=200)
+        npt.assert_allclose(ser, s2.cal_ser(), rtol=0.2)
+
+
+class TestSymbolIndices(object):
+    @pytest.mark.parametrize("M", [4, 16, 32, 256, 1024])
+    def test_dtype(self, M):
+        s = signals.SignalQAMGrayCoded(M, 1000, nmodes=2)
+        idx = s.symbol_indices
+        assert idx.dtype == (np.uint8 if M <= 256 else np.uint16)
+        assert idx.shape == s.shape
+        npt.assert_array_equal(s.coded_symbols[idx], s.symbols)
+
+    @pytest.mark.parametrize("M", [16, 128])
+    def test_make_decision(self, M):
+        s = signals.SignalQAMGrayCoded(M, 2**12, nmodes=2)
+        s = impairments.change_snr(s, 15)
+        idx = s.make_decision(return_indices=True)
+        npt.assert_array_equal(s.coded_symbols[idx], s.make_decision())
+
+    @pytest.mark.parametrize("M", [4, 16, 64, 128])
+    def test_demodulate(self, M):
+        s = signals.SignalQAMGrayCoded(M, 1000, nmodes=2)
+        npt.assert_array_equal(s.demodulate(s.symbol_indices), s.bits)
+        npt.assert_array_equal(s.demodulate(s.symbol_indices[0]), s.demodulate(s.symbols[0]))
+
+    def test_cache_follows_symbols(self):
+        s = signals.SignalQAMGrayCoded(16, 1000, nmodes=1)
+        idx = s.symbol_indices
+        s2 = s*1
+        assert s2.symbol_indices is idx
+        s3 = s.resample(2, beta=0.1)
+        npt.assert_array_equal(s3.symbol_indices, idx)
+
+    @pytest.mark.parametrize("shift", [0, 100])
+    @pytest.mark.parametrize("rot", [0, 1, 2, 3])
+    def test_confusion_matrix(self, shift, rot):
+        N = 2**12
+        s = signals.SignalQAMGrayCoded(16, N, nmodes=1)
+        s2 = impairments.change_snr(s, 12)
+        s2 = np.roll(s2, shift, axis=-1)*1j**rot
+        cm = s2.cal_confusion_matrix()
+        assert cm.shape == (1, 16, 16)
+        assert cm.sum() == N
+        npt.assert_allclose(1 - np.trace(cm[0])/N, s2.cal_ser()[0])
+        if rot == 0:
+            npt.assert_array_equal(cm.sum(axis=-1)[0], np.bincount(s.symbol_indices[0], minlength=16))
+
+    @pytest.mark.parametrize("M", [4, 64, 256])
+    @pytest.mark.parametrize("shift", [0, 100])
+    def test_ber_vs_verbose(self, M, shift):
+        s = signals.SignalQAMGrayCoded(M, 2**14, nmodes=2)
+        s2 = impairments.change_snr(s, 2*np.log2(M)+4)
+        s2 = np.roll(s2, shift, axis=-1)
+        ber, errs, tx = s2.cal_ber(verbose=True)
+        npt.assert_allclose(s2.cal_ber(), ber)
+        assert ber.max() > 0
+
+    @pytest.mark.parametrize("M", [16, 64])
+    def test_est_snr_vs_complex(self, M):
+        s = signals.SignalQAMGrayCoded(M, 2**14, nmodes=2)
+        s2 = impairments.change_snr(s, 18)
+        snr_idx = s2.est_snr()
+        snr_cmplx = s2.est_snr(symbols_tx=s.symbols)
+        npt.assert_allclose(snr_idx, snr_cmplx, rtol=1e-8)
+
+
+class TestSyncCache(object):
+    def _signal(self):
+        s = signals.SignalQAMGrayCoded(16, 2**14, nmodes=2)
+        s2 = impairments.change_snr(s, 14)
+        s2 = np.roll(s2, 123, axis=-1)[::-1]*1j
+        return s, s.recreate_from_np_array(np.ascontiguousarray(s2))
+
+    def test_sync_once(self, monkeypatch):
+        from qampy.core import ber_functions
+        s, s2 = self._signal()
+        calls = []
+        find = ber_functions.find_sync_params
+        def find_counted(*args, **kwargs):
+            calls.append(1)
+            return find(*args, **kwargs)
+        monkeypatch.setattr(ber_functions, "find_sync_params", find_counted)
+        ser = s2.cal_ser()
+        n = len(calls)
+        s2.cal_ber()
+        s2.cal_evm()
+        s2.est_snr()
+        s2.cal_gmi()
+        s2.cal_confusion_matrix()
+        assert len(calls) == n
+        s2 += 0.1
+        s2.cal_ser()
+        assert len(calls) == 2*n
+
+    def test_key(self):
+        s, s2 = self._signal()
+        key = s2._sync_key(s2)
+        assert s2._sync_key(s2) == key
+        # views with other strides or copies of the data are different buffers
+        assert s2._sync_key(s2[:, ::2]) != s2._sync_key(s2[:, :s2.shape[1]//2])
+        assert s2._sync_key(s2.copy()) != key
+        s2[:, 0] = 0
+        assert s2._sync_key(s2) != key
+
+    def test_vs_synced(self):
+        s, s2 = self._signal()
+        ser, errs, tx = s2.cal_ser(verbose=True)
+        evm = s2.cal_evm()
+        snr = s2.est_snr()
+        assert ser.max() > 0
+        # same measurement on the manually synchronised symbols
+        s3 = s.recreate_from_np_array(tx)
+        s3._symbols = tx
+        npt.assert_allclose(s3.cal_ser(s2, synced=True), ser)
+        npt.assert_allclose(s3.cal_evm(s2, synced=True), evm)
+        npt.assert_allclose(s3.est_snr(s2, synced=True), snr)
+
+
+class TestPRBSSync(object):
+    @pytest.mark.parametrize("sig", ["bert", "prbs"])
+    @pytest.mark.parametrize("rot", range(4))
+    def test_no_correlation(self, sig, rot, monkeypatch):
+        from qampy.core import ber_functions
+        if sig == "bert":
+            s = signals.QPSKfromBERT(2**15, nmodes=2, prbsorders=((15, 23), (23, 15)), prbsshifts=(100, 3000),
+                                     prbsinvert=(False, True))
+        else:
+            s = signals.SignalQAMGrayCoded(16, 2**15, nmodes=2, bitclass=signals.PRBSBits, order=[23, 15])
+        s2 = impairments.change_snr(s, 15)
+        s2 = s.recreate_from_np_array(np.ascontiguousarray(np.roll(s2, 1234, axis=-1)[::-1]*1j**rot))
+        ser, errs, tx = s2.cal_ser(verbose=True)
+        def fail(*args, **kwargs):
+            raise AssertionError("correlation should not be used")
+        s2._synccache = None
+        monkeypatch.setattr(ber_functions, "find_sync_params", fail)
+        monkeypatch.setattr(ber_functions, "find_sequence_offset_window", fail)
+        npt.assert_allclose(s2.cal_ser(), ser)
+        assert ser.max() < 0.05
+
+
+class TestLUTCoding(object):
+    @pytest.mark.parametrize("M", [4, 8, 16, 32, 64, 128, 256, 1024])
+    @pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+    def test_modulate_vs_bitarray(self, M, dtype):
+        s = signals.SignalQAMGrayCoded(M, 2**12, nmodes=2, dtype=dtype)
+        syms = s._modulate(s.bits, s._encoding, M, dtype)
+        syms2 = s._modulate_bitarray(s.bits, s._encoding, M, dtype)
+        assert syms.dtype == syms2.dtype
+        npt.assert_array_equal(syms, syms2)
+
+    @pytest.mark.parametrize("M", [4, 8, 16, 32, 64, 128, 256, 1024])
+    @pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+    def test_demodulate_vs_bitarray(self, M, dtype):
+        s = signals.SignalQAMGrayCoded(M, 2**12, nmodes=2, dtype=dtype)
+        bits = s._demodulate(s.symbols, s._encoding)
+        bits2 = s._demodulate_bitarray(np.asarray(s.symbols), s._encoding)
+        assert bits.dtype == bits2.dtype
+        npt.assert_array_equal(bits, bits2)
+        npt.assert_array_equal(s._demodulate(s.symbols[0], s._encoding), bits2[0])
+
+    @pytest.mark.parametrize("M", [16, 64])
+    def test_demodulate_noisy(self, M):
+        s = signals.SignalQAMGrayCoded(M, 2**12, nmodes=1)
+        s2 = impairments.change_snr(s, 40)
+        npt.assert_array_equal(s2.demodulate(s2), s.bits)
+
+
 class TestSignalQualityOnSignal(object):
 
     @pytest.mark.parametrize("nmodes", np.arange(1, 4))
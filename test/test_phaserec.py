@@ -1,7 +1,7 @@
 import pytest
 import numpy as np
 import numpy.testing as npt
-from qampy import signals, impairments, phaserec
+from qampy import signals, impairments, phaserec, helpers
 from qampy.core import phaserecovery as cphaserecovery
 import matplotlib.pylab as plt
 
@@ -146,3 +146,140 @@ class TestCorrect(object):
         npt.assert_allclose(0, ser)
         npt.assert_allclose(0, o, atol=np.pi/4/32)
 
+    @pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+    @pytest.mark.parametrize("twostage", [False, True])
+    def test_bps_joint(self, dtype, twostage):
+        s = signals.SignalQAMGrayCoded(32, 2**12, nmodes=2, dtype=dtype)
+        s3 = s*np.exp(1.j*0.3)
+        if twostage:
+            s2, ph = phaserec.bps_twostage(s3, 32//2, 11, method="pyx", joint=True)
+        else:
+            s2, ph = phaserec.bps(s3, 32, 11, method="pyx", joint=True)
+        npt.assert_array_equal(ph[0], ph[1])
+        npt.assert_allclose(0, ph[0][20:-20]+0.3, atol=np.pi/4/32)
+        npt.assert_allclose(0, s2[:,20:-20].cal_ser())
+
+
+class TestPartition(object):
+    @pytest.mark.parametrize("M", [16, 64, 256])
+    @pytest.mark.parametrize("ph0", [0.1, -0.6])
+    def test_constant_phase(self, M, ph0):
+        s = signals.SignalQAMGrayCoded(M, 2**14, fb=20e9, nmodes=2)
+        s = impairments.change_snr(s, 35)*np.exp(1.j*ph0)
+        s2, ph = cphaserecovery.phase_partition_qam(s, 512, M)
+        assert ph.shape == s.shape
+        dph = np.angle(np.exp(4.j*(ph - ph0)))/4
+        npt.assert_allclose(dph, 0, atol=0.02)
+
+    @pytest.mark.parametrize("M, snr, Nblock, sermax", [(16, 17, 128, 5e-3), (64, 23, 128, 1.5e-2),
+                                                        (256, 33, 96, 1.5e-2)])
+    def test_phase_noise(self, M, snr, Nblock, sermax):
+        # linewidth symbol-duration product of 1e-5
+        s = signals.SignalQAMGrayCoded(M, 2**16, fb=40e9, nmodes=2)
+        s = impairments.change_snr(s, snr)
+        s2 = impairments.apply_phase_noise(s, 400e3)
+        s3, ph = phaserec.phase_partition_qam(s2, Nblock)
+        ser = helpers.dump_edges(s3, 200).cal_ser()
+        assert np.all(ser < sermax)
+
+    def test_unsupported(self):
+        s = signals.SignalQAMGrayCoded(1024, 2**10, nmodes=1)
+        with pytest.raises(ValueError):
+            cphaserecovery.phase_partition_qam(s, 128, 1024)
+
+    def test_rings_16qam(self):
+        thresholds, offsets, class1 = cphaserecovery._qam_ring_partition(16)
+        npt.assert_allclose(thresholds**2*10, [(np.sqrt(2)+np.sqrt(10))**2/4, (np.sqrt(10)+np.sqrt(18))**2/4])
+        npt.assert_array_equal(class1, [True, False, True])
+        npt.assert_allclose(abs(offsets[1]), np.pi/4 - np.arctan(1/3))
+
+    def test_signal(self):
+        s = signals.SignalQAMGrayCoded(64, 2**12, fb=20e9, nmodes=2)
+        s2, ph = phaserec.phase_partition_qam(s*np.exp(0.2j), 64)
+        assert type(s2) is type(s)
+        npt.assert_allclose(s2.cal_ser(), 0)
+
+
+class TestFreqOffset(object):
+    @pytest.mark.parametrize("M", [4, 16, 64])
+    @pytest.mark.parametrize("average_over_modes", [True, False])
+    def test_welch(self, M, average_over_modes):
+        s = signals.SignalQAMGrayCoded(M, 2**16, fb=20e9, nmodes=2)
+        s = impairments.change_snr(s, 20)
+        fo = np.array([1.3e-3, 1.3e-3 if average_over_modes else -2.1e-3])
+        sf = s*np.exp(2.j*np.pi*np.arange(s.shape[1])*fo[:, None])
+        f = cphaserecovery.find_freq_offset_welch(sf, average_over_modes=average_over_modes, fft_size=2**10,
+                                                  chunksize=2**12)
+        assert f.shape == (2, 1)
+        # well below the FFT resolution of 1/(4*fft_size)
+        npt.assert_allclose(f[:, 0], fo, atol=1e-5)
+
+    def test_short(self):
+        s = signals.SignalQAMGrayCoded(4, 2**9, fb=20e9, nmodes=1)
+        sf = s*np.exp(2.j*np.pi*np.arange(s.shape[1])*2e-3)
+        f = phaserec.find_freq_offset(sf, fft_size=2**10, method="welch")
+        npt.assert_allclose(f, 2e-3, atol=1e-4)
+
+
+class TestPLL(object):
+    @pytest.mark.parametrize("M, snr", [(4, 12), (16, 20), (64, 26)])
+    def test_tracking(self, M, snr):
+        s = signals.SignalQAMGrayCoded(M, 2**15, fb=32e9, nmodes=2)
+        s = impairments.apply_phase_noise(impairments.change_snr(s, snr), 100e3)
+        s = impairments.add_carrier_offset(s, 5e6)*np.exp(0.1j)
+        s2, ph, state = phaserec.pll(s)
+        assert type(s2) is type(s)
+        assert state.shape == (2, 2)
+        npt.assert_allclose(s2[:, 2000:].cal_ser(), 0, atol=3e-4)
+
+    def test_frequency_lock(self):
+        s = signals.SignalQAMGrayCoded(16, 2**14, fb=32e9, nmodes=2)
+        s = impairments.add_carrier_offset(impairments.change_snr(s, 25), 5e6)
+        s2, ph, state = phaserec.pll(s)
+        npt.assert_allclose(state[1], 2*np.pi*5e6/s.fs, rtol=0.3)
+
+    @pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+    def test_chunks(self, dtype):
+        s = signals.SignalQAMGrayCoded(16, 2**14, fb=32e9, nmodes=2, dtype=dtype)
+        s = impairments.apply_phase_noise(impairments.change_snr(s, 20), 100e3)
+        E, ph, state = cphaserecovery.pll(s, s.coded_symbols)
+        assert E.dtype == dtype
+        state_c = None
+        Ec = []
+        for i in range(0, s.shape[1], 1000):
+            Ei, phi, state_c = cphaserecovery.pll(s[:, i:i + 1000], s.coded_symbols, state=state_c)
+            Ec.append(Ei)
+        npt.assert_array_equal(np.hstack(Ec), E)
+        npt.assert_array_equal(state_c, state)
+
+    def test_coarse(self):
+        s = signals.SignalQAMGrayCoded(16, 2**14, fb=32e9, nmodes=1)
+        s = impairments.change_snr(s, 20)
+        ph0 = np.linspace(0, 20, s.shape[1])
+        E, ph, state = cphaserecovery.pll(s[0]*np.exp(1.j*ph0), s.coded_symbols, coarse=ph0)
+        assert E.ndim == 1
+        npt.assert_allclose(ph - ph0, 0, atol=0.1)
+
+
+class TestViterbi(object):
+    @pytest.mark.parametrize("N", [10, 11])
+    @pytest.mark.parametrize("M", [2, 4, 8])
+    @pytest.mark.parametrize("method", ["py", "pyx"])
+    def test_vs_segments(self, N, M, method):
+        from qampy.core.segmentaxis import segment_axis
+        s = signals.SignalQAMGrayCoded(4, 2**12, fb=20e9, nmodes=2)
+        s = impairments.apply_phase_noise(impairments.change_snr(s, 15), 1e6)
+        s2, ph = cphaserecovery.viterbiviterbi(s, N, M, method=method)
+        assert ph.shape == (2, 2**12 - N + 1)
+        for i in range(2):
+            sa = segment_axis(np.exp(1.j*np.angle(s[i]))**M, N, N - 1)
+            ph_ref = (np.unwrap(np.angle(sa.sum(axis=1))) - np.pi)/M
+            npt.assert_allclose(ph[i], ph_ref, atol=1e-10)
+
+    def test_zeros(self):
+        s = signals.SignalQAMGrayCoded(4, 2**10, fb=20e9, nmodes=1)*np.exp(0.1j)
+        s[:, 100:120] = 0
+        s2, ph = cphaserecovery.viterbiviterbi(s, 11, 4)
+        s3, ph3 = cphaserecovery.viterbiviterbi(s, 11, 4, method="pyx")
+        assert np.all(np.isfinite(ph))
+        npt.assert_allclose(ph, ph3, atol=1e-10)
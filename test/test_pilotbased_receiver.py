@@ -0,0 +1,63 @@
+import pytest
+import numpy as np
+import numpy.testing as npt
+
+from qampy import signals, impairments
+from qampy.core import pilotbased_receiver
+
+
+class TestPilotCPE(object):
+    @pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+    @pytest.mark.parametrize("remove_phase_pilots", [True, False])
+    def test_linear_phase(self, dtype, remove_phase_pilots):
+        s = signals.SignalQAMGrayCoded(16, 2**14, nmodes=2, dtype=dtype)
+        ph = np.linspace(0, 10, s.shape[1])*np.array([1, -1])[:, None]
+        E = (np.asarray(s)*np.exp(1.j*ph)).astype(dtype)
+        data, trace = pilotbased_receiver.pilot_based_cpe(E, s.symbols[:, ::16], 16,
+                                                          remove_phase_pilots=remove_phase_pilots)
+        assert data.dtype == dtype
+        npt.assert_allclose(trace[:, :-16], ph[:, :-16], atol=1e-3)
+        if remove_phase_pilots:
+            syms = np.delete(s.symbols, np.arange(0, s.shape[1], 16), axis=1)
+        else:
+            syms = s.symbols
+        npt.assert_allclose(data[:, :-16], syms[:, :-16], atol=1e-3)
+
+    @pytest.mark.parametrize("num_average", [1, 5])
+    @pytest.mark.parametrize("use_pilot_ratio", [1, 2])
+    def test_chunks(self, num_average, use_pilot_ratio):
+        s = signals.SignalQAMGrayCoded(16, 2**14, nmodes=2)
+        chunk = 16*use_pilot_ratio*7
+        E = np.asarray(impairments.apply_phase_noise(impairments.change_snr(s, 20), 1e6))
+        E = E[:, :E.shape[1] - E.shape[1] % chunk]
+        pilots = s.symbols[:, ::16]
+        data, trace = pilotbased_receiver.pilot_based_cpe(E, pilots, 16, num_average=num_average,
+                                                          use_pilot_ratio=use_pilot_ratio)
+        state = {}
+        out = []
+        for i in range(0, E.shape[1], chunk):
+            out.append(pilotbased_receiver.pilot_based_cpe(E[:, i:i + chunk], pilots[:, i//16:], 16,
+                                                           num_average=num_average,
+                                                           use_pilot_ratio=use_pilot_ratio, state=state))
+        out.append(pilotbased_receiver.pilot_based_cpe(E[:, :0], pilots[:, :0], 16, num_average=num_average,
+                                                       use_pilot_ratio=use_pilot_ratio, state=state, flush=True))
+        data_c = np.hstack([o[0] for o in out])
+        trace_c = np.hstack([o[1] for o in out])
+        npt.assert_allclose(trace_c, trace, atol=1e-10)
+        npt.assert_allclose(data_c, data, atol=1e-10)
+
+    def test_chunk_length(self):
+        s = signals.SignalQAMGrayCoded(16, 2**10, nmodes=1)
+        with pytest.raises(ValueError):
+            pilotbased_receiver.pilot_based_cpe(s[:, :100], s.symbols[:, ::16], 16, state={})
+
+    @pytest.mark.parametrize("num_average, valid", [(4, True), (5, False)])
+    def test_few_pilots(self, num_average, valid):
+        # the number of pilots is checked against the requested averaging length, before it is made odd
+        s = signals.SignalQAMGrayCoded(16, 80, nmodes=1)
+        if valid:
+            data, trace = pilotbased_receiver.pilot_based_cpe(s, s.symbols[:, ::16], 16, num_average=num_average)
+            npt.assert_allclose(trace, 0, atol=1e-10)
+        else:
+            with pytest.raises(ValueError):
+                pilotbased_receiver.pilot_based_cpe(s, s.symbols[:, ::16], 16, num_average=num_average)
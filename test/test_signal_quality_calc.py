@@ -155,3 +155,238 @@ class TestVerboseReturn(object):
 
 
 
+
+class TestEstimateSNR(object):
+    @staticmethod
+    def _snr_loop(rx, tx, syms):
+        N0 = 0.
+        in_pow = 0.
+        for sym in syms:
+            sel = rx[tx == sym]
+            if sel.size:
+                N0 += np.var(sel)*sel.size/rx.size
+                in_pow += abs(np.mean(sel))**2*sel.size/rx.size
+        return in_pow/N0, in_pow, N0
+
+    @pytest.mark.parametrize("M", [4, 16, 256])
+    def test_vs_loop(self, M):
+        s = signals.SignalQAMGrayCoded(M, 2**14, nmodes=2)
+        s2 = impairments.change_snr(s, 20)
+        snr, s0, n0 = signal_quality.estimate_snr(np.asarray(s2), s.symbols, s.coded_symbols, verbose=True)
+        assert snr.shape == (2,)
+        for i in range(2):
+            npt.assert_allclose([snr[i], s0[i], n0[i]], self._snr_loop(s2[i], s.symbols[i], s.coded_symbols),
+                                rtol=1e-10)
+            npt.assert_allclose(signal_quality.estimate_snr(s2[i], s.symbols[i], s.coded_symbols), snr[i],
+                                rtol=1e-12)
+
+    def test_non_symbols_ignored(self):
+        s = signals.SignalQAMGrayCoded(16, 2**12, nmodes=1)
+        s2 = impairments.change_snr(s, 20)
+        tx = s.symbols[0].copy()
+        tx[:100] = 10.
+        snr = signal_quality.estimate_snr(s2[0], tx, s.coded_symbols)
+        npt.assert_allclose(snr, self._snr_loop(s2[0], tx, s.coded_symbols)[0], rtol=1e-10)
+
+
+class TestPAMDemapper(object):
+    @staticmethod
+    def _setup(M, snr=15):
+        s = signals.SignalQAMGrayCoded(M, 2**12, nmodes=1)
+        s2 = impairments.change_snr(s, snr)
+        snr_lin = 10**(snr/10)
+        return s, np.asarray(s2)[0], snr_lin
+
+    @pytest.mark.parametrize("M", [4, 16, 64])
+    def test_vs_dense(self, M):
+        s, rx, snr = self._setup(M)
+        tables = signal_quality.pam_bit_tables(s._bitmap_mtx)
+        l_ref = signal_quality.soft_l_value_demapper(rx, M, snr, s._bitmap_mtx)
+        l_pam = signal_quality.soft_l_value_demapper_pam(rx, snr, tables)
+        npt.assert_allclose(l_pam, l_ref, rtol=1e-8, atol=1e-8)
+
+    @pytest.mark.parametrize("M", [16, 64])
+    def test_maxlog_vs_minmax(self, M):
+        s, rx, snr = self._setup(M)
+        tables = signal_quality.pam_bit_tables(s._bitmap_mtx)
+        l_ref = signal_quality.soft_l_value_demapper_minmax(rx, M, snr, s._bitmap_mtx)
+        l_pam = signal_quality.soft_l_value_demapper_pam(rx, snr, tables, maxlog=True)
+        npt.assert_allclose(l_pam, l_ref, rtol=1e-8, atol=1e-8)
+
+    def test_cross_qam_not_separable(self):
+        s = signals.SignalQAMGrayCoded(32, 2**8, nmodes=1)
+        assert signal_quality.pam_bit_tables(s._bitmap_mtx) is None
+
+    def test_high_order_finite(self):
+        s, rx, snr = self._setup(1024, snr=35)
+        tables = signal_quality.pam_bit_tables(s._bitmap_mtx)
+        l_pam = signal_quality.soft_l_value_demapper_pam(rx, snr, tables)
+        assert np.all(np.isfinite(l_pam))
+        # hard decisions from the L-values must match the transmitted bits mostly
+        bits = (l_pam > 0).reshape(-1, 10)
+        assert np.mean(bits == s.bits[0].reshape(-1, 10)) > 0.99
+
+
+class TestGMIIdx(object):
+    @staticmethod
+    def _gmi_loop(rx, bits, snr, M, bitmap, minmax=False):
+        nbits = int(np.log2(M))
+        if minmax:
+            l_values = np.asarray(signal_quality.soft_l_value_demapper_minmax(rx, M, snr, bitmap))
+        else:
+            l_values = np.asarray(signal_quality.soft_l_value_demapper(rx, M, snr, bitmap))
+        return np.array([1 - np.mean(np.log2(1 + np.exp((-1)**bits[b::nbits]*l_values[b::nbits])))
+                         for b in range(nbits)]), l_values
+
+    @pytest.mark.parametrize("M", [16, 32, 64, 128])
+    @pytest.mark.parametrize("minmax", [False, True])
+    def test_vs_loop(self, M, minmax):
+        s = signals.SignalQAMGrayCoded(M, 2**12, nmodes=2)
+        s2 = np.asarray(impairments.change_snr(s, 15))
+        snr = signal_quality.estimate_snr(s2, s.symbol_indices, s.coded_symbols)
+        gmi, gmi_pb, l_values = signal_quality.cal_gmi_idx(s2, s.symbol_indices, snr, s.coded_symbols,
+                                                           s._bit_table, maxlog=minmax, return_l_values=True)
+        assert gmi_pb.shape == (2, s.Nbits)
+        for i in range(2):
+            gmi_ref, l_ref = self._gmi_loop(s2[i], s.bits[i].astype(int), snr[i], M, s._bitmap_mtx, minmax)
+            npt.assert_allclose(gmi_pb[i], gmi_ref, rtol=1e-10, atol=1e-12)
+            npt.assert_allclose(l_values[i], l_ref, rtol=1e-8, atol=1e-8)
+        npt.assert_allclose(gmi, np.sum(gmi_pb, axis=-1))
+
+    def test_1d(self):
+        s = signals.SignalQAMGrayCoded(64, 2**12, nmodes=1)
+        s2 = np.asarray(impairments.change_snr(s, 15))
+        snr = signal_quality.estimate_snr(s2, s.symbol_indices, s.coded_symbols)
+        gmi, gmi_pb = signal_quality.cal_gmi_idx(s2, s.symbol_indices, snr, s.coded_symbols, s._bit_table)
+        gmi1, gmi_pb1 = signal_quality.cal_gmi_idx(s2[0], s.symbol_indices[0], snr[0], s.coded_symbols,
+                                                   s._bit_table)
+        assert np.ndim(gmi1) == 0
+        npt.assert_allclose(gmi1, gmi[0])
+        npt.assert_allclose(gmi_pb1, gmi_pb[0])
+
+
+class TestTheoryGMI(object):
+    @staticmethod
+    def _gmi_mc(M, snr_db, N=2**16):
+        from scipy.special import logsumexp
+        s = signals.SignalQAMGrayCoded(M, 1000, nmodes=1)
+        syms, bit_table = s.coded_symbols, s._bit_table
+        snr = 10**(snr_db/10)
+        rng = np.random.RandomState(1)
+        idx = rng.randint(0, M, N)
+        rx = syms[idx] + (rng.randn(N) + 1j*rng.randn(N))/np.sqrt(2*snr)
+        e = -snr*abs(rx[:, None] - syms[None, :])**2
+        gmi = s.Nbits
+        for b in range(s.Nbits):
+            l_values = (logsumexp(np.where(bit_table[:, b], e, -np.inf), axis=1) -
+                        logsumexp(np.where(bit_table[:, b], -np.inf, e), axis=1))
+            gmi -= np.mean(np.logaddexp(0, np.where(bit_table[idx, b], -l_values, l_values)))/np.log(2)
+        return gmi
+
+    @pytest.mark.parametrize("M", [16, 32, 64])
+    @pytest.mark.parametrize("snr", [5., 15.])
+    def test_quadrature_vs_mc(self, M, snr):
+        gmi = theory.cal_gmi(M, snr, method="quadrature")
+        npt.assert_allclose(gmi, self._gmi_mc(M, snr), atol=0.02)
+
+    @pytest.mark.parametrize("M", [16, 64, 256])
+    def test_table_vs_quadrature(self, M):
+        snr = np.linspace(-15, 45, 301)
+        npt.assert_allclose(theory.cal_gmi(M, snr), theory.cal_gmi(M, snr, method="quadrature"), atol=1e-4)
+
+    @pytest.mark.parametrize("M", [32, 128])
+    def test_table_cross_qam_cost(self, M, monkeypatch):
+        from qampy.core import dsp_cython
+        npoints = []
+        quad = dsp_cython.gmi_quadrature
+        def quad_counted(*args):
+            npoints.append(args[4].size)
+            return quad(*args)
+        monkeypatch.setattr(dsp_cython, "gmi_quadrature", quad_counted)
+        theory._gmi_table.cache_clear()
+        gmi = theory.cal_gmi(M, 15.)
+        # a single SNR must not build the table over all SNRs
+        assert sum(npoints) == 1
+        npt.assert_allclose(gmi, self._gmi_mc(M, 15.), atol=0.02)
+
+    def test_limits(self):
+        gmi = theory.cal_gmi(64, np.arange(-10, 41, 1.))
+        assert np.all(np.diff(gmi) > -1e-6)
+        npt.assert_allclose(gmi[-1], 6)
+        assert gmi[0] < 0.2
+
+    def test_unknown_method(self):
+        with pytest.raises(ValueError):
+            theory.cal_gmi(16, 10., method="foo")
+
+
+class TestBlindEVM(object):
+    @staticmethod
+    def _evm_broadcast(sig, M):
+        Pi = signal_quality.norm_to_s0(theory.cal_symbols_qam(M).flatten(), M)
+        Pm = signal_quality.norm_to_s0(sig, M)
+        evm = np.mean(np.min(abs(Pm[:, np.newaxis] - Pi)**2, axis=1))
+        return np.sqrt(evm/np.mean(abs(Pi)**2))
+
+    @pytest.mark.parametrize("M", [4, 16, 32, 64])
+    @pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+    def test_vs_broadcast(self, M, dtype):
+        s = signals.SignalQAMGrayCoded(M, 2**12, nmodes=2, dtype=dtype)
+        s2 = np.asarray(impairments.change_snr(s, 18))
+        evm = signal_quality.cal_evm(s2, M)
+        assert evm.shape == (2,)
+        for i in range(2):
+            npt.assert_allclose(evm[i], self._evm_broadcast(s2[i], M), rtol=1e-5)
+            npt.assert_allclose(signal_quality.cal_evm(s2[i], M), evm[i])
+
+    @pytest.mark.parametrize("chunksize", [1000, 2**12, 2**16])
+    def test_chunksize(self, chunksize):
+        s = signals.SignalQAMGrayCoded(16, 2**12, nmodes=1)
+        s2 = np.asarray(impairments.change_snr(s, 18))[0]
+        npt.assert_allclose(signal_quality._cal_evm_blind(s2, 16, chunksize=chunksize), self._evm_broadcast(s2, 16),
+                            rtol=1e-10)
+
+    def test_signal_blind(self):
+        s = signals.SignalQAMGrayCoded(16, 2**14, nmodes=2)
+        s2 = impairments.change_snr(s, 25)
+        npt.assert_allclose(s2.cal_evm(blind=True), s2.cal_evm(), rtol=0.05)
+
+
+class TestMetricAccumulator(object):
+    @pytest.mark.parametrize("M", [16, 32])
+    @pytest.mark.parametrize("chunk", [1000, 2**12])
+    def test_vs_signal(self, M, chunk):
+        import pickle
+        s = signals.SignalQAMGrayCoded(M, 2**14, nmodes=2)
+        s2 = impairments.change_snr(s, 12)
+        rx, tx = np.asarray(s2), s.symbol_indices
+        snr = s2.est_snr(synced=True)
+        acc1 = signal_quality.MetricAccumulator.from_signal(s)
+        acc2 = signal_quality.MetricAccumulator.from_signal(s)
+        for i in range(0, 2**13, chunk):
+            acc1.update(rx[:, i:min(i + chunk, 2**13)], tx[:, i:min(i + chunk, 2**13)], snr=snr)
+        for i in range(2**13, 2**14, chunk):
+            acc2.update(rx[:, i:i + chunk], tx[:, i:i + chunk], snr=snr)
+        acc1.merge(pickle.loads(pickle.dumps(acc2)))
+        npt.assert_array_equal(acc1.N, 2**14)
+        npt.assert_allclose(acc1.cal_ser(), s2.cal_ser(synced=True))
+        npt.assert_allclose(acc1.cal_ber(), s2.cal_ber(synced=True))
+        npt.assert_allclose(acc1.cal_evm(), s2.cal_evm(synced=True), rtol=1e-6)
+        npt.assert_allclose(acc1.est_snr(verbose=True), signal_quality.estimate_snr(rx, tx, s.coded_symbols,
+                                                                                    verbose=True), rtol=1e-10)
+        npt.assert_allclose(acc1.cal_gmi()[1], s2.cal_gmi(synced=True)[1], rtol=1e-10)
+
+    def test_running_snr(self):
+        s = signals.SignalQAMGrayCoded(64, 2**14, nmodes=1)
+        s2 = impairments.change_snr(s, 20)
+        acc = signal_quality.MetricAccumulator.from_signal(s)
+        for i in range(0, 2**14, 2**12):
+            acc.update(np.asarray(s2)[:, i:i + 2**12], s.symbol_indices[:, i:i + 2**12])
+        npt.assert_allclose(acc.cal_gmi()[0], s2.cal_gmi(synced=True)[0], rtol=1e-3)
+
+    def test_errors(self):
+        acc = signal_quality.MetricAccumulator.from_signal(signals.SignalQAMGrayCoded(16, 2**10, nmodes=2))
+        with pytest.raises(ValueError):
+            acc.update(np.zeros((1, 10), dtype=np.complex128), np.zeros((1, 10), dtype=np.uint8))
+        with pytest.raises(ValueError):
+            acc.merge(signal_quality.MetricAccumulator.from_signal(signals.SignalQAMGrayCoded(64, 2**10, nmodes=2)))
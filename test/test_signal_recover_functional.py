@@ -185,6 +185,30 @@ class TestLMS(object):
         assert np.dtype(dtype) is sout.dtype
 
 
+class TestFD(object):
+    @pytest.mark.parametrize("dtype", [np.complex64, np.complex128])
+    @pytest.mark.parametrize("method", ["fd_cma", "fd_mcma"])
+    @pytest.mark.parametrize("ntaps", [21, 51])
+    def test_pmd(self, dtype, method, ntaps):
+        theta = np.pi/5.6
+        fb = 40.e9
+        os = 2
+        fs = os*fb
+        N = 2**16
+        beta = 0.1
+        mu = 0.8e-3
+        M = 4
+        s = signals.SignalQAMGrayCoded(M, N, nmodes=2, fb=fb, dtype=dtype)
+        s = s.resample(fs, beta=beta, renormalise=True)
+        s = impairments.apply_PMD(s, theta, 100e-12)
+        wxy, err = equalisation.equalise_signal(s, mu, Ntaps=ntaps, method=method, adaptive_stepsize=True)
+        sout = equalisation.apply_filter(s, wxy)
+        sout = helpers.normalise_and_center(sout)
+        ser = helpers.dump_edges(sout, 20).cal_ser()
+        npt.assert_allclose(ser, 0)
+        assert np.dtype(dtype) is sout.dtype
+
+
 class TestCMA(object):
     @pytest.mark.parametrize("method", ["cma", "mcma"])
     @pytest.mark.parametrize("phi", np.linspace(4.3, 8, 5))